@@ -1,9 +1,15 @@
-import easyocr
 import os
+import sys
+import django
 
-reader = easyocr.Reader(['en'], gpu=False)
-result = reader.readtext('test_folder\image_2.png')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'qiuckease.settings')
+django.setup()
 
-print(" ".join([word for bbox, word, conf in result]))
+from ocr_api.client import ocr_image
 
+# Reads an image through the OCR service (python manage.py run_ocr_service), which keeps the easyocr reader loaded.
+path = sys.argv[1] if len(sys.argv) > 1 else os.path.join('test_folder', 'image_1.png')
+with open(path, 'rb') as f:
+    result = ocr_image(f.read())
 
+print(result.text)
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import UserFlashCards
+from .models import UserFlashCards, CardReview
 
 # Register your models here.
 
 admin.site.register(UserFlashCards)
+admin.site.register(CardReview)
@@ -1,34 +1,276 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
+import contextvars
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+from django.conf import settings
+from django.utils.html import strip_tags
+from llm_api.client import chat_completion, stream_chat_completion
+from summarizer_api.text_summarizer import tokenize
 
-load_dotenv()
+# Flashcards are generated with a JSON schema the model's output is constrained to, so every response parses up
+# to the point where it stops. The output budget grows with the number of cards asked for; if a response still
+# runs out of tokens, FlashcardParser keeps every card that was completed before it was cut off.
+#
+# Summaries longer than FLASHCARDS_FANOUT_MIN_TOKENS are split at their h2 headings and every section gets its own
+# request, all of them at once; a card records the section it came from, so one section can be generated again
+# without touching the rest of the deck.
 
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+FLASHCARD_MODEL = 'gpt-4o-mini'
+FRONT_MAX_CHARS = 100
+BACK_MAX_CHARS = 500
+SECTION_MAX_CHARS = 200
+H2 = re.compile(r'<h2[^>]*>(.*?)</h2>', re.IGNORECASE | re.DOTALL)
+NOT_WORDS = re.compile(r'\W+')
 
-def generate_flashcards(paragraph):
+
+class Card(NamedTuple):
+    front: str
+    back: str
+    section: str = ""
+
+
+class Section(NamedTuple):
+    title: str
+    html: str
+
+
+FLASHCARD_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "flashcards",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "flashcards": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "Front": {"type": "string"},
+                            "Back": {"type": "string"},
+                        },
+                        "required": ["Front", "Back"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["flashcards"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def card_count(count=None):
+    if count is None:
+        return settings.FLASHCARDS_DEFAULT_COUNT
+    return max(1, min(int(count), settings.FLASHCARDS_MAX_COUNT))
+
+
+# Output tokens for `count` cards: a back of BACK_MAX_CHARS is about 125 tokens, the front and the JSON around
+# them add the rest of FLASHCARDS_TOKENS_PER_CARD.
+def card_budget(count):
+    return 20 + count * settings.FLASHCARDS_TOKENS_PER_CARD
+
+
+def flashcard_messages(paragraph, count):
     prompt = (
-        f"Convert the following paragraph into at least 10 flashcards. "
-        f"Generate flashcards with the following structure: Each flashcard should have a 'Term' on the front and a 'Definition' on the back."
-        f"Format should be in JSON format: Id:# Front: Term \n Back: Definition"
-        f"Only JSON data is required. No other decoraters like ``` are needed."
-        f"The terms should be related to [specific subject or topic]. Provide concise and accurate definitions for each term."
+        f"Convert the following paragraph into {count} flashcards. "
+        f"Each flashcard has a term or question on the Front (at most {FRONT_MAX_CHARS} characters) and a concise, "
+        f"accurate definition or answer on the Back (at most {BACK_MAX_CHARS} characters). "
+        f"Cover the most important ideas of the paragraph and don't repeat a term."
     )
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": paragraph},
+    ]
+
+
+# A parsed card cut to the lengths UserFlashCards stores, or None if it isn't a card.
+def clean_card(card):
+    if not isinstance(card, dict):
+        return None
+    front, back = card.get('Front'), card.get('Back')
+    if not isinstance(front, str) or not isinstance(back, str) or not front.strip():
+        return None
+    return Card(front.strip()[:FRONT_MAX_CHARS], back.strip()[:BACK_MAX_CHARS])
+
+
+def split_sections(summary):
+    """
+    Splits a summary at its h2 headings into Sections; the heading is kept at the top of its section's html.
+    Anything before the first heading is a section with an empty title.
+    """
+    sections = []
+    headings = list(H2.finditer(summary))
+    starts = [heading.start() for heading in headings] + [len(summary)]
+    if strip_tags(summary[:starts[0]]).strip():
+        sections.append(Section("", summary[:starts[0]]))
+    for heading, end in zip(headings, starts[1:]):
+        title = " ".join(strip_tags(heading.group(1)).split())[:SECTION_MAX_CHARS]
+        sections.append(Section(title, summary[heading.start():end]))
+    return sections
+
+
+# Cards whose fronts only differ in case, spacing or punctuation are the same card.
+def card_key(card):
+    return NOT_WORDS.sub(" ", card.front.lower()).strip()
+
 
-    response = client.chat.completions.create(
-        model='gpt-4o-mini',
-        messages=[
-            {"role": "system", "content": prompt },
-            {"role": "user", "content": paragraph},
-        ],
-        max_tokens=500,  
+def dedupe(cards, seen=None):
+    seen = set() if seen is None else seen
+    unique = []
+    for card in cards:
+        key = card_key(card)
+        if key not in seen:
+            seen.add(key)
+            unique.append(card)
+    return unique
+
+
+# Splits `count` cards between sections in proportion to their weights (largest remainder first), giving every
+# section at least one; the shares add up to `count`, or to the number of sections if there are more of those.
+def share_cards(count, weights):
+    total = sum(weights) or 1
+    exact = [count * weight / total for weight in weights]
+    shares = [max(1, int(share)) for share in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: exact[i] - int(exact[i]), reverse=True)
+    for i in by_remainder[:max(0, count - sum(shares))]:
+        shares[i] += 1
+    while sum(shares) > max(count, len(shares)):
+        shares[shares.index(max(shares))] -= 1
+    return shares
+
+
+def plan_sections(summary, count=None, sections=None):
+    """
+    Returns the (Section, count) pairs to generate cards for. A summary is only split when it is longer than
+    FLASHCARDS_FANOUT_MIN_TOKENS or `sections` names the section titles to generate; the `count` cards are then
+    shared between the sections by their length in tokens.
+    """
+    count = card_count(count)
+    if sections is None and len(tokenize(summary)) <= settings.FLASHCARDS_FANOUT_MIN_TOKENS:
+        return [(Section("", summary), count)]
+    parts = split_sections(summary)
+    if sections is not None:
+        parts = [part for part in parts if part.title in sections]
+    elif len(parts) < 2:
+        return [(Section("", summary), count)]
+    return list(zip(parts, share_cards(count, [len(tokenize(part.html)) for part in parts])))
+
+
+class FlashcardParser:
+    """
+    Reads the JSON of a flashcards response as it arrives and returns each card once its closing brace has come
+    in. Works on {"flashcards": [...]} as well as on a bare list of cards; only the text of the card being read is
+    kept, so feeding a response a piece at a time costs no more than parsing it once.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.card_depth = None
+        self.in_string = False
+        self.escaped = False
+        self.card = None
+
+    def feed(self, text):
+        cards = []
+        start = 0 if self.card is not None else None
+        for i, char in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                if self.card_depth is None:
+                    self.card_depth = 2 if char == '{' else 1
+                self.depth += 1
+                if char == '{' and self.depth == self.card_depth + 1 and self.card is None:
+                    self.card, start = "", i
+            elif char in '}]':
+                self.depth -= 1
+                if char == '}' and self.depth == self.card_depth and self.card is not None:
+                    card = clean_card(self.loads(self.card + text[start:i + 1]))
+                    if card is not None:
+                        cards.append(card)
+                    self.card, start = None, None
+        if self.card is not None:
+            self.card += text[start:]
+        return cards
+
+    @staticmethod
+    def loads(text):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+
+def generate_section(section, count):
+    response = chat_completion(
+        model=FLASHCARD_MODEL,
+        messages=flashcard_messages(section.html, count),
+        max_tokens=card_budget(count),
         temperature=0.7,
+        response_format=FLASHCARD_SCHEMA,
+        feature='flashcards',
     )
-    
-    flashcards_text = response.choices[0].message.content
-    
-        
-    print(flashcards_text)
+    cards = FlashcardParser().feed(response.choices[0].message.content or "")[:count]
+    return [card._replace(section=section.title) for card in cards]
+
+
+def generate_flashcards(summary, count=None, sections=None):
+    """
+    Returns the Cards generated for a summary, without duplicates. See plan_sections() for how long summaries are
+    split and how many cards every section gets; sections are generated concurrently.
+    """
+    plan = plan_sections(summary, count, sections)
+    if len(plan) == 1:
+        return dedupe(generate_section(*plan[0]))
+    with ThreadPoolExecutor(max_workers=min(len(plan), settings.FLASHCARDS_MAX_WORKERS)) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, generate_section, section, section_count)
+                   for section, section_count in plan]
+        return dedupe(card for future in futures for card in future.result())
+
+
+def stream_section(section, count):
+    parser = FlashcardParser()
+    generated = 0
+    for delta in stream_chat_completion(
+        model=FLASHCARD_MODEL,
+        messages=flashcard_messages(section.html, count),
+        max_tokens=card_budget(count),
+        temperature=0.7,
+        response_format=FLASHCARD_SCHEMA,
+        feature='flashcards',
+    ):
+        for card in parser.feed(delta):
+            if generated < count:
+                generated += 1
+                yield card._replace(section=section.title)
+
 
-    return flashcards_text
\ No newline at end of file
+# Streaming counterpart of generate_flashcards(), yielding each Card as soon as it is complete. When the summary
+# is split, the sections are generated concurrently and each one's cards are yielded once it has finished.
+def stream_flashcards(summary, count=None, sections=None):
+    plan = plan_sections(summary, count, sections)
+    seen = set()
+    if len(plan) == 1:
+        for card in stream_section(*plan[0]):
+            yield from dedupe([card], seen)
+        return
+    executor = ThreadPoolExecutor(max_workers=min(len(plan), settings.FLASHCARDS_MAX_WORKERS))
+    try:
+        futures = [executor.submit(contextvars.copy_context().run, generate_section, section, section_count)
+                   for section, section_count in plan]
+        for future in as_completed(futures):
+            yield from dedupe(future.result(), seen)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,78 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from flashcards_api.models import UserFlashCards
+from llm_api.persist import save_generated
+from quiz_api.models import TestChoices, TestQuestion, UserTest
+from summarizer_api.models import UserNotes
+
+CHOICES_PER_QUESTION = 6
+
+
+def per_row_deck(note, cards):
+    for i in range(cards):
+        UserFlashCards.objects.create(noteID=note, frontCardText=f"Term {i}", backCardText=f"Definition {i}")
+
+
+def bulk_deck(note, cards):
+    save_generated((UserFlashCards, [
+        UserFlashCards(noteID=note, frontCardText=f"Term {i}", backCardText=f"Definition {i}") for i in range(cards)
+    ]))
+
+
+def per_row_test(note, questions):
+    test = UserTest.objects.create(note=note)
+    for i in range(questions):
+        question = TestQuestion.objects.create(test=test, TestQuestion=f"Question {i}")
+        for j in range(CHOICES_PER_QUESTION):
+            TestChoices.objects.create(question=question, item_choice_text=f"Choice {j}", isAnswer=j == 0)
+
+
+def bulk_test(note, questions):
+    save_generated(
+        (UserTest, [UserTest(note=note)]),
+        (TestQuestion, lambda tests: [TestQuestion(test=tests[0], TestQuestion=f"Question {i}")
+                                      for i in range(questions)]),
+        (TestChoices, lambda tests, saved: [TestChoices(question=question, item_choice_text=f"Choice {j}",
+                                                        isAnswer=j == 0)
+                                            for question in saved for j in range(CHOICES_PER_QUESTION)]),
+    )
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks saving generated flashcards and tests one row at a time against save_generated, in inserts "
+            "per second on the configured database. Creates a throwaway user and notes and deletes them afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200],
+                            help="Cards per deck and questions per test.")
+        parser.add_argument('--repeat', type=int, default=5, help="Decks and tests saved per size and path.")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create_user(firstname="Benchmark", lastname="User", password=None,
+                                                    email=f"benchmark-{uuid.uuid4().hex[:12]}@example.com")
+        try:
+            self.stdout.write(f"{'kind':>10} {'size':>6} {'rows':>7} {'per row/s':>11} {'bulk/s':>10} {'speedup':>9}")
+            for kind, per_row, bulk, rows_per in (
+                ('flashcards', per_row_deck, bulk_deck, 1),
+                ('test', per_row_test, bulk_test, 1 + CHOICES_PER_QUESTION),
+            ):
+                for size in options['sizes']:
+                    rates = []
+                    for save in (per_row, bulk):
+                        # notes with a summary are not queued for summarizing
+                        notes = [UserNotes.objects.create(user=user, notecontents="benchmark", notesummary="benchmark")
+                                 for _ in range(options['repeat'])]
+                        start = time.perf_counter()
+                        for note in notes:
+                            save(note, size)
+                        elapsed = time.perf_counter() - start
+                        rows = options['repeat'] * (size * rows_per + (kind == 'test'))
+                        rates.append(rows / elapsed)
+                    self.stdout.write(f"{kind:>10} {size:>6} {rows:>7} {rates[0]:>11.0f} {rates[1]:>10.0f} "
+                                      f"{rates[1] / rates[0]:>8.1f}x")
+        finally:
+            user.delete()
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards_api', '0003_alter_userflashcards_backcardtext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userflashcards',
+            name='section',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='Section'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards_api', '0004_flashcard_section'),
+        ('summarizer_api', '0011_upload_tokens_saved'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userflashcards',
+            index=models.Index(fields=['noteID', 'id'], name='flashcards__noteID__0569b7_idx'),
+        ),
+    ]
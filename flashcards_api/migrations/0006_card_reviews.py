@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Existing cards get a review state due now, the same as new cards.
+def add_reviews(apps, schema_editor):
+    UserFlashCards = apps.get_model('flashcards_api', 'UserFlashCards')
+    CardReview = apps.get_model('flashcards_api', 'CardReview')
+    now = timezone.now()
+    batch = []
+    for card_id, user_id in UserFlashCards.objects.values_list('id', 'noteID__user_id').iterator():
+        batch.append(CardReview(card_id=card_id, user_id=user_id, due_at=now))
+        if len(batch) == 1000:
+            CardReview.objects.bulk_create(batch)
+            batch = []
+    CardReview.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards_api', '0005_flashcard_deck_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardReview',
+            fields=[
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review', serialize=False, to='flashcards_api.userflashcards')),
+                ('ease', models.FloatField(default=2.5, verbose_name='Ease')),
+                ('interval_days', models.IntegerField(default=0, verbose_name='Interval (days)')),
+                ('repetitions', models.IntegerField(default=0, verbose_name='Repetitions')),
+                ('lapses', models.IntegerField(default=0, verbose_name='Lapses')),
+                ('due_at', models.DateTimeField(verbose_name='Due At')),
+                ('last_reviewed_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Reviewed At')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='card_reviews', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Card Review',
+                'verbose_name_plural': 'Card Reviews',
+                'indexes': [models.Index(fields=['user', 'due_at'], name='flashcards__user_id_afcebc_idx')],
+            },
+        ),
+        migrations.RunPython(add_reviews, migrations.RunPython.noop),
+    ]
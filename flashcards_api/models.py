@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from summarizer_api.models import UserNotes
@@ -7,13 +8,35 @@ class UserFlashCards(models.Model):
     noteID = models.ForeignKey(UserNotes, on_delete=models.CASCADE)
     frontCardText = models.CharField(_("Front Card Text"), max_length=100, default="")
     backCardText = models.CharField(_("Back Card Text"), max_length=500, default="")
+    # the h2 heading of the summary section the card was generated from, empty if the summary wasn't split
+    section = models.CharField(_("Section"), max_length=200, blank=True, default="")
     
     class Meta: 
         verbose_name = _("User FlashCard")
         verbose_name_plural = _("User FlashCards")
+        # a note's deck is paged in id order (see pagination.py)
+        indexes = [models.Index(fields=['noteID', 'id'])]
     
     def __str__(self):
         return str(self.noteID) + " " + str(self.frontCardText)
-        
-    
-    
+
+
+# Spaced-repetition state of a card (SM-2, see scheduler.py). Every card gets one when it is created, due straight
+# away. The owner is stored with it so the due queue is a range of the (user, due_at) index.
+class CardReview(models.Model):
+    card = models.OneToOneField(UserFlashCards, on_delete=models.CASCADE, primary_key=True, related_name='review')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='card_reviews')
+    ease = models.FloatField(_("Ease"), default=2.5)
+    interval_days = models.IntegerField(_("Interval (days)"), default=0)
+    repetitions = models.IntegerField(_("Repetitions"), default=0)
+    lapses = models.IntegerField(_("Lapses"), default=0)
+    due_at = models.DateTimeField(_("Due At"))
+    last_reviewed_at = models.DateTimeField(_("Last Reviewed At"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Card Review")
+        verbose_name_plural = _("Card Reviews")
+        indexes = [models.Index(fields=['user', 'due_at'])]
+
+    def __str__(self):
+        return f"{self.card} due {self.due_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,11 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+# Decks are paged in the order the cards were created, by primary key, so a page is an index range scan however
+# far into the deck it is and cards added while paging don't shift the pages that follow.
+class FlashcardCursorPagination(CursorPagination):
+    ordering = 'id'
+    page_size = settings.FLASHCARDS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.FLASHCARDS_MAX_PAGE_SIZE
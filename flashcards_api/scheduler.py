@@ -0,0 +1,69 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import CardReview
+
+# SM-2 spaced repetition. A review is graded 0-5: below 3 the card was forgotten, it starts over and comes back
+# after FLASHCARDS_RELEARN_MINUTES; otherwise it comes back after 1 day, then 6, then the last interval times its
+# ease. The ease moves with every grade and never drops below MIN_EASE.
+
+MIN_EASE = 1.3
+PASSING_GRADE = 3
+
+
+def new_review(card, user_id, now=None):
+    return CardReview(card=card, user_id=user_id, due_at=now or timezone.now())
+
+
+def schedule(review, grade, reviewed_at):
+    """
+    Updates a CardReview (not saved) for a review graded `grade` at `reviewed_at`.
+    """
+    if grade < PASSING_GRADE:
+        review.repetitions = 0
+        review.interval_days = 0
+        review.lapses += 1
+        review.due_at = reviewed_at + timedelta(minutes=settings.FLASHCARDS_RELEARN_MINUTES)
+    else:
+        review.repetitions += 1
+        if review.repetitions == 1:
+            review.interval_days = 1
+        elif review.repetitions == 2:
+            review.interval_days = 6
+        else:
+            review.interval_days = max(review.interval_days + 1, round(review.interval_days * review.ease))
+        review.due_at = reviewed_at + timedelta(days=review.interval_days)
+    review.ease = max(MIN_EASE, review.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    review.last_reviewed_at = reviewed_at
+    return review
+
+
+def due_reviews(user, limit, now=None):
+    """
+    The user's `limit` most overdue cards, read as one range of the (user, due_at) index.
+    """
+    return (CardReview.objects
+            .filter(user=user, due_at__lte=now or timezone.now())
+            .order_by('due_at')
+            .select_related('card', 'card__noteID')[:limit])
+
+
+def submit_reviews(user, results):
+    """
+    Applies a study session's results, a list of {'card': id, 'grade': 0-5, 'reviewed_at': datetime}, in the
+    order they were reviewed. The states are read in one query and written back in another. Returns the updated
+    CardReviews and the ids of cards that aren't the user's (or no longer exist).
+    """
+    results = sorted(results, key=lambda result: result['reviewed_at'])
+    with transaction.atomic():
+        reviews = CardReview.objects.select_for_update().filter(user=user).in_bulk(
+            {result['card'] for result in results})
+        for result in results:
+            if result['card'] in reviews:
+                schedule(reviews[result['card']], result['grade'], result['reviewed_at'])
+        CardReview.objects.bulk_update(
+            reviews.values(), ['ease', 'interval_days', 'repetitions', 'lapses', 'due_at', 'last_reviewed_at'],
+            batch_size=500)
+    missing = sorted({result['card'] for result in results} - reviews.keys())
+    return list(reviews.values()), missing
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import UserFlashCards
+from django.conf import settings
+from .models import UserFlashCards, CardReview
 from summarizer_api.models import UserNotes
 
 class UserNotesSerializer(serializers.ModelSerializer):
@@ -11,4 +12,20 @@ class UserFlashCardsSerializer(serializers.ModelSerializer):
     note_title = serializers.CharField(source='noteID.notetitle', read_only=True)
     class Meta:
         model = UserFlashCards
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class CardReviewSerializer(serializers.ModelSerializer):
+    card = UserFlashCardsSerializer(read_only=True)
+    class Meta:
+        model = CardReview
+        fields = ['card', 'ease', 'interval_days', 'repetitions', 'lapses', 'due_at', 'last_reviewed_at']
+
+class ReviewResultSerializer(serializers.Serializer):
+    card = serializers.IntegerField()
+    grade = serializers.IntegerField(min_value=0, max_value=5)
+    # when the card was reviewed, for sessions sent after the fact; defaults to when the session is submitted
+    reviewed_at = serializers.DateTimeField(required=False)
+
+class ReviewSessionSerializer(serializers.Serializer):
+    reviews = serializers.ListField(child=ReviewResultSerializer(), allow_empty=False,
+                                    max_length=settings.FLASHCARDS_REVIEW_BATCH_MAX)
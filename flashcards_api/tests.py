@@ -1,3 +1,167 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from summarizer_api.models import UserNotes
+from .models import UserFlashCards, CardReview
+from .flashcards import Card, FlashcardParser, share_cards
+from .scheduler import new_review
 
-# Create your tests here.
+
+class FlashcardListQueryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            firstname="Test", lastname="User", email="flashcards@example.com", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # a note with a summary is not queued for summarizing
+        self.note = UserNotes.objects.create(user=self.user, notetitle="Cells", notecontents="...", notesummary="...")
+
+    def add_cards(self, count):
+        UserFlashCards.objects.bulk_create(
+            UserFlashCards(noteID=self.note, frontCardText=f"Term {i}", backCardText=f"Definition {i}")
+            for i in range(count)
+        )
+
+    def test_list_queries_do_not_grow_with_the_deck(self):
+        self.add_cards(300)
+        for url in ('/flashcards_api/v1/user-flashcards/', f'/flashcards_api/v1/note-flashcards/{self.note.id}/'):
+            with self.subTest(url=url), self.assertNumQueries(1):
+                response = self.client.get(url, {'page_size': 250})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), 250)
+            self.assertEqual(response.data['results'][0]['note_title'], "Cells")
+
+    def test_cursor_pages_cover_the_deck_once(self):
+        self.add_cards(25)
+        seen = []
+        url = f'/flashcards_api/v1/note-flashcards/{self.note.id}/?page_size=10'
+        while url:
+            response = self.client.get(url)
+            seen += [card['id'] for card in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, sorted(UserFlashCards.objects.values_list('id', flat=True)))
+
+
+class ReviewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            firstname="Test", lastname="User", email="reviews@example.com", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        note = UserNotes.objects.create(user=self.user, notetitle="Cells", notecontents="...", notesummary="...")
+        now = timezone.now()
+        self.cards = UserFlashCards.objects.bulk_create(
+            UserFlashCards(noteID=note, frontCardText=f"Term {i}", backCardText=f"Definition {i}") for i in range(30))
+        CardReview.objects.bulk_create(
+            new_review(card, self.user.pk, now - timedelta(minutes=i)) for i, card in enumerate(self.cards))
+
+    def test_due_cards_are_one_query_most_overdue_first(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/flashcards_api/v1/review/due/', {'limit': 5})
+        self.assertEqual([review['card']['id'] for review in response.data['due']],
+                         [card.id for card in self.cards[::-1][:5]])
+
+    def test_session_schedules_every_card(self):
+        other = get_user_model().objects.create_user(
+            firstname="Other", lastname="User", email="other@example.com", password="password")
+        other_note = UserNotes.objects.create(user=other, notetitle="Other", notecontents="...", notesummary="...")
+        other_card = UserFlashCards.objects.create(noteID=other_note)
+        new_review(other_card, other.pk).save()
+
+        response = self.client.post('/flashcards_api/v1/review/submit/', {'reviews': [
+            {'card': self.cards[0].id, 'grade': 5},
+            {'card': self.cards[1].id, 'grade': 1},
+            {'card': other_card.id, 'grade': 5},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['skipped'], [other_card.id])
+
+        passed, failed = CardReview.objects.get(pk=self.cards[0].id), CardReview.objects.get(pk=self.cards[1].id)
+        self.assertEqual((passed.repetitions, passed.interval_days), (1, 1))
+        self.assertEqual((failed.repetitions, failed.lapses), (0, 1))
+        self.assertLess(failed.due_at, passed.due_at)
+        self.assertIsNone(CardReview.objects.get(pk=other_card.id).last_reviewed_at)
+
+
+class ShareCardsTests(SimpleTestCase):
+    def test_shares_add_up_to_the_count(self):
+        self.assertEqual(share_cards(10, [1, 100, 50, 3]), [1, 5, 3, 1])
+        self.assertEqual(sum(share_cards(40, [5, 300, 200])), 40)
+        self.assertEqual(share_cards(7, [3, 3, 3]), [3, 2, 2])
+
+    def test_every_section_gets_a_card(self):
+        self.assertEqual(share_cards(5, [10] * 10), [1] * 10)
+
+
+def feed_in_pieces(text, size):
+    parser = FlashcardParser()
+    cards = []
+    for i in range(0, len(text), size):
+        cards += parser.feed(text[i:i + size])
+    return cards
+
+
+class FlashcardParserTests(SimpleTestCase):
+    cards = [{"Front": "Osmosis", "Back": "Diffusion of water"}, {"Front": "ATP", "Back": "Energy currency"}]
+
+    def test_cards_split_across_pieces(self):
+        text = json.dumps({"flashcards": self.cards})
+        for size in (1, 3, 7, len(text)):
+            with self.subTest(size=size):
+                self.assertEqual(feed_in_pieces(text, size),
+                                 [Card("Osmosis", "Diffusion of water"), Card("ATP", "Energy currency")])
+
+    def test_escaped_quotes_and_braces_in_strings(self):
+        card = {"Front": 'The "cell" {wall}', "Back": 'Ends in \\ and has } ] [ {'}
+        text = json.dumps({"flashcards": [card, self.cards[0]]})
+        self.assertEqual(feed_in_pieces(text, 2), [Card(card["Front"], card["Back"]), Card("Osmosis", "Diffusion of water")])
+
+    def test_bare_list(self):
+        self.assertEqual(feed_in_pieces(json.dumps(self.cards), 5),
+                         [Card("Osmosis", "Diffusion of water"), Card("ATP", "Energy currency")])
+
+    def test_truncated_mid_card(self):
+        text = json.dumps({"flashcards": self.cards})
+        cut = text.index('"ATP"') + 3
+        self.assertEqual(feed_in_pieces(text[:cut], 4), [Card("Osmosis", "Diffusion of water")])
+
+    def test_objects_that_are_not_cards_are_skipped(self):
+        text = json.dumps({"flashcards": [{"Front": "", "Back": "x"}, {"Back": "x"}, self.cards[1]]})
+        self.assertEqual(FlashcardParser().feed(text), [Card("ATP", "Energy currency")])
+
+
+class StreamFlashcardsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            firstname="Test", lastname="User", email="stream@example.com", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.note = UserNotes.objects.create(user=self.user, notetitle="Cells", notecontents="...", notesummary="...")
+
+    def stream(self, deltas):
+        def stream_chat_completion(**kwargs):
+            for delta in deltas:
+                if isinstance(delta, Exception):
+                    raise delta
+                yield delta
+        with mock.patch('flashcards_api.flashcards.stream_chat_completion', side_effect=stream_chat_completion):
+            response = self.client.post(f'/flashcards_api/v1/create-flashcards/{self.note.id}/stream/')
+            return b"".join(response.streaming_content).decode()
+
+    def test_cards_completed_before_a_failure_are_saved_once(self):
+        text = json.dumps({"flashcards": FlashcardParserTests.cards})
+        body = self.stream([text[:text.index('"ATP"')], RuntimeError("connection lost")])
+        self.assertIn('"saved": 1', body)
+        self.assertEqual(UserFlashCards.objects.filter(noteID=self.note).count(), 1)
+
+    def test_failed_save_is_reported(self):
+        text = json.dumps({"flashcards": FlashcardParserTests.cards})
+        with mock.patch('flashcards_api.views.save_deck', side_effect=RuntimeError("database is locked")) as save:
+            body = self.stream([text])
+        self.assertEqual(save.call_count, 1)
+        self.assertIn("event: error", body)
+        self.assertIn('"saved": 0', body)
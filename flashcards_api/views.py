@@ -1,60 +1,165 @@
 from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import UserFlashCards
+from .models import UserFlashCards, CardReview
 from summarizer_api.models import UserNotes
-from .serializers import UserNotesSerializer, UserFlashCardsSerializer
-import json
+from .serializers import UserFlashCardsSerializer, CardReviewSerializer, ReviewSessionSerializer
+import traceback
+from django.conf import settings
+from django.utils import timezone
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework.permissions import IsAuthenticated
-from .flashcards import generate_flashcards
+from rest_framework.renderers import JSONRenderer
+from summarizer_api.views import EventStreamRenderer, sse_event
+from .pagination import FlashcardCursorPagination
+from .scheduler import due_reviews, new_review, submit_reviews
+from .flashcards import card_count, generate_flashcards, split_sections, stream_flashcards
+from llm_api.ledger import usage_context
+from llm_api.persist import save_generated
 
+# The note is joined in for note_title, so a page of cards is one query.
 class UserFlashcardsListView(generics.ListAPIView):
     serializer_class = UserFlashCardsSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FlashcardCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        return UserFlashCards.objects.filter(noteID__user=user)
+        return UserFlashCards.objects.filter(noteID__user=user).select_related('noteID')
 
 class NoteFlashcardsListView(generics.ListAPIView):
     serializer_class = UserFlashCardsSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FlashcardCursorPagination
 
     def get_queryset(self):
         note_id = self.kwargs['note_id']
         user = self.request.user
-        return UserFlashCards.objects.filter(noteID_id=note_id, noteID__user=user)
+        return UserFlashCards.objects.filter(noteID_id=note_id, noteID__user=user).select_related('noteID')
+
+# Optional number of cards to generate, sent as "count" in the request body.
+def requested_count(request):
+    count = request.data.get('count')
+    if count in (None, ""):
+        return None
+    return card_count(count)
+
+# Optional section of the summary (the text of its h2 heading) to generate the cards of again, sent as "section".
+def requested_section(request, note):
+    section = request.data.get('section')
+    if section is None:
+        return None
+    if section not in [part.title for part in split_sections(note.notesummary)]:
+        raise ValueError(f"The summary has no section {section!r}.")
+    return section
+
+# Saves generated cards in one go. Cards generated again for a section replace that section's old cards.
+def save_deck(note, cards, section=None):
+    with transaction.atomic():
+        if section is not None:
+            UserFlashCards.objects.filter(noteID=note, section=section).delete()
+        flashcards, _ = save_generated(
+            (UserFlashCards, [
+                UserFlashCards(noteID=note, frontCardText=card.front, backCardText=card.back, section=card.section)
+                for card in cards
+            ]),
+            (CardReview, lambda flashcards: [new_review(flashcard, note.user_id) for flashcard in flashcards]),
+        )
+    return flashcards
+
 
 class CreateFlashcardsView(APIView):
     def post(self, request, note_id):
-        note = generics.get_object_or_404(UserNotes, id=note_id)
+        note = generics.get_object_or_404(UserNotes, id=note_id, user=request.user)
         paragraph = note.notesummary
 
         if not paragraph:
             return Response({"status": "error", "message": "Note summary is empty."}, status=status.HTTP_400_BAD_REQUEST)
 
-        JSON_DATA = generate_flashcards(paragraph)
-        
+        try:
+            count = requested_count(request)
+        except (TypeError, ValueError):
+            return Response({"status": "error", "message": "count must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            section = requested_section(request, note)
+        except ValueError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with usage_context(user=request.user):
+            cards = generate_flashcards(paragraph, count, None if section is None else [section])
+
+        if not cards:
+            return Response({"status": "error", "message": "No flashcards were generated."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # the whole deck is generated before anything is saved, then saved in one go
+        flashcards = save_deck(note, cards, section)
+        flashcards_list = UserFlashCardsSerializer(flashcards, many=True).data
+
+        return Response({"status": "success", "flashcards": flashcards_list}, status=status.HTTP_201_CREATED)
+
+# Generates flashcards for a note as Server-Sent Events: a 'flashcard' event with each card as soon as the model
+# has finished it, then 'done' with the saved deck. The cards are saved together at the end; if the stream fails
+# or the client goes away part way, the cards completed by then are still saved (unless they were to replace a
+# section's cards, which are then left as they were).
+class CreateFlashcardsStreamView(APIView):
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def post(self, request, note_id):
+        note = generics.get_object_or_404(UserNotes, id=note_id, user=request.user)
+
+        if not note.notesummary:
+            return Response({"status": "error", "message": "Note summary is empty."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            flashcards_data = json.loads(JSON_DATA)
-            flashcards_list = []
-            
-            for flashcard in flashcards_data:
-                front = flashcard.get('Front', '')
-                back = flashcard.get('Back', '')
-                
-                flashcard_instance = UserFlashCards.objects.create(
-                    noteID=note,
-                    frontCardText=front,
-                    backCardText=back
-                )
-                flashcards_list.append(UserFlashCardsSerializer(flashcard_instance).data)
-                
-            return Response({"status": "success", "flashcards": flashcards_list}, status=status.HTTP_201_CREATED)
-        
-        except json.JSONDecodeError:
-            return Response({"status": "error", "message": "Failed to decode JSON response."}, status=status.HTTP_400_BAD_REQUEST)
+            count = requested_count(request)
+        except (TypeError, ValueError):
+            return Response({"status": "error", "message": "count must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            section = requested_section(request, note)
+        except ValueError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            (sse_event(event, data) for event, data in stream_note_flashcards(note, count, section)),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+def stream_note_flashcards(note, count, section=None):
+    cards = []
+    complete = False
+    saved = []
+    try:
+        with usage_context(user=note.user_id):
+            for card in stream_flashcards(note.notesummary, count, None if section is None else [section]):
+                cards.append(card)
+                yield 'flashcard', {'index': len(cards) - 1, 'frontCardText': card.front, 'backCardText': card.back,
+                                    'section': card.section}
+        complete = True
+    except Exception:
+        traceback.print_exc()
+    finally:
+        # the one place the cards are saved, also reached when the client goes away part way
+        saved = save_streamed(note, cards, section, complete)
+    if complete and saved is not None:
+        yield 'done', {'flashcards': UserFlashCardsSerializer(saved, many=True).data}
+    else:
+        yield 'error', {'message': "Flashcard generation failed.", 'saved': len(saved or [])}
+
+# Saves the cards a stream got to, returning them, or None if saving failed. A section's cards are only replaced
+# by a complete set.
+def save_streamed(note, cards, section, complete):
+    if not cards or (section is not None and not complete):
+        return []
+    try:
+        return save_deck(note, cards, section)
+    except Exception:
+        traceback.print_exc()
+        return None
 
 class EditFlashcardView(APIView):
     def put(self, request, flashcard_id):
@@ -72,7 +177,9 @@ class AddFlashcardView(APIView):
         serializer = UserFlashCardsSerializer(data=request.data)
 
         if serializer.is_valid():
-            serializer.save(noteID=note)
+            with transaction.atomic():
+                flashcard = serializer.save(noteID=note)
+                new_review(flashcard, note.user_id).save()
             return Response({"status": "success", "flashcard": serializer.data}, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -82,3 +189,37 @@ class DeleteFlashcardView(APIView):
         flashcard = generics.get_object_or_404(UserFlashCards, id=flashcard_id)
         flashcard.delete()
         return Response({"status": "success", "message": "Flashcard deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
+
+# The next cards due for review, most overdue first: ?limit= of them (FLASHCARDS_DUE_LIMIT by default).
+class DueFlashcardsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', settings.FLASHCARDS_DUE_LIMIT))
+        except ValueError:
+            return Response({"status": "error", "message": "limit must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.FLASHCARDS_DUE_MAX_LIMIT))
+        reviews = due_reviews(request.user, limit)
+        return Response({"status": "success", "due": CardReviewSerializer(reviews, many=True).data})
+
+# Takes the results of a whole study session at once: {"reviews": [{"card": id, "grade": 0-5, "reviewed_at": ...}]}
+# and schedules every card's next review. Cards that aren't the user's are skipped and listed in "skipped".
+class SubmitReviewsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ReviewSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        results = [{**result, 'reviewed_at': min(result.get('reviewed_at', now), now)}
+                   for result in serializer.validated_data['reviews']]
+        reviews, skipped = submit_reviews(request.user, results)
+        return Response({
+            "status": "success",
+            "reviews": [{"card": review.card_id, "due_at": review.due_at, "interval_days": review.interval_days,
+                         "ease": review.ease} for review in reviews],
+            "skipped": skipped,
+        })
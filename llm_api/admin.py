@@ -0,0 +1,20 @@
+from django.contrib import admin
+from .models import LLMUsage
+
+# Register your models here.
+
+class LLMUsageAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'feature', 'model', 'user', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'retries', 'cache_status']
+    list_filter = ['feature', 'model', 'cache_status']
+
+    # the ledger is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+admin.site.register(LLMUsage, LLMUsageAdmin)
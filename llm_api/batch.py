@@ -0,0 +1,130 @@
+import json
+from abc import ABC, abstractmethod
+import shutil
+import uuid
+from pathlib import Path
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .client import get_backend
+
+BATCH_IN_PROGRESS = 'in_progress'
+BATCH_COMPLETED = 'completed'
+BATCH_FAILED = 'failed'
+
+
+class BatchBackend(ABC):
+    """
+    An offline batch service: a JSONL file of chat completion requests goes in and, some time later (up to a day),
+    a JSONL file of results comes out, at a lower price than live calls. LLM_BATCH_BACKEND names the class to use.
+
+    Each input line is {"custom_id", "method", "url", "body"} and each output line is
+    {"custom_id", "response": {"status_code", "body"}, "error"}, following the OpenAI Batch API.
+
+    status() returns (state, output_file_id) where state is one of the BATCH_* constants above.
+    """
+
+    @abstractmethod
+    def submit(self, input_path):
+        ...
+
+    @abstractmethod
+    def status(self, batch_id):
+        ...
+
+    @abstractmethod
+    def download(self, output_file_id, output_path):
+        ...
+
+
+def batch_request(custom_id, messages, model, **kwargs):
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {"model": model, "messages": messages, **kwargs},
+    }
+
+
+class OpenAIBatchBackend(BatchBackend):
+    def __init__(self):
+        # shares the connection pool and credentials of the live client
+        self.client = get_backend().client
+
+    def submit(self, input_path):
+        with open(input_path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h',
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status == 'completed':
+            return BATCH_COMPLETED, batch.output_file_id
+        if batch.status in ('failed', 'expired', 'cancelled'):
+            return BATCH_FAILED, batch.output_file_id
+        return BATCH_IN_PROGRESS, None
+
+    def download(self, output_file_id, output_path):
+        self.client.files.content(output_file_id).write_to_file(output_path)
+
+
+# File based stand-in for the batch service, for trying out the batch commands without an API key. Batches live in
+# LLM_BATCH_LOCAL_DIR and are "processed" on the first status() call, answering every request with an echo of
+# the start of its last message.
+class LocalBatchBackend(BatchBackend):
+    def __init__(self):
+        self.root = Path(settings.LLM_BATCH_LOCAL_DIR)
+
+    def submit(self, input_path):
+        batch_id = f"batch_local_{uuid.uuid4().hex}"
+        batch_dir = self.root / batch_id
+        batch_dir.mkdir(parents=True)
+        shutil.copyfile(input_path, batch_dir / 'input.jsonl')
+        return batch_id
+
+    def status(self, batch_id):
+        batch_dir = self.root / batch_id
+        if not (batch_dir / 'input.jsonl').exists():
+            return BATCH_FAILED, None
+        output_path = batch_dir / 'output.jsonl'
+        if not output_path.exists():
+            self._process(batch_dir / 'input.jsonl', output_path)
+        return BATCH_COMPLETED, str(output_path)
+
+    def download(self, output_file_id, output_path):
+        shutil.copyfile(output_file_id, output_path)
+
+    def _process(self, input_path, output_path):
+        partial_path = output_path.with_suffix('.partial')
+        with open(input_path, encoding='utf-8') as src, open(partial_path, 'w', encoding='utf-8') as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                body = request['body']
+                prompt = body['messages'][-1]['content']
+                content = f"<h2>Overview Summary</h2><p>{prompt[:200]}</p>"
+                dst.write(json.dumps({
+                    "id": f"response_{uuid.uuid4().hex}",
+                    "custom_id": request['custom_id'],
+                    "response": {
+                        "status_code": 200,
+                        "body": {
+                            "model": body['model'],
+                            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                         "finish_reason": "stop"}],
+                            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                                      "total_tokens": (len(prompt) + len(content)) // 4},
+                        },
+                    },
+                    "error": None,
+                }) + "\n")
+        partial_path.rename(output_path)
+
+
+def get_batch_backend():
+    return import_string(settings.LLM_BATCH_BACKEND)()
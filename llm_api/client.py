@@ -0,0 +1,136 @@
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+import httpx
+from django.conf import settings
+from django.utils.module_loading import import_string
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from .ledger import record_completion
+
+# Errors worth retrying: the request never reached the model, timed out, was rate limited or hit a 5xx.
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend(ABC):
+    """
+    Everything the app needs from an LLM provider. LLM_BACKEND names the class to use, so the whole app can be
+    pointed at another provider or a local stand-in by swapping one setting.
+
+    chat() returns an OpenAI-style chat completion, stream_chat() an iterator of OpenAI-style completion chunks.
+    """
+
+    @abstractmethod
+    def chat(self, messages, model, timeout, **kwargs):
+        ...
+
+    @abstractmethod
+    def stream_chat(self, messages, model, timeout, **kwargs):
+        ...
+
+
+# Talks to the OpenAI API, or to any OpenAI-compatible server (e.g. a local stand-in) when LLM_BASE_URL is set.
+# A single httpx connection pool is shared by every thread and feature, so connections are kept alive and reused.
+class OpenAIBackend(LLMBackend):
+    def __init__(self):
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+        )
+        # retries are handled by chat_completion() so they can honour Retry-After and be recorded in the ledger
+        self.client = OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.LLM_BASE_URL or None,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+
+    def chat(self, messages, model, timeout, **kwargs):
+        return self.client.chat.completions.create(model=model, messages=messages, timeout=timeout, **kwargs)
+
+    def stream_chat(self, messages, model, timeout, **kwargs):
+        return self.client.chat.completions.create(model=model, messages=messages, timeout=timeout, stream=True, **kwargs)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.LLM_BACKEND)()
+    return _backend
+
+
+def feature_timeout(feature):
+    return settings.LLM_TIMEOUTS.get(feature, settings.LLM_TIMEOUT)
+
+
+# Seconds to wait before retrying. A Retry-After header from the server wins; otherwise exponential backoff
+# with full jitter so that many workers hitting the same rate limit don't all retry at the same moment.
+def retry_delay(attempt, error):
+    response = getattr(error, 'response', None)
+    headers = response.headers if response is not None else {}
+    retry_after = headers.get('retry-after-ms')
+    if retry_after is not None:
+        try:
+            return min(float(retry_after) / 1000, settings.LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    retry_after = headers.get('retry-after')
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), settings.LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(settings.LLM_BACKOFF_MAX, settings.LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _with_retries(send, feature):
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        try:
+            return send(), attempt
+        except RETRYABLE_ERRORS as e:
+            if attempt == settings.LLM_MAX_RETRIES:
+                raise
+            delay = retry_delay(attempt, e)
+            logger.warning("%s request failed (%s), retrying in %.1fs", feature, e.__class__.__name__, delay)
+            time.sleep(delay)
+
+
+def chat_completion(messages, model, feature, **kwargs):
+    backend = get_backend()
+    timeout = feature_timeout(feature)
+    started = time.monotonic()
+    response, retries = _with_retries(lambda: backend.chat(messages, model, timeout, **kwargs), feature)
+    record_completion(feature, model, response, started, retries=retries)
+    return response
+
+
+# Yields the content deltas of a streamed completion. Only opening the stream is retried; once text has been
+# handed to the caller a failure is raised as is.
+def stream_chat_completion(messages, model, feature, **kwargs):
+    backend = get_backend()
+    timeout = feature_timeout(feature)
+    started = time.monotonic()
+    stream, retries = _with_retries(
+        lambda: backend.stream_chat(messages, model, timeout, stream_options={"include_usage": True}, **kwargs),
+        feature,
+    )
+    last_event = None
+    for event in stream:
+        last_event = event
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
+    # with include_usage the final event carries the token counts
+    record_completion(feature, model, last_event, started, retries=retries)
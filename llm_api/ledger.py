@@ -0,0 +1,126 @@
+import atexit
+import contextvars
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+# Who the current LLM calls are made for. Set with usage_context() by views and workers; thread pools that make
+# calls on their behalf have to run their tasks in a copy of the caller's context (contextvars.copy_context().run).
+_user_id = contextvars.ContextVar('llm_usage_user_id', default=None)
+_cache_status = contextvars.ContextVar('llm_usage_cache_status', default='none')
+
+
+@contextmanager
+def usage_context(user=None, cache_status=None):
+    resets = []
+    if user is not None:
+        resets.append((_user_id, _user_id.set(getattr(user, 'pk', user))))
+    if cache_status is not None:
+        resets.append((_cache_status, _cache_status.set(cache_status)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(resets):
+            var.reset(token)
+
+
+_STOP = object()
+
+
+# Collects usage records in memory and writes them with bulk_create from a background thread,
+# either once batch_size records are waiting or flush_interval seconds after the first one arrived.
+class UsageLedger:
+    def __init__(self, batch_size, flush_interval, max_pending=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def record(self, **fields):
+        self._ensure_started()
+        try:
+            self.pending.put_nowait(fields)
+        except queue.Full:
+            print("warning: LLM usage ledger is full, dropping a record")
+
+    # Stops the writer thread after it has written the batch it is holding, then writes anything still queued.
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.pending.put(_STOP)
+            self.thread.join(timeout=10)
+        self.flush()
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                item = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        self._write(batch)
+
+    def _ensure_started(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='llm-usage-ledger', daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self.pending.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                timeout = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    item = self.pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            close_old_connections()
+            self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        from .models import LLMUsage
+        try:
+            LLMUsage.objects.bulk_create([LLMUsage(**fields) for fields in batch])
+        except Exception as e:
+            print(f"warning: could not write {len(batch)} LLM usage records ({e})")
+
+
+ledger = UsageLedger(settings.LLM_USAGE_BATCH_SIZE, settings.LLM_USAGE_FLUSH_SECONDS)
+
+
+# Records one completion. `started` is the time.monotonic() value taken just before the request was sent.
+def record_completion(feature, model, response=None, started=None, retries=0, cache_status=None):
+    usage = getattr(response, 'usage', None)
+    ledger.record(
+        # taken now rather than when the ledger writes the batch, which can be flush_interval seconds later
+        created_at=timezone.now(),
+        feature=feature,
+        model=model,
+        user_id=_user_id.get(),
+        prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+        completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+        latency_ms=int((time.monotonic() - started) * 1000) if started is not None else 0,
+        retries=retries,
+        cache_status=cache_status or _cache_status.get(),
+    )
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Created At')),
+                ('feature', models.CharField(db_index=True, max_length=50, verbose_name='Feature')),
+                ('model', models.CharField(max_length=100, verbose_name='Model')),
+                ('prompt_tokens', models.PositiveIntegerField(default=0, verbose_name='Prompt Tokens')),
+                ('completion_tokens', models.PositiveIntegerField(default=0, verbose_name='Completion Tokens')),
+                ('latency_ms', models.PositiveIntegerField(default=0, verbose_name='Latency (ms)')),
+                ('retries', models.PositiveSmallIntegerField(default=0, verbose_name='Retries')),
+                ('cache_status', models.CharField(choices=[('none', 'Not Cached'), ('hit', 'Hit'), ('miss', 'Miss')], default='none', max_length=10, verbose_name='Cache Status')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'LLM Usage',
+                'verbose_name_plural': 'LLM Usage',
+            },
+        ),
+    ]
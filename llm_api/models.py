@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from users.models import User
+
+# Create your models here.
+
+class CacheStatus(models.TextChoices):
+    NONE = 'none', _("Not Cached")
+    HIT = 'hit', _("Hit")
+    MISS = 'miss', _("Miss")
+
+# One row per LLM completion. Rows are only ever inserted (in batches, see ledger.py).
+
+class LLMUsage(models.Model):
+    created_at = models.DateTimeField(_("Created At"), default=timezone.now, db_index=True)
+    feature = models.CharField(_("Feature"), max_length=50, db_index=True)
+    model = models.CharField(_("Model"), max_length=100)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='llm_usage')
+    prompt_tokens = models.PositiveIntegerField(_("Prompt Tokens"), default=0)
+    completion_tokens = models.PositiveIntegerField(_("Completion Tokens"), default=0)
+    latency_ms = models.PositiveIntegerField(_("Latency (ms)"), default=0)
+    retries = models.PositiveSmallIntegerField(_("Retries"), default=0)
+    cache_status = models.CharField(_("Cache Status"), max_length=10, choices=CacheStatus.choices, default=CacheStatus.NONE)
+
+    class Meta:
+        verbose_name = _("LLM Usage")
+        verbose_name_plural = _("LLM Usage")
+
+    def __str__(self):
+        return f"{self.feature} {self.model} ({self.prompt_tokens}+{self.completion_tokens} tokens)"
@@ -0,0 +1,21 @@
+from django.db import transaction
+
+# Everything a generator (flashcards, quiz questions and their choices) produces for one request is saved here:
+# one bulk_create per model, all inside one transaction. A deck is saved whole or not at all, and SQLite commits
+# once per request instead of once per row.
+
+BATCH_SIZE = 500
+
+
+def save_generated(*batches, batch_size=BATCH_SIZE):
+    """
+    Saves (model, objects) pairs in order and returns the saved lists, with primary keys set. `objects` may be a
+    callable that builds them from the lists saved before it, for rows that point at those (choices at questions).
+    """
+    saved = []
+    with transaction.atomic():
+        for model, objects in batches:
+            if callable(objects):
+                objects = objects(*saved)
+            saved.append(model.objects.bulk_create(list(objects), batch_size=batch_size))
+    return saved
@@ -0,0 +1,65 @@
+from datetime import timedelta
+from unittest import mock
+import httpx
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from openai import BadRequestError, InternalServerError, RateLimitError
+from .client import _with_retries, retry_delay
+from .ledger import UsageLedger, record_completion
+from .models import LLMUsage
+
+
+def api_error(error_class, status_code, headers=None):
+    request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return error_class("error", response=response, body=None)
+
+
+@override_settings(LLM_MAX_RETRIES=3, LLM_BACKOFF_BASE=1, LLM_BACKOFF_MAX=20)
+class RetryTests(SimpleTestCase):
+    def test_retry_after_headers_win(self):
+        self.assertEqual(retry_delay(0, api_error(RateLimitError, 429, {'retry-after-ms': '1500', 'retry-after': '9'})), 1.5)
+        self.assertEqual(retry_delay(0, api_error(RateLimitError, 429, {'retry-after': '3'})), 3)
+        self.assertEqual(retry_delay(0, api_error(RateLimitError, 429, {'retry-after': '600'})), 20)
+
+    def test_backoff_is_jittered_up_to_a_cap(self):
+        error = api_error(InternalServerError, 500, {'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        for attempt, ceiling in ((0, 1), (1, 2), (3, 8), (10, 20)):
+            with self.subTest(attempt=attempt):
+                delays = [retry_delay(attempt, error) for _ in range(200)]
+                self.assertTrue(all(0 <= delay <= ceiling for delay in delays))
+                self.assertGreater(max(delays), ceiling / 2)
+
+    def test_retryable_errors_are_retried(self):
+        send = mock.Mock(side_effect=[api_error(RateLimitError, 429, {'retry-after': '2'}),
+                                      api_error(InternalServerError, 503), "response"])
+        with mock.patch('llm_api.client.time.sleep') as sleep, self.assertLogs('llm_api.client', 'WARNING') as logs:
+            self.assertEqual(_with_retries(send, 'summarize'), ("response", 2))
+        self.assertEqual(sleep.call_args_list[0], mock.call(2))
+        self.assertEqual(len(logs.records), 2)
+
+    def test_attempts_are_capped(self):
+        error = api_error(RateLimitError, 429, {'retry-after': '1'})
+        send = mock.Mock(side_effect=error)
+        with mock.patch('llm_api.client.time.sleep') as sleep, self.assertLogs('llm_api.client', 'WARNING'):
+            with self.assertRaises(RateLimitError):
+                _with_retries(send, 'summarize')
+        self.assertEqual((send.call_count, sleep.call_count), (4, 3))
+
+    def test_other_errors_are_not_retried(self):
+        send = mock.Mock(side_effect=api_error(BadRequestError, 400))
+        with mock.patch('llm_api.client.time.sleep') as sleep, self.assertRaises(BadRequestError):
+            _with_retries(send, 'summarize')
+        self.assertEqual((send.call_count, sleep.call_count), (1, 0))
+
+
+class LedgerTests(TestCase):
+    def test_records_keep_the_time_they_were_made(self):
+        ledger = UsageLedger(batch_size=10, flush_interval=60)
+        made = timezone.now() - timedelta(minutes=5)
+        with mock.patch('llm_api.ledger.ledger', ledger), mock.patch('llm_api.ledger.timezone.now', return_value=made), \
+                mock.patch.object(ledger, '_ensure_started'):
+            record_completion('summary', 'gpt-test', retries=1)
+        ledger.flush()
+        usage = LLMUsage.objects.get()
+        self.assertEqual((usage.created_at, usage.feature, usage.retries), (made, 'summary', 1))
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import LLMUsageRollupView
+
+urlpatterns = [
+    path('usage/', LLMUsageRollupView.as_view(), name='llm-usage-rollup'),
+]
@@ -0,0 +1,45 @@
+from datetime import timedelta
+from django.db.models import Avg, Count, Max, Sum
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .models import LLMUsage
+
+# Create your views here.
+
+def latency_percentile(queryset, count, percentile):
+    if not count:
+        return 0
+    index = min(count - 1, int(count * percentile))
+    return queryset.order_by('latency_ms').values_list('latency_ms', flat=True)[index]
+
+
+# Token, call and latency rollups per feature and per user over the last `days` days (default 30).
+class LLMUsageRollupView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({"status": "error", "message": "days must be a number."}, status=400)
+        usage = LLMUsage.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+        totals = dict(
+            calls=Count('id'),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+            avg_latency_ms=Avg('latency_ms'),
+            max_latency_ms=Max('latency_ms'),
+            retries=Sum('retries'),
+        )
+
+        by_feature = list(usage.values('feature').annotate(**totals).order_by('-prompt_tokens'))
+        for row in by_feature:
+            feature_usage = usage.filter(feature=row['feature'])
+            row['p50_latency_ms'] = latency_percentile(feature_usage, row['calls'], 0.50)
+            row['p99_latency_ms'] = latency_percentile(feature_usage, row['calls'], 0.99)
+
+        by_user = list(usage.values('user', 'user__email').annotate(**totals).order_by('-prompt_tokens')[:100])
+
+        return Response({"days": days, "by_feature": by_feature, "by_user": by_user})
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import OCRCacheEntry, OCRCacheStats
+
+# Register your models here.
+
+class OCRCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['key', 'hit_count', 'created_at', 'last_used_at']
+    readonly_fields = ['key', 'result', 'created_at', 'last_used_at', 'hit_count']
+
+admin.site.register(OCRCacheEntry, OCRCacheEntryAdmin)
+
+
+class OCRCacheStatsAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'hits', 'misses']
+    readonly_fields = ['hits', 'misses']
+
+admin.site.register(OCRCacheStats, OCRCacheStatsAdmin)
@@ -0,0 +1,142 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client
+from typing import List, NamedTuple
+from django.conf import settings
+from .layout import assemble
+from .managers import ocr_cache_key
+from .models import OCRCacheEntry
+
+
+class OCRServiceError(Exception):
+    pass
+
+
+class OCRResult(NamedTuple):
+    text: str  # paragraphs in reading order, see layout.assemble
+    lines: List[dict]  # {'box': [[x, y] * 4], 'text': str, 'confidence': float}
+    inference_ms: int
+    total_ms: int
+    cached: bool = False
+
+
+# One connection per thread, opened on first use and kept for later requests.
+_local = threading.local()
+
+
+def _connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        try:
+            conn = Client(settings.OCR_SERVICE_ADDRESS, authkey=settings.OCR_SERVICE_AUTHKEY)
+        except OSError as e:
+            raise OCRServiceError(f"OCR service is not reachable at {settings.OCR_SERVICE_ADDRESS} ({e}), "
+                                  f"start it with manage.py run_ocr_service") from e
+        _local.conn = conn
+    return conn
+
+
+def _close():
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is not None:
+        conn.close()
+
+
+def request(op, payload=None, timeout=None):
+    # a connection the service has dropped (e.g. after a restart) is reopened once
+    for attempt in range(2):
+        conn = _connection()
+        try:
+            conn.send((op, payload or {}))
+            if not conn.poll(timeout or settings.OCR_TIMEOUT):
+                _close()
+                raise OCRServiceError(f"OCR service did not answer within {timeout or settings.OCR_TIMEOUT}s")
+            status, result = conn.recv()
+            break
+        except (EOFError, OSError) as e:
+            _close()
+            if attempt == 1:
+                raise OCRServiceError(f"lost connection to the OCR service ({e})") from e
+    if status != 'ok':
+        raise OCRServiceError(result)
+    return result
+
+
+def _service_ocr(image, options):
+    result = request('ocr', {'image': image, 'options': options})
+    return OCRResult(
+        text=assemble(result['lines']),
+        lines=result['lines'],
+        inference_ms=result['inference_ms'],
+        total_ms=result['total_ms'],
+    )
+
+
+def _cached_ocr(key):
+    entry = OCRCacheEntry.objects.lookup(key)
+    if entry is None:
+        return None
+    lines = entry.result['lines']
+    return OCRResult(assemble(lines), lines, 0, 0, cached=True)
+
+
+def ocr_image(image, **options):
+    """
+    OCRs one image (encoded image bytes or a numpy array) on the OCR service. Extra keyword arguments are passed
+    to easyocr's readtext, profile= picks the preprocessing profile (OCR_PREPROCESS_PROFILE by default). Pages
+    that were OCRed before with the same settings come from the OCR cache.
+    """
+    options.setdefault('profile', settings.OCR_PREPROCESS_PROFILE)
+    key = ocr_cache_key(image, options)
+    result = _cached_ocr(key)
+    if result is None:
+        result = _service_ocr(image, options)
+        OCRCacheEntry.objects.store(key, {'lines': result.lines})
+    return result
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.OCR_PAGE_CONCURRENCY, thread_name_prefix='ocr-client')
+    return _executor
+
+
+# A page sent to the OCR service by submit_ocr(). The executor's threads only talk to the service; the cache is
+# read and written by the thread that submits the page and collects the result, so they never touch the database.
+class PendingOCR:
+    def __init__(self, key, future=None, cached=None):
+        self.key = key
+        self.future = future
+        self.cached = cached
+
+    def done(self):
+        return self.cached is not None or self.future.done()
+
+    def result(self):
+        if self.cached is None:
+            self.cached = self.future.result()
+            OCRCacheEntry.objects.store(self.key, {'lines': self.cached.lines})
+        return self.cached
+
+
+# Sends a page to the OCR service without waiting for it and returns a PendingOCR. Up to OCR_PAGE_CONCURRENCY
+# pages are sent at once (each over its own connection), so they are spread over the service's worker processes.
+def submit_ocr(image, **options):
+    options.setdefault('profile', settings.OCR_PREPROCESS_PROFILE)
+    key = ocr_cache_key(image, options)
+    cached = _cached_ocr(key)
+    if cached is not None:
+        return PendingOCR(key, cached=cached)
+    return PendingOCR(key, future=get_executor().submit(_service_ocr, image, options))
+
+
+def service_stats():
+    return request('stats', timeout=5)
@@ -0,0 +1,102 @@
+import os
+import time
+from itertools import groupby
+from .preprocess import load_image, pad_to, preprocess, to_grayscale
+
+# Runs inside the OCR service's worker processes (see service.py). This is the only module that imports easyocr,
+# and torch through it, so web processes never load either. The workers are plain processes without Django.
+
+_reader = None
+
+
+# Pool initializer: loads the detection and recognition models once per worker process. Each worker is limited to
+# `threads` intra-op threads so that the workers together don't run more threads than there are cores.
+def init_worker(languages, gpu, threads):
+    global _reader
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    import cv2
+    import torch
+    cv2.setNumThreads(threads)
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    import easyocr
+    _reader = easyocr.Reader(languages, gpu=gpu, verbose=False)
+
+
+def as_lines(results):
+    return [
+        {'box': [[float(x), float(y)] for x, y in box], 'text': text, 'confidence': float(confidence)}
+        for box, text, confidence in results
+    ]
+
+
+def read_image(image, options):
+    """
+    Runs easyocr on one image (encoded image bytes or a numpy array) and returns the detected lines as plain
+    lists, with the time spent in preprocessing and inference and the pid of the worker that did it. The
+    'profile' option picks the preprocessing profile (see preprocess.PROFILES), the rest go to readtext.
+    """
+    options = dict(options)
+    started = time.perf_counter()
+    image = preprocess(image, options.pop('profile', 'none'))
+    preprocessed = time.perf_counter()
+    results = _reader.readtext(image, **options)
+    return {
+        'lines': as_lines(results),
+        'preprocess_ms': int((preprocessed - started) * 1000),
+        'inference_ms': int((time.perf_counter() - preprocessed) * 1000),
+        'pid': os.getpid(),
+    }
+
+
+# Splits pages (padded to a common size) into batches whose padded pixels stay under max_pixels; the detector's
+# memory grows with the pixels in a batch. A page bigger than the budget is a batch of its own.
+def pixel_batches(images, max_pixels):
+    batch = []
+    for image in images:
+        height = max([image.shape[0]] + [page.shape[0] for page in batch])
+        width = max([image.shape[1]] + [page.shape[1] for page in batch])
+        if batch and max_pixels and height * width * (len(batch) + 1) > max_pixels:
+            yield batch
+            batch = []
+        batch.append(image)
+    if batch:
+        yield batch
+
+
+def read_images(pages, max_pixels):
+    """
+    Like read_image for a list of (image, options) pages, with pages that share options run through easyocr's
+    readtext_batched together so the text detector runs on several pages per forward pass. Pages are padded to the
+    size of the largest one in their batch. Returns one result per page, in order; preprocess_ms and inference_ms
+    are each page's share of its batch, and 'batch' is the number of pages it was read with.
+    """
+    results = [None] * len(pages)
+    ordered = sorted(range(len(pages)), key=lambda i: repr(sorted(pages[i][1].items())))
+    for _, indexes in groupby(ordered, key=lambda i: repr(sorted(pages[i][1].items()))):
+        indexes = list(indexes)
+        options = dict(pages[indexes[0]][1])
+        profile = options.pop('profile', 'none')
+        started = time.perf_counter()
+        images = [to_grayscale(load_image(preprocess(pages[i][0], profile))) for i in indexes]
+        preprocess_ms = (time.perf_counter() - started) * 1000 / len(indexes)
+        done = 0
+        for batch in pixel_batches(images, max_pixels):
+            started = time.perf_counter()
+            height, width = max(page.shape[0] for page in batch), max(page.shape[1] for page in batch)
+            if len(batch) == 1:
+                batch_results = [_reader.readtext(batch[0], **options)]
+            else:
+                batch_results = _reader.readtext_batched([pad_to(page, height, width) for page in batch], **options)
+            inference_ms = (time.perf_counter() - started) * 1000 / len(batch)
+            for page_results in batch_results:
+                results[indexes[done]] = {
+                    'lines': as_lines(page_results),
+                    'preprocess_ms': int(preprocess_ms),
+                    'inference_ms': int(inference_ms),
+                    'pid': os.getpid(),
+                    'batch': len(batch),
+                }
+                done += 1
+    return results
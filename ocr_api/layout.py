@@ -0,0 +1,97 @@
+import statistics
+from django.conf import settings
+
+# Turns easyocr's detections back into text. Detections below OCR_MIN_CONFIDENCE are dropped (they are mostly
+# specks, bullets and bits of figures read as letters), the rest are put in reading order with a recursive XY-cut:
+# the page is split at the widest empty horizontal or vertical band, then each part again, so columns are read one
+# after the other and a heading spanning them comes first. The parts that can't be split further are paragraphs;
+# their detections are grouped into lines, and paragraphs are separated by PARAGRAPH_DELIMITER, which is what the
+# summarizer chunks on when it can (see summarizer_api.text_summarizer.pick_delimiter).
+
+PARAGRAPH_DELIMITER = "\n\n"
+
+
+class Box:
+    def __init__(self, line):
+        xs = [x for x, _ in line['box']]
+        ys = [y for _, y in line['box']]
+        self.left, self.right, self.top, self.bottom = min(xs), max(xs), min(ys), max(ys)
+        self.text = line['text'].strip()
+
+    @property
+    def height(self):
+        return self.bottom - self.top
+
+    @property
+    def middle(self):
+        return (self.top + self.bottom) / 2
+
+
+# Empty bands between the boxes along one axis, as (gap size, position) with the position halfway across the gap.
+def gaps(boxes, start, end):
+    spans = sorted((start(box), end(box)) for box in boxes)
+    found = []
+    reach = spans[0][1]
+    for low, high in spans[1:]:
+        if low > reach:
+            found.append((low - reach, (low + reach) / 2))
+        reach = max(reach, high)
+    return found
+
+
+def xy_cut(boxes, line_height, min_row_gap, min_column_gap):
+    """
+    Splits boxes into paragraphs in reading order. A horizontal band at least min_row_gap line heights tall or a
+    vertical one at least min_column_gap line heights wide is a cut; the widest one (relative to its minimum) is
+    cut first and both sides are split again.
+    """
+    if len(boxes) < 2:
+        return [boxes]
+    rows = [(gap / (min_row_gap * line_height), at) for gap, at in gaps(boxes, lambda b: b.top, lambda b: b.bottom)]
+    columns = [(gap / (min_column_gap * line_height), at)
+               for gap, at in gaps(boxes, lambda b: b.left, lambda b: b.right)]
+    row = max(rows, default=(0, 0))
+    column = max(columns, default=(0, 0))
+    if max(row[0], column[0]) < 1:
+        return [boxes]
+    if row[0] >= column[0]:
+        first = [box for box in boxes if box.middle < row[1]]
+        second = [box for box in boxes if box.middle >= row[1]]
+    else:
+        first = [box for box in boxes if (box.left + box.right) / 2 < column[1]]
+        second = [box for box in boxes if (box.left + box.right) / 2 >= column[1]]
+    return (xy_cut(first, line_height, min_row_gap, min_column_gap)
+            + xy_cut(second, line_height, min_row_gap, min_column_gap))
+
+
+# Groups a paragraph's boxes into lines (boxes whose middles are within half a line height of each other), reads
+# every line left to right and joins them, undoing words hyphenated across lines.
+def paragraph_text(boxes, line_height):
+    lines = []
+    for box in sorted(boxes, key=lambda b: b.middle):
+        if lines and abs(box.middle - statistics.fmean(b.middle for b in lines[-1])) <= line_height / 2:
+            lines[-1].append(box)
+        else:
+            lines.append([box])
+    text = ""
+    for line in lines:
+        words = " ".join(box.text for box in sorted(line, key=lambda b: b.left))
+        if text.endswith("-") and words[:1].islower():
+            text = text[:-1] + words
+        else:
+            text = f"{text} {words}" if text else words
+    return text
+
+
+def assemble(lines, min_confidence=None, min_row_gap=0.8, min_column_gap=1.5):
+    """
+    Rebuilds the text of a page from OCR lines ({'box': [[x, y] * 4], 'text': str, 'confidence': float}).
+    """
+    if min_confidence is None:
+        min_confidence = settings.OCR_MIN_CONFIDENCE
+    boxes = [Box(line) for line in lines if line['confidence'] >= min_confidence and line['text'].strip()]
+    if not boxes:
+        return ""
+    line_height = statistics.median(box.height for box in boxes) or 1
+    paragraphs = xy_cut(boxes, line_height, min_row_gap, min_column_gap)
+    return PARAGRAPH_DELIMITER.join(paragraph_text(paragraph, line_height) for paragraph in paragraphs)
@@ -0,0 +1,78 @@
+import os
+import resource
+import time
+from pathlib import Path
+
+import cv2
+import pypdfium2 as pdfium
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr_api import engine
+from summarizer_api.documents import render_page
+
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tif', '.tiff')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = ("Compares OCRing pages one at a time with OCRing them in batches of different sizes, in one process on "
+            "the CPU, and reports pages/s and peak memory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folder', default=str(settings.BASE_DIR / 'test_folder'), help="Images to OCR.")
+        parser.add_argument('--pdf', help="OCR the rendered pages of this PDF instead of --folder.")
+        parser.add_argument('--pages', type=int, default=16,
+                            help="Pages per run; the images are repeated when there are fewer.")
+        parser.add_argument('--batch-sizes', default='2,4,8', help="Comma separated batch sizes to compare.")
+        parser.add_argument('--max-pixels', type=int, default=settings.OCR_BATCH_MAX_PIXELS)
+        parser.add_argument('--threads', type=int, default=settings.OCR_THREADS_PER_WORKER or os.cpu_count() or 1)
+
+    def load_pages(self, options):
+        if options['pdf']:
+            pdf = pdfium.PdfDocument(options['pdf'])
+            try:
+                return [render_page(pdf[index]) for index in range(len(pdf))]
+            finally:
+                pdf.close()
+        images = []
+        for path in sorted(Path(options['folder']).iterdir()):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+                if image is None:
+                    self.stderr.write(f"Skipping {path.name}, it could not be read as an image")
+                else:
+                    images.append(image)
+        return images
+
+    def handle(self, *args, **options):
+        images = self.load_pages(options)
+        if not images:
+            raise CommandError("No pages to OCR")
+        pages = [(images[i % len(images)], {'profile': settings.OCR_PREPROCESS_PROFILE}) for i in range(options['pages'])]
+        sizes = sorted({int(size) for size in options['batch_sizes'].split(',') if size.strip()})
+
+        engine.init_worker(settings.OCR_LANGUAGES, settings.OCR_GPU, options['threads'])
+        # warm up, the first pages are slower while torch allocates
+        engine.read_image(*pages[0])
+
+        self.stdout.write(f"{len(pages)} pages, {options['threads']} thread(s), "
+                          f"preprocessing profile {settings.OCR_PREPROCESS_PROFILE}")
+        self.stdout.write(f"{'mode':<10} {'seconds':>8} {'pages/s':>8} {'speedup':>8} {'peak MB':>8}")
+        started = time.perf_counter()
+        for image, page_options in pages:
+            engine.read_image(image, page_options)
+        baseline = time.perf_counter() - started
+        self.stdout.write(f"{'per page':<10} {baseline:>8.2f} {len(pages) / baseline:>8.2f} {1:>7.2f}x "
+                          f"{peak_rss_mb():>8.0f}")
+        # peak memory only ever grows, so batch sizes are run from small to large
+        for size in sizes:
+            started = time.perf_counter()
+            for start in range(0, len(pages), size):
+                engine.read_images(pages[start:start + size], options['max_pixels'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{f'batch {size}':<10} {elapsed:>8.2f} {len(pages) / elapsed:>8.2f} "
+                              f"{baseline / elapsed:>7.2f}x {peak_rss_mb():>8.0f}")
@@ -0,0 +1,88 @@
+import difflib
+import os
+import time
+from pathlib import Path
+
+import cv2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr_api import engine
+from ocr_api.preprocess import PROFILES
+
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tif', '.tiff')
+
+
+def character_accuracy(text, reference):
+    if not reference:
+        return 1.0 if not text else 0.0
+    return difflib.SequenceMatcher(None, " ".join(text.split()), " ".join(reference.split()), autojunk=False).ratio()
+
+
+class Command(BaseCommand):
+    help = ("OCRs sample images with every preprocessing profile and reports latency against character accuracy, "
+            "to pick the fastest profile that keeps accuracy. Runs easyocr in this process, no OCR service needed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folder', default=str(settings.BASE_DIR / 'test_folder'),
+                            help="Images to OCR. A .txt file next to an image with the same name is used as its "
+                                 "expected text, otherwise the output of the 'none' profile is.")
+        parser.add_argument('--profiles', default=",".join(PROFILES), help="Comma separated profiles to compare.")
+        parser.add_argument('--repeat', type=int, default=1, help="Times each image is OCRed per profile.")
+        parser.add_argument('--threads', type=int, default=settings.OCR_THREADS_PER_WORKER or os.cpu_count() or 1)
+        parser.add_argument('--tolerance', type=float, default=0.01,
+                            help="Accuracy a profile may lose against the best one and still be recommended.")
+
+    def handle(self, *args, **options):
+        profiles = [name.strip() for name in options['profiles'].split(',') if name.strip()]
+        unknown = [name for name in profiles if name not in PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown profile(s) {', '.join(unknown)}, choose from {', '.join(PROFILES)}")
+        images = {}
+        for path in sorted(Path(options['folder']).iterdir()):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+                if image is None:
+                    self.stderr.write(f"Skipping {path.name}, it could not be read as an image")
+                else:
+                    images[path] = image
+        paths = list(images)
+        if not paths:
+            raise CommandError(f"No images in {options['folder']}")
+
+        engine.init_worker(settings.OCR_LANGUAGES, settings.OCR_GPU, options['threads'])
+        references = {}
+        for path in paths:
+            expected = path.with_suffix('.txt')
+            if expected.exists():
+                references[path] = expected.read_text(encoding='utf-8')
+            else:
+                result = engine.read_image(images[path], {'profile': 'none'})
+                references[path] = " ".join(line['text'] for line in result['lines'])
+
+        rows = []
+        for profile in profiles:
+            preprocess_ms = inference_ms = 0
+            accuracy = []
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                for path in paths:
+                    result = engine.read_image(images[path], {'profile': profile})
+                    preprocess_ms += result['preprocess_ms']
+                    inference_ms += result['inference_ms']
+                    accuracy.append(character_accuracy(" ".join(line['text'] for line in result['lines']),
+                                                       references[path]))
+            elapsed = time.perf_counter() - started
+            pages = len(paths) * options['repeat']
+            rows.append((profile, preprocess_ms / pages, inference_ms / pages, pages / elapsed,
+                         sum(accuracy) / len(accuracy)))
+
+        self.stdout.write(f"{len(paths)} image(s), {options['repeat']} run(s) each, {options['threads']} thread(s)")
+        self.stdout.write(f"{'profile':<10} {'preprocess':>12} {'inference':>12} {'pages/s':>8} {'accuracy':>9}")
+        for profile, preprocess_ms, page_ms, rate, accuracy in rows:
+            self.stdout.write(f"{profile:<10} {preprocess_ms:>9.0f} ms {page_ms:>9.0f} ms {rate:>8.2f} {accuracy:>8.1%}")
+
+        best = max(accuracy for *_, accuracy in rows)
+        fastest = max((row for row in rows if row[4] >= best - options['tolerance']), key=lambda row: row[3])
+        self.stdout.write(f"Fastest profile within {options['tolerance']:.1%} of the best accuracy: {fastest[0]} "
+                          f"(set OCR_PREPROCESS_PROFILE={fastest[0]})")
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ocr_api.service import OCRService
+
+
+class Command(BaseCommand):
+    help = "Runs the OCR service: a pool of worker processes that keep the easyocr models loaded."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.OCR_WORKERS,
+                            help="Number of OCR worker processes.")
+        parser.add_argument('--threads', type=int, default=settings.OCR_THREADS_PER_WORKER,
+                            help="Torch/OpenCV threads per worker. Defaults to the number of cores divided by --workers.")
+        parser.add_argument('--batch-pages', type=int, default=settings.OCR_BATCH_PAGES,
+                            help="Most pages OCRed together by one worker, 1 to OCR page by page.")
+
+    def handle(self, *args, **options):
+        service = OCRService(
+            settings.OCR_SERVICE_ADDRESS,
+            settings.OCR_SERVICE_AUTHKEY,
+            workers=max(1, options['workers']),
+            languages=settings.OCR_LANGUAGES,
+            gpu=settings.OCR_GPU,
+            threads_per_worker=options['threads'],
+            batch_pages=options['batch_pages'],
+            batch_max_pixels=settings.OCR_BATCH_MAX_PIXELS,
+            batch_wait_ms=settings.OCR_BATCH_WAIT_MS,
+        )
+        self.stdout.write(f"OCR service listening on {settings.OCR_SERVICE_ADDRESS} "
+                          f"with {service.workers} worker(s) of {service.threads_per_worker} thread(s), "
+                          f"up to {service.batch_pages} page(s) per batch")
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping OCR service")
+        finally:
+            service.close()
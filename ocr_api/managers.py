@@ -0,0 +1,60 @@
+import hashlib
+import json
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
+
+# Hash of the page itself (encoded image bytes, or a rendered array with its shape) and everything that changes
+# what easyocr makes of it. Bump OCR_CACHE_VERSION when the models or the preprocessing change.
+def ocr_cache_key(image, options):
+    digest = hashlib.sha256()
+    if isinstance(image, (bytes, bytearray)):
+        digest.update(image)
+    else:
+        digest.update(json.dumps([list(image.shape), str(image.dtype)]).encode('utf-8'))
+        digest.update(image.tobytes())
+    config = [settings.OCR_LANGUAGES, options, settings.OCR_CACHE_VERSION]
+    digest.update(json.dumps(config, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class OCRCacheStatsManager(models.Manager):
+    # the counters live in a single row
+    def record(self, hit, count=1):
+        if count <= 0:
+            return
+        stats, _ = self.get_or_create(pk=1)
+        field = 'hits' if hit else 'misses'
+        self.filter(pk=stats.pk).update(**{field: F(field) + count})
+
+
+class OCRCacheManager(models.Manager):
+    def lookup(self, key):
+        now = timezone.now()
+        entry = self.filter(key=key).first()
+        stats = apps.get_model('ocr_api', 'OCRCacheStats').objects
+        if entry is None:
+            stats.record(hit=False)
+            return None
+        self.filter(pk=entry.pk).update(last_used_at=now, hit_count=F('hit_count') + 1)
+        stats.record(hit=True)
+        return entry
+
+    def store(self, key, result):
+        entry, _ = self.update_or_create(key=key, defaults={
+            'result': result,
+            'created_at': timezone.now(),
+            'last_used_at': timezone.now(),
+        })
+        self.evict()
+        return entry
+
+    def evict(self):
+        # least recently used pages go first once the cache is over its size limit
+        overflow = self.count() - settings.OCR_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            stale = list(self.order_by('last_used_at').values_list('pk', flat=True)[:overflow])
+            self.filter(pk__in=stale).delete()
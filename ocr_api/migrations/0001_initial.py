@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Page Hash')),
+                ('result', models.JSONField(verbose_name='Result')),
+                ('created_at', models.DateTimeField(verbose_name='Created At')),
+                ('last_used_at', models.DateTimeField(db_index=True, verbose_name='Last Used At')),
+                ('hit_count', models.PositiveIntegerField(default=0, verbose_name='Hit Count')),
+            ],
+            options={
+                'verbose_name': 'OCR Cache Entry',
+                'verbose_name_plural': 'OCR Cache Entries',
+            },
+        ),
+    ]
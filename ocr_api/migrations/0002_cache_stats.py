@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+# the OCR cache used to count its hits under the name 'ocr' in summarizer_api's CacheStats
+def move_counters(apps, schema_editor):
+    CacheStats = apps.get_model('summarizer_api', 'CacheStats')
+    OCRCacheStats = apps.get_model('ocr_api', 'OCRCacheStats')
+    old = CacheStats.objects.filter(name='ocr').first()
+    if old is not None:
+        OCRCacheStats.objects.create(pk=1, hits=old.hits, misses=old.misses)
+        old.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0001_initial'),
+        ('summarizer_api', '0006_summary_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRCacheStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hits', models.PositiveBigIntegerField(default=0, verbose_name='Hits')),
+                ('misses', models.PositiveBigIntegerField(default=0, verbose_name='Misses')),
+            ],
+            options={
+                'verbose_name': 'OCR Cache Stats',
+                'verbose_name_plural': 'OCR Cache Stats',
+            },
+        ),
+        migrations.RunPython(move_counters, migrations.RunPython.noop),
+    ]
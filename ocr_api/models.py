@@ -0,0 +1,39 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+from .managers import OCRCacheManager, OCRCacheStatsManager
+
+# Create your models here.
+
+# OCR results of pages seen before, keyed by ocr_cache_key(). Re-uploaded slide decks and textbooks are read from
+# here instead of being OCRed again.
+
+class OCRCacheEntry(models.Model):
+    key = models.CharField(_("Page Hash"), max_length=64, unique=True)
+    result = models.JSONField(_("Result"))
+    created_at = models.DateTimeField(_("Created At"))
+    last_used_at = models.DateTimeField(_("Last Used At"), db_index=True)
+    hit_count = models.PositiveIntegerField(_("Hit Count"), default=0)
+
+    objects = OCRCacheManager()
+
+    class Meta:
+        verbose_name = _("OCR Cache Entry")
+        verbose_name_plural = _("OCR Cache Entries")
+
+    def __str__(self):
+        return self.key
+
+
+# Hits and misses of the OCR cache since it was created.
+class OCRCacheStats(models.Model):
+    hits = models.PositiveBigIntegerField(_("Hits"), default=0)
+    misses = models.PositiveBigIntegerField(_("Misses"), default=0)
+
+    objects = OCRCacheStatsManager()
+
+    class Meta:
+        verbose_name = _("OCR Cache Stats")
+        verbose_name_plural = _("OCR Cache Stats")
+
+    def __str__(self):
+        return f"{self.hits} hits / {self.misses} misses"
@@ -0,0 +1,120 @@
+import cv2
+import numpy as np
+
+# Image clean-up done in the OCR workers before easyocr sees a page. easyocr's detector costs time in proportion
+# to the number of pixels, and rendered pages are usually far bigger than it needs, so most of the saving comes
+# from scaling each page down until its text is just large enough and from cutting off empty margins.
+#
+# Boxes returned for a preprocessed page are in the coordinates of the preprocessed image.
+
+PROFILES = {
+    # the page exactly as given
+    'none': {},
+    # smallest images: text scaled down to about 16px and margins cropped
+    'fast': {'text_height': 16, 'crop': True},
+    # text at about 20px, margins cropped and small rotations undone
+    'balanced': {'text_height': 20, 'crop': True, 'deskew': True},
+    # for photographed or noisy scans: also binarized, which removes shading and background texture
+    'scan': {'text_height': 24, 'crop': True, 'deskew': True, 'binarize': True},
+}
+
+
+def to_grayscale(image):
+    if image.ndim == 3 and image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+# Dark pixels (text) as 255 on a 0 background.
+def foreground_mask(gray):
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return mask
+
+
+# Median height of the blobs that look like characters, used to scale pages by how big their text is rather than by
+# the resolution they were rendered or photographed at.
+def median_text_height(mask):
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # ignore specks and lines/images
+    heights = heights[(heights >= 4) & (heights <= mask.shape[0] // 20) & (widths <= heights * 4)]
+    if len(heights) < 10:
+        return None
+    return float(np.median(heights))
+
+
+def downscale(gray, mask, text_height):
+    measured = median_text_height(mask)
+    if measured is None or measured <= text_height:
+        return gray, mask
+    scale = text_height / measured
+    size = (max(1, int(gray.shape[1] * scale)), max(1, int(gray.shape[0] * scale)))
+    gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+    return gray, foreground_mask(gray)
+
+
+def crop_margins(gray, mask, padding=10):
+    points = cv2.findNonZero(mask)
+    if points is None:
+        return gray, mask
+    x, y, w, h = cv2.boundingRect(points)
+    x0, y0 = max(0, x - padding), max(0, y - padding)
+    x1, y1 = min(gray.shape[1], x + w + padding), min(gray.shape[0], y + h + padding)
+    return gray[y0:y1, x0:x1], mask[y0:y1, x0:x1]
+
+
+# Angle of the text lines from the minimum area rectangle around all the text. Only small angles are corrected;
+# anything larger is more likely a diagram than a tilted scan.
+def deskew(gray, mask, max_angle=10.0, min_angle=0.3):
+    points = cv2.findNonZero(mask)
+    if points is None or len(points) < 100:
+        return gray, mask
+    # the range minAreaRect reports angles in differs between OpenCV versions, bring it to (-45, 45]
+    angle = cv2.minAreaRect(points)[-1]
+    while angle > 45:
+        angle -= 90
+    while angle <= -45:
+        angle += 90
+    if abs(angle) < min_angle or abs(angle) > max_angle:
+        return gray, mask
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    gray = cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return gray, foreground_mask(gray)
+
+
+def load_image(image):
+    if isinstance(image, (bytes, bytearray)):
+        image = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError("could not decode the image")
+    return image
+
+
+# Pads pages with white on the right and bottom to a common size, so that pages of different sizes can be stacked
+# into one batch. Boxes found on a padded page are still in the page's own coordinates.
+def pad_to(gray, height, width):
+    if gray.shape == (height, width):
+        return gray
+    return cv2.copyMakeBorder(gray, 0, height - gray.shape[0], 0, width - gray.shape[1],
+                              cv2.BORDER_CONSTANT, value=255)
+
+
+def preprocess(image, profile='none'):
+    steps = PROFILES[profile]
+    if not steps:
+        return image
+    gray = to_grayscale(load_image(image))
+    mask = foreground_mask(gray)
+    if steps.get('text_height'):
+        gray, mask = downscale(gray, mask, steps['text_height'])
+    if steps.get('deskew'):
+        gray, mask = deskew(gray, mask)
+    if steps.get('crop'):
+        gray, mask = crop_margins(gray, mask)
+    if steps.get('binarize'):
+        gray = 255 - mask
+    return np.ascontiguousarray(gray)
@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+from multiprocessing.connection import Listener
+from multiprocessing.context import AuthenticationError
+from . import engine
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class OCRService:
+    """
+    Keeps a pool of worker processes with a warm easyocr reader each and serves OCR requests to Django over a
+    multiprocessing connection (see client.py), so a page only costs inference time.
+
+    Every connection is handled by its own thread, which hands its pages to the pool and waits for the results;
+    pages from all connections share the pool's queue. Requests are (op, payload) tuples and replies are
+    ('ok', result) or ('error', message):
+
+    - ('ocr', {'image': bytes or numpy array, 'options': {...readtext kwargs}})
+    - ('stats', {}) for the pool size, queue depth and recent page timings
+
+    With batch_pages > 1, pages are not sent to the pool one by one but queued, and whenever a worker is free the
+    pages waiting (up to batch_pages, from any connection, after waiting up to batch_wait_ms for more) go to it as
+    one batch, see engine.read_images. batch_max_pixels caps the pixels in one detector batch.
+    """
+
+    def __init__(self, address, authkey, workers, languages, gpu=False, threads_per_worker=None, timing_window=1000,
+                 batch_pages=1, batch_max_pixels=None, batch_wait_ms=20):
+        self.address = address
+        self.authkey = authkey
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        # spawn so that workers never inherit a half-initialised torch or an open socket
+        self.pool = multiprocessing.get_context('spawn').Pool(
+            workers, initializer=engine.init_worker, initargs=(languages, gpu, self.threads_per_worker))
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        # (total_ms, preprocess_ms, inference_ms) of the most recent pages
+        self.timings = deque(maxlen=timing_window)
+        self.batch_pages = max(1, batch_pages)
+        self.batch_max_pixels = batch_max_pixels
+        self.batch_wait = batch_wait_ms / 1000
+        self.batches = 0
+        self.batched_pages = 0
+        if self.batch_pages > 1:
+            self.queue = queue.Queue()
+            # one batch per worker at a time, so that pages wait in the queue, where they can still join a batch,
+            # rather than in the pool's
+            self.slots = threading.Semaphore(workers)
+            threading.Thread(target=self.dispatch, daemon=True).start()
+
+    def ocr(self, image, options=None):
+        with self.lock:
+            self.submitted += 1
+        started = time.perf_counter()
+        try:
+            if self.batch_pages > 1:
+                future = Future()
+                self.queue.put((image, options or {}, future))
+                result = future.result()
+            else:
+                result = self.pool.apply_async(engine.read_image, (image, options or {})).get()
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        result['total_ms'] = int((time.perf_counter() - started) * 1000)
+        with self.lock:
+            self.completed += 1
+            self.timings.append((result['total_ms'], result['preprocess_ms'], result['inference_ms']))
+        return result
+
+    def dispatch(self):
+        while True:
+            batch = [self.queue.get()]
+            self.slots.acquire()
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_pages:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            futures = [future for _, _, future in batch]
+            self.pool.apply_async(
+                engine.read_images, ([(image, options) for image, options, _ in batch], self.batch_max_pixels),
+                callback=partial(self.batch_done, futures), error_callback=partial(self.batch_failed, futures))
+
+    def batch_done(self, futures, results):
+        self.slots.release()
+        with self.lock:
+            self.batches += 1
+            self.batched_pages += len(futures)
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def batch_failed(self, futures, error):
+        self.slots.release()
+        for future in futures:
+            future.set_exception(error)
+
+    def stats(self):
+        with self.lock:
+            pending = self.submitted - self.completed - self.failed
+            totals = [total for total, _, _ in self.timings]
+            preprocessing = [preprocess for _, preprocess, _ in self.timings]
+            inference = [inference for _, _, inference in self.timings]
+            return {
+                'pool_size': self.workers,
+                'threads_per_worker': self.threads_per_worker,
+                'in_flight': min(pending, self.workers),
+                'queue_depth': max(0, pending - self.workers),
+                'pages': self.completed,
+                'failed': self.failed,
+                'uptime_s': int(time.time() - self.started_at),
+                'batch_pages': self.batch_pages,
+                'mean_batch': round(self.batched_pages / self.batches, 2) if self.batches else None,
+                'total_ms': {'p50': percentile(totals, 0.50), 'p95': percentile(totals, 0.95)},
+                'preprocess_ms': {'p50': percentile(preprocessing, 0.50), 'p95': percentile(preprocessing, 0.95)},
+                'inference_ms': {'p50': percentile(inference, 0.50), 'p95': percentile(inference, 0.95)},
+            }
+
+    def handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if op == 'ocr':
+                        reply = ('ok', self.ocr(payload['image'], payload.get('options')))
+                    elif op == 'stats':
+                        reply = ('ok', self.stats())
+                    else:
+                        reply = ('error', f"unknown operation {op!r}")
+                except Exception:
+                    reply = ('error', traceback.format_exc())
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def serve_forever(self):
+        # the default backlog of 1 drops connections when several page threads connect at once
+        with Listener(self.address, authkey=self.authkey, backlog=64) as listener:
+            while True:
+                try:
+                    conn = listener.accept()
+                except AuthenticationError:
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
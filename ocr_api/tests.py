@@ -0,0 +1,129 @@
+import threading
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from .client import OCRServiceError, ocr_image, request, submit_ocr
+from .layout import assemble
+from .managers import ocr_cache_key
+from .models import OCRCacheEntry, OCRCacheStats
+from .service import OCRService
+
+
+def line(left, top, text, width=None, height=20, confidence=0.9):
+    right, bottom = left + (width or 12 * len(text)), top + height
+    return {'box': [[left, top], [right, top], [right, bottom], [left, bottom]], 'text': text, 'confidence': confidence}
+
+
+class LayoutTests(SimpleTestCase):
+    def test_columns_are_read_one_after_the_other(self):
+        lines = [
+            line(100, 50, "The Water Cycle"),
+            line(50, 120, "Water evaporates"), line(450, 120, "Clouds release"),
+            line(50, 145, "from the oceans."), line(450, 145, "it as rain."),
+        ]
+        self.assertEqual(assemble(lines, min_confidence=0.3),
+                         "The Water Cycle\n\nWater evaporates from the oceans.\n\nClouds release it as rain.")
+
+    def test_low_confidence_and_empty_detections_are_dropped(self):
+        lines = [line(50, 50, "Osmosis"), line(142, 50, "~", confidence=0.1), line(162, 50, "moves"),
+                 line(226, 50, "  "), line(236, 50, "water")]
+        self.assertEqual(assemble(lines, min_confidence=0.3), "Osmosis moves water")
+
+    def test_words_split_across_lines_are_joined(self):
+        lines = [line(50, 50, "The mem-"), line(50, 75, "brane is thin."), line(50, 100, "Next")]
+        self.assertEqual(assemble(lines, min_confidence=0.3), "The membrane is thin. Next")
+
+    def test_nothing_left_is_an_empty_page(self):
+        self.assertEqual(assemble([line(50, 50, "x", confidence=0.1)], min_confidence=0.3), "")
+
+
+def service_result(text="Water evaporates."):
+    return {'lines': [line(50, 50, text)], 'inference_ms': 5, 'total_ms': 7}
+
+
+class OCRCacheTests(TestCase):
+    def test_key_follows_the_image_and_options(self):
+        self.assertEqual(ocr_cache_key(b"page", {'profile': 'none'}), ocr_cache_key(b"page", {'profile': 'none'}))
+        self.assertNotEqual(ocr_cache_key(b"page", {'profile': 'none'}), ocr_cache_key(b"page", {'profile': 'scan'}))
+        self.assertNotEqual(ocr_cache_key(b"page", {'profile': 'none'}), ocr_cache_key(b"other", {'profile': 'none'}))
+
+    def test_pages_seen_before_come_from_the_cache(self):
+        with mock.patch('ocr_api.client.request', return_value=service_result()) as service:
+            first = ocr_image(b"page")
+            second = ocr_image(b"page")
+            third = submit_ocr(b"page").result()
+        self.assertEqual(service.call_count, 1)
+        self.assertEqual((first.cached, second.cached, third.cached), (False, True, True))
+        self.assertEqual(second.text, first.text)
+        stats = OCRCacheStats.objects.get()
+        self.assertEqual((stats.hits, stats.misses), (2, 1))
+
+    @override_settings(OCR_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_pages_are_evicted(self):
+        with mock.patch('ocr_api.client.request', return_value=service_result()):
+            ocr_image(b"a")
+            ocr_image(b"b")
+            OCRCacheEntry.objects.update(last_used_at="2000-01-01T00:00Z")
+            ocr_image(b"a")
+            ocr_image(b"c")
+        keys = set(OCRCacheEntry.objects.values_list('key', flat=True))
+        self.assertEqual(keys, {ocr_cache_key(page, {'profile': 'none'}) for page in (b"a", b"c")})
+
+
+class FakeConnection:
+    def __init__(self, answer=None, error=None):
+        self.answer, self.error, self.closed = answer, error, False
+
+    def send(self, message):
+        if self.error is not None:
+            raise self.error
+
+    def poll(self, timeout):
+        return True
+
+    def recv(self):
+        return self.answer
+
+    def close(self):
+        self.closed = True
+
+
+@override_settings(OCR_PREPROCESS_PROFILE='none')
+class OCRClientTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('ocr_api.client._local', threading.local())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_dropped_connection_is_reopened_once(self):
+        dropped, fresh = FakeConnection(error=EOFError()), FakeConnection(answer=('ok', {'pool': 2}))
+        with mock.patch('ocr_api.client.Client', side_effect=[dropped, fresh]):
+            self.assertEqual(request('stats'), {'pool': 2})
+        self.assertTrue(dropped.closed)
+
+    def test_service_errors_are_raised(self):
+        with mock.patch('ocr_api.client.Client', return_value=FakeConnection(answer=('error', "bad image"))):
+            with self.assertRaisesMessage(OCRServiceError, "bad image"):
+                request('ocr', {'image': b""})
+        with mock.patch('ocr_api.client.Client', side_effect=ConnectionRefusedError()):
+            with self.assertRaises(OCRServiceError):
+                request('stats')
+
+
+class OCRServiceStatsTests(SimpleTestCase):
+    def service(self):
+        # the pool is replaced, so no worker processes (or easyocr) are needed
+        with mock.patch('ocr_api.service.multiprocessing.get_context'):
+            service = OCRService(('127.0.0.1', 0), b"key", workers=2, languages=['en'])
+        service.pool = mock.Mock()
+        return service
+
+    def test_failed_pages_are_not_counted_as_done(self):
+        service = self.service()
+        page = {'lines': [], 'preprocess_ms': 1, 'inference_ms': 2}
+        service.pool.apply_async.return_value.get.side_effect = [dict(page), RuntimeError("bad image"), dict(page)]
+        service.ocr(b"page")
+        with self.assertRaises(RuntimeError):
+            service.ocr(b"broken")
+        service.ocr(b"page")
+        stats = service.stats()
+        self.assertEqual((stats['pages'], stats['failed'], stats['in_flight'], stats['queue_depth']), (2, 1, 0, 0))
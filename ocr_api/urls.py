@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import OCRServiceStatsView
+
+urlpatterns = [
+    path('stats/', OCRServiceStatsView.as_view(), name='ocr-service-stats'),
+]
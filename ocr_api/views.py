@@ -0,0 +1,30 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .client import OCRServiceError, service_stats
+from .models import OCRCacheEntry, OCRCacheStats
+
+# Create your views here.
+
+def ocr_cache_stats():
+    stats = OCRCacheStats.objects.first()
+    hits, misses = (stats.hits, stats.misses) if stats else (0, 0)
+    return {
+        'entries': OCRCacheEntry.objects.count(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0,
+    }
+
+
+# Pool size, queue depth and recent per-page timings of the OCR service, and the hit rate of the OCR cache.
+class OCRServiceStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            stats = service_stats()
+        except OCRServiceError as e:
+            return Response({"status": "error", "message": str(e), "cache": ocr_cache_stats()}, status=503)
+        stats['cache'] = ocr_cache_stats()
+        return Response(stats)
@@ -63,6 +63,8 @@ INSTALLED_APPS = [
     'flashcards_api',
     'quiz_api',
     'badges_api',
+    'llm_api',
+    'ocr_api',
 ]
 
 MIDDLEWARE = [
@@ -144,6 +146,134 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Summarize notes with the map-reduce tree (True) or the original recursive pass followed by fix_summary (False).
+SUMMARY_MAP_REDUCE = os.environ.get('SUMMARY_MAP_REDUCE', 'True') == 'True'
+
+# Summary cache
+# Notes with identical contents reuse a stored summary instead of calling the LLM again.
+
+SUMMARY_CACHE_TTL_DAYS = int(os.environ.get('SUMMARY_CACHE_TTL_DAYS', 30))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.environ.get('SUMMARY_CACHE_MAX_ENTRIES', 10000))
+# Summaries of single chunks and merges, reused when an edited note is summarized again (map-reduce mode only).
+SUMMARY_CHUNK_CACHE_MAX_ENTRIES = int(os.environ.get('SUMMARY_CHUNK_CACHE_MAX_ENTRIES', 200000))
+
+# Summary worker (manage.py run_summary_worker)
+
+SUMMARY_WORKER_CONCURRENCY = int(os.environ.get('SUMMARY_WORKER_CONCURRENCY', 2))
+SUMMARY_JOB_MAX_ATTEMPTS = int(os.environ.get('SUMMARY_JOB_MAX_ATTEMPTS', 3))
+# A running job whose worker has been silent for this long is assumed crashed and requeued.
+SUMMARY_JOB_LEASE_SECONDS = int(os.environ.get('SUMMARY_JOB_LEASE_SECONDS', 900))
+# How often a worker renews the lease of the job it is running.
+SUMMARY_JOB_HEARTBEAT_SECONDS = int(os.environ.get('SUMMARY_JOB_HEARTBEAT_SECONDS', 60))
+
+# LLM client (llm_api/client.py)
+# LLM_BACKEND selects the provider class; LLM_BASE_URL points the OpenAI backend at a compatible local stand-in.
+
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'llm_api.client.OpenAIBackend')
+LLM_BASE_URL = os.environ.get('LLM_BASE_URL')
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', 50))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('LLM_MAX_KEEPALIVE_CONNECTIONS', 20))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_KEEPALIVE_EXPIRY', 30))
+LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', 5))
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 60))
+# Read timeouts per feature, in seconds
+LLM_TIMEOUTS = {
+    'title': 20,
+    'choices': 30,
+    'questions': 60,
+    'flashcards': 60,
+    'summarize': 120,
+    'merge_summaries': 120,
+    'fix_summary': 180,
+}
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 4))
+LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 1))
+LLM_BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', 60))
+
+# Flashcard generation (flashcards_api/flashcards.py)
+# Cards per request when the client doesn't ask for a number, the most it may ask for, and the output tokens
+# allowed per card.
+
+FLASHCARDS_DEFAULT_COUNT = int(os.environ.get('FLASHCARDS_DEFAULT_COUNT', 10))
+FLASHCARDS_MAX_COUNT = int(os.environ.get('FLASHCARDS_MAX_COUNT', 40))
+FLASHCARDS_TOKENS_PER_CARD = int(os.environ.get('FLASHCARDS_TOKENS_PER_CARD', 160))
+# Summaries longer than this many tokens are split at their h2 headings and each section's cards are generated
+# concurrently, the requested number of cards shared between the sections by their length.
+FLASHCARDS_FANOUT_MIN_TOKENS = int(os.environ.get('FLASHCARDS_FANOUT_MIN_TOKENS', 1500))
+FLASHCARDS_MAX_WORKERS = int(os.environ.get('FLASHCARDS_MAX_WORKERS', 4))
+# Cards per page of the flashcard lists; clients can ask for up to FLASHCARDS_MAX_PAGE_SIZE with ?page_size=.
+FLASHCARDS_PAGE_SIZE = int(os.environ.get('FLASHCARDS_PAGE_SIZE', 100))
+FLASHCARDS_MAX_PAGE_SIZE = int(os.environ.get('FLASHCARDS_MAX_PAGE_SIZE', 500))
+# Spaced-repetition reviews (flashcards_api/scheduler.py): minutes before a forgotten card comes back, due cards
+# returned by default and at most, and the most reviews one study session may submit.
+FLASHCARDS_RELEARN_MINUTES = int(os.environ.get('FLASHCARDS_RELEARN_MINUTES', 10))
+FLASHCARDS_DUE_LIMIT = int(os.environ.get('FLASHCARDS_DUE_LIMIT', 20))
+FLASHCARDS_DUE_MAX_LIMIT = int(os.environ.get('FLASHCARDS_DUE_MAX_LIMIT', 200))
+FLASHCARDS_REVIEW_BATCH_MAX = int(os.environ.get('FLASHCARDS_REVIEW_BATCH_MAX', 1000))
+
+# Offline summarization through the batch API (manage.py prepare_summary_batch, submit_summary_batch,
+# poll_summary_batch, ingest_summary_batch). LLM_BATCH_BACKEND can be set to llm_api.batch.LocalBatchBackend,
+# a file based stand-in that answers every request locally.
+
+LLM_BATCH_BACKEND = os.environ.get('LLM_BATCH_BACKEND', 'llm_api.batch.OpenAIBatchBackend')
+SUMMARY_BATCH_DIR = os.environ.get('SUMMARY_BATCH_DIR', BASE_DIR / 'batches')
+LLM_BATCH_LOCAL_DIR = os.environ.get('LLM_BATCH_LOCAL_DIR', BASE_DIR / 'batches' / 'local')
+# Batch API limits per input file
+SUMMARY_BATCH_MAX_REQUESTS = int(os.environ.get('SUMMARY_BATCH_MAX_REQUESTS', 50000))
+SUMMARY_BATCH_MAX_BYTES = int(os.environ.get('SUMMARY_BATCH_MAX_BYTES', 190 * 1024 * 1024))
+# How long the summary worker leaves notes in a batch alone; batches are completed within 24 hours
+SUMMARY_BATCH_DEFER_HOURS = int(os.environ.get('SUMMARY_BATCH_DEFER_HOURS', 26))
+
+# OCR service (manage.py run_ocr_service), reached by the web processes through ocr_api/client.py
+
+OCR_SERVICE_ADDRESS = (os.environ.get('OCR_SERVICE_HOST', '127.0.0.1'), int(os.environ.get('OCR_SERVICE_PORT', 6010)))
+OCR_SERVICE_AUTHKEY = (os.environ.get('OCR_SERVICE_AUTHKEY') or SECRET_KEY or 'quickease-ocr').encode('utf-8')
+# Worker processes, and torch/OpenCV threads per worker (0 shares the cores out evenly between the workers)
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+OCR_THREADS_PER_WORKER = int(os.environ.get('OCR_THREADS_PER_WORKER', 0))
+# Most pages a worker OCRs in one batch (1 reads page by page), the most pixels (after padding pages to the same
+# size) in one batch, which is what the detector's memory use grows with, and how long a free worker waits for
+# more pages to fill its batch. Compare batch sizes with manage.py benchmark_ocr_batching
+OCR_BATCH_PAGES = int(os.environ.get('OCR_BATCH_PAGES', 1))
+OCR_BATCH_MAX_PIXELS = int(os.environ.get('OCR_BATCH_MAX_PIXELS', 8_000_000))
+OCR_BATCH_WAIT_MS = int(os.environ.get('OCR_BATCH_WAIT_MS', 20))
+# Pages of one document the web process keeps in flight on the OCR service, enough to fill every worker's batch
+OCR_PAGE_CONCURRENCY = int(os.environ.get('OCR_PAGE_CONCURRENCY', OCR_WORKERS * OCR_BATCH_PAGES))
+# Most pages of one document held in memory at once (rendered, being OCRed or waiting for an earlier page)
+OCR_PAGE_WINDOW = int(os.environ.get('OCR_PAGE_WINDOW', 2 * OCR_PAGE_CONCURRENCY))
+OCR_LANGUAGES = os.environ.get('OCR_LANGUAGES', 'en').split(',')
+OCR_GPU = os.environ.get('OCR_GPU') == 'True'
+# Seconds to wait for one page
+OCR_TIMEOUT = float(os.environ.get('OCR_TIMEOUT', 120))
+# Resolution PDF pages are rendered at for OCR
+OCR_RENDER_DPI = int(os.environ.get('OCR_RENDER_DPI', 150))
+# How pages are cleaned up before OCR, one of ocr_api.preprocess.PROFILES: none, fast, balanced or scan.
+# Compare them on sample pages with manage.py benchmark_ocr_profiles
+OCR_PREPROCESS_PROFILE = os.environ.get('OCR_PREPROCESS_PROFILE', 'none')
+# Detections easyocr is less sure of than this are left out of the text
+OCR_MIN_CONFIDENCE = float(os.environ.get('OCR_MIN_CONFIDENCE', 0.3))
+# Pages kept in the OCR cache; bump the version when the OCR models or preprocessing change
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get('OCR_CACHE_MAX_ENTRIES', 50000))
+OCR_CACHE_VERSION = 1
+# PDF pages with less embedded text than this are OCRed instead
+PDF_TEXT_MIN_CHARS = int(os.environ.get('PDF_TEXT_MIN_CHARS', 50))
+
+# Resumable uploads: where parts are written, the largest file accepted (images are decoded whole, so they have a
+# much lower limit), the part size suggested to clients, seconds before a session held by a silent upload worker
+# is handed to another, and hours before an unfinished upload is deleted
+UPLOAD_DIR = os.environ.get('UPLOAD_DIR', BASE_DIR / 'uploads')
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 1024 * 1024 * 1024))
+UPLOAD_IMAGE_MAX_BYTES = int(os.environ.get('UPLOAD_IMAGE_MAX_BYTES', 25 * 1024 * 1024))
+UPLOAD_PART_BYTES = int(os.environ.get('UPLOAD_PART_BYTES', 8 * 1024 * 1024))
+UPLOAD_LEASE_SECONDS = int(os.environ.get('UPLOAD_LEASE_SECONDS', 300))
+UPLOAD_EXPIRE_HOURS = int(os.environ.get('UPLOAD_EXPIRE_HOURS', 24))
+
+# LLM usage ledger, written in batches by a background thread
+
+LLM_USAGE_BATCH_SIZE = int(os.environ.get('LLM_USAGE_BATCH_SIZE', 100))
+LLM_USAGE_FLUSH_SECONDS = float(os.environ.get('LLM_USAGE_FLUSH_SECONDS', 5))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
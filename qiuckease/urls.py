@@ -27,4 +27,6 @@ urlpatterns = [
     path("flashcards_api/v1/", include('flashcards_api.urls')),
     path("quiz_api/v1/", include('quiz_api.urls')),
     path("badges_api/v1/", include('badges_api.urls')),
+    path("llm_api/v1/", include('llm_api.urls')),
+    path("ocr_api/v1/", include('ocr_api.urls')),
 ]
@@ -1,11 +1,5 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
 import json
-
-load_dotenv()
-
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+from llm_api.client import chat_completion
 
 def generate_choices(question):
     prompt = (
@@ -28,7 +22,7 @@ def generate_choices(question):
         "Only JSON data is required. No other decoraters like ``` are needed."
     )
 
-    response = client.chat.completions.create(
+    response = chat_completion(
         model='gpt-4o-mini',
         messages=[
             {"role": "system", "content": prompt },
@@ -36,6 +30,7 @@ def generate_choices(question):
         ],
         max_tokens=1000, 
         temperature=0.7,
+        feature='choices',
     )
     
     choice_text = response.choices[0].message.content
@@ -1,11 +1,5 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
 import json
-
-load_dotenv()
-
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+from llm_api.client import chat_completion
 
 def generate_questions(paragraph):
     prompt = (
@@ -24,7 +18,7 @@ def generate_questions(paragraph):
         f"Only JSON data is required. No other decoraters like ``` are needed."
     )
 
-    response = client.chat.completions.create(
+    response = chat_completion(
         model='gpt-4o-mini',
         messages=[
             {"role": "system", "content": prompt },
@@ -32,6 +26,7 @@ def generate_questions(paragraph):
         ],
         max_tokens=500, 
         temperature=0.7,
+        feature='questions',
     )
     
     question_text = response.choices[0].message.content
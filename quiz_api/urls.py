@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (UserTestListView, 
                     CreateTestView,
+                    GenerateTestView,
                     UserTestRetrieveUpdateDestroyView,
                     
                     UserTestQuestionListView,
@@ -25,6 +26,7 @@ urlpatterns = [
     # User Tests
     path('usertests/', UserTestListView.as_view(), name='usertest-list-create'),
     path('usertest-create/<int:note_id>/', CreateTestView.as_view(), name='usertest-create'),
+    path('usertest-generate/<int:note_id>/', GenerateTestView.as_view(), name='usertest-generate'),
     path('usertest-detail/<int:pk>/', UserTestRetrieveUpdateDestroyView.as_view(), name='usertest-detail'),
     
     # Test Questions
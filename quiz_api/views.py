@@ -2,6 +2,7 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework.permissions import IsAuthenticated
+from django.db import IntegrityError
 from django.shortcuts import get_object_or_404
 from .models import UserTest, TestQuestion, TestChoices, ChoiceAnswer
 from .serializers import (  UserTestSerializer,
@@ -10,6 +11,12 @@ from .serializers import (  UserTestSerializer,
                             ChoiceAnswerSerializer,
 )
 from summarizer_api.models import UserNotes  
+from rest_framework.views import APIView
+from llm_api.ledger import usage_context
+from llm_api.persist import save_generated
+from .question_create import generate_questions
+from .choice_create import generate_choices
+import json
 
 #Normal VIEWS
 
@@ -80,6 +87,55 @@ class CreateTestView(generics.CreateAPIView):
             return Response({"status": "success", "test": serializer.data}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+# Generates a test for a note from its summary: the questions, then six choices for each, which are all saved
+# together once every one of them has been parsed.
+class GenerateTestView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, note_id):
+        note = get_object_or_404(UserNotes, id=note_id, user=request.user)
+
+        if not note.notesummary:
+            return Response({"status": "error", "message": "Note summary is empty."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if UserTest.objects.filter(note=note).exists():
+            return Response({"status": "error", "message": "Test already exists for this note."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with usage_context(user=request.user):
+                question_data = json.loads(generate_questions(note.notesummary))
+                if not isinstance(question_data, list) or not all(isinstance(item, dict) for item in question_data):
+                    return Response({"status": "error", "message": "Expected a list of questions but got something else."}, status=status.HTTP_400_BAD_REQUEST)
+
+                question_texts = [item.get('Question', '') for item in question_data]
+                choice_data = []
+                for question_text in question_texts:
+                    choices = json.loads(generate_choices(question_text))
+                    if not isinstance(choices, list) or not all(isinstance(choice, dict) for choice in choices):
+                        return Response({"status": "error", "message": "Expected a list of choices but got something else."}, status=status.HTTP_400_BAD_REQUEST)
+                    choice_data.append(choices)
+        except json.JSONDecodeError:
+            return Response({"status": "error", "message": "Failed to decode JSON response."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # another request for the same note may have saved its test while this one was generating
+        try:
+            _, questions, choices = save_generated(
+                (UserTest, [UserTest(note=note)]),
+                (TestQuestion, lambda tests: [TestQuestion(test=tests[0], TestQuestion=text) for text in question_texts]),
+                (TestChoices, lambda tests, questions: [
+                    TestChoices(question=question, item_choice_text=choice.get('choice', ''), isAnswer=bool(choice.get('isAnswer', False)))
+                    for question, question_choices in zip(questions, choice_data)
+                    for choice in question_choices
+                ]),
+            )
+        except IntegrityError:
+            return Response({"status": "error", "message": "Test already exists for this note."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "status": "success",
+            "questions": TestQuestionSerializer(questions, many=True).data,
+            "choices": TestChoicesSerializer(choices, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
 class CreateTestQuestionView(generics.CreateAPIView):
     serializer_class = TestQuestionSerializer
     permission_classes = [IsAuthenticated]
@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import UserNotes
+from .models import UserNotes, SummaryJob, SummaryCacheEntry, CacheStats, SummaryBatch, ChunkSummary, UploadSession
 
 # Register your models here.
 
 class UserNotesAdmin(admin.ModelAdmin):
     empty_value_display = '-empty-'
-    readonly_fields = ['notetitle', 'notecontents', 'notedatecreated', 'notesummary']
+    readonly_fields = ['notetitle', 'notecontents', 'notedatecreated', 'notesummary', 'status']
 
     def show_package_delivery_pattern(self, obj):
         if obj.notetitle:
@@ -13,4 +13,46 @@ class UserNotesAdmin(admin.ModelAdmin):
         else:
             return 'N/A'
 
-admin.site.register(UserNotes, UserNotesAdmin)
\ No newline at end of file
+admin.site.register(UserNotes, UserNotesAdmin)
+
+
+class SummaryJobAdmin(admin.ModelAdmin):
+    list_display = ['note', 'status', 'attempts', 'run_after', 'locked_by', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['last_error']
+
+admin.site.register(SummaryJob, SummaryJobAdmin)
+
+
+class SummaryCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['title', 'hit_count', 'created_at', 'last_used_at']
+    readonly_fields = ['key', 'summary', 'title', 'created_at', 'last_used_at', 'hit_count']
+
+
+class CacheStatsAdmin(admin.ModelAdmin):
+    list_display = ['name', 'hits', 'misses']
+    readonly_fields = ['name', 'hits', 'misses']
+
+class ChunkSummaryAdmin(admin.ModelAdmin):
+    list_display = ['key', 'hit_count', 'created_at', 'last_used_at']
+    readonly_fields = ['key', 'summary', 'created_at', 'last_used_at', 'hit_count']
+
+admin.site.register(SummaryCacheEntry, SummaryCacheEntryAdmin)
+admin.site.register(ChunkSummary, ChunkSummaryAdmin)
+admin.site.register(CacheStats, CacheStatsAdmin)
+
+class SummaryBatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'note_count', 'request_count', 'ingested_count', 'failed_count', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['input_path', 'input_bytes', 'last_note_id', 'remote_id', 'output_file_id', 'output_path']
+
+admin.site.register(SummaryBatch, SummaryBatchAdmin)
+
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'user', 'status', 'received_bytes', 'size', 'pages_done', 'page_count', 'tokens_saved',
+                    'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['path', 'received_bytes', 'checked_bytes', 'pages_done', 'page_count', 'tokens_saved', 'note',
+                       'error', 'writing_from', 'writing_at', 'locked_at', 'locked_by']
+
+admin.site.register(UploadSession, UploadSessionAdmin)
@@ -0,0 +1,258 @@
+import contextvars
+import hashlib
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from llm_api.batch import BATCH_COMPLETED, BATCH_FAILED, batch_request, get_batch_backend
+from llm_api.ledger import record_completion, usage_context
+from .managers import summary_cache_key
+from .models import (UserNotes, SummaryJob, SummaryStatus, SummaryCacheEntry, ChunkSummary, SummaryBatch, BatchStatus,
+                     SUMMARY_MODEL, SUMMARY_DETAIL, SUMMARY_INSTRUCTIONS, SUMMARY_PROMPT_VERSION)
+from .text_summarizer import (SUMMARIZER_CONTEXT_BUDGET, SUMMARIZER_MAX_WORKERS, completion_key, reduce_summaries,
+                              split_for_detail, summary_system_message, tokenize)
+from .title_generator import generate_title
+
+# Offline summarization through the batch API, for backfilling notes that have no summary yet at batch pricing:
+#
+#   prepare  - streams one map-reduce leaf request per chunk of every unsummarized note into a JSONL file
+#   submit   - uploads the file and starts the batch
+#   poll     - waits for the batch and downloads the results
+#   ingest   - merges the leaf summaries of each note, adds a title and saves the notes with bulk_update
+#
+# Each step checkpoints its progress on the SummaryBatch, so it can be interrupted and simply run again.
+# Notes written to a batch have their pending jobs deferred so the summary worker leaves them alone meanwhile.
+
+
+def batch_lock(batch):
+    return f"batch:{batch.pk}"
+
+
+# The digest of the contents lets ingest skip notes that were edited while their batch was running.
+def contents_digest(note):
+    return hashlib.sha256(note.notecontents.encode('utf-8')).hexdigest()[:12]
+
+
+def custom_id(note, index, total):
+    return f"note-{note.pk}-{index}-of-{total}-{contents_digest(note)}"
+
+
+def parse_custom_id(value):
+    _, note_id, index, _, total, digest = value.split('-')
+    return int(note_id), int(index), int(total), digest
+
+
+# Same chunks summarize() uses in map-reduce mode with a chunk cache, so the leaves fit the usual context budget
+# and can be stored as ChunkSummary rows for later edits of the note.
+def note_requests(note):
+    system_message_content = summary_system_message(SUMMARY_INSTRUCTIONS)
+    max_chunk_size = SUMMARIZER_CONTEXT_BUDGET - len(tokenize(system_message_content))
+    chunks = split_for_detail(note.notecontents, SUMMARY_DETAIL, 500, max_chunk_size=max_chunk_size,
+                              content_defined=True)
+    for i, chunk in enumerate(chunks):
+        messages = [
+            {"role": "system", "content": system_message_content},
+            {"role": "user", "content": chunk}
+        ]
+        yield batch_request(custom_id(note, i, len(chunks)), messages, SUMMARY_MODEL)
+
+
+def unsummarized_notes():
+    deferred = SummaryJob.objects.filter(status=SummaryStatus.PENDING, locked_by__startswith="batch:",
+                                         run_after__gt=timezone.now())
+    return (UserNotes.objects
+            .filter(Q(notesummary__isnull=True) | Q(notesummary=""),
+                    status__in=[SummaryStatus.PENDING, SummaryStatus.FAILED])
+            .exclude(pk__in=deferred.values('note_id')))
+
+
+def defer_jobs(batch, note_ids):
+    SummaryJob.objects.filter(note_id__in=note_ids, status=SummaryStatus.PENDING).update(
+        locked_by=batch_lock(batch),
+        run_after=timezone.now() + timedelta(hours=settings.SUMMARY_BATCH_DEFER_HOURS),
+    )
+
+
+# Hands the notes of a batch that did not get a summary back to the summary worker.
+def release_deferred_jobs(batch):
+    return SummaryJob.objects.filter(status=SummaryStatus.PENDING, locked_by=batch_lock(batch)).update(
+        locked_by="", run_after=timezone.now())
+
+
+def prepare_batch(batch=None, limit=None, checkpoint_every=100, log=print):
+    if batch is None:
+        batch = SummaryBatch.objects.create()
+        batch_dir = Path(settings.SUMMARY_BATCH_DIR)
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        batch.input_path = str(batch_dir / f"summary-batch-{batch.pk}.jsonl")
+        batch.save(update_fields=['input_path'])
+
+    notes = (unsummarized_notes()
+             .filter(pk__gt=batch.last_note_id)
+             .order_by('pk')
+             .only('pk', 'notecontents'))
+
+    mode = 'r+b' if os.path.exists(batch.input_path) else 'w+b'
+    with open(batch.input_path, mode) as f:
+        # anything written after the last checkpoint is rewritten
+        f.truncate(batch.input_bytes)
+        f.seek(batch.input_bytes)
+
+        pending_ids = []
+
+        def checkpoint():
+            f.flush()
+            os.fsync(f.fileno())
+            defer_jobs(batch, pending_ids)
+            batch.input_bytes = f.tell()
+            batch.save(update_fields=['input_bytes', 'last_note_id', 'note_count', 'request_count', 'updated_at'])
+            pending_ids.clear()
+
+        for note in notes.iterator(chunk_size=500):
+            if limit is not None and batch.note_count >= limit:
+                break
+            lines = [json.dumps(request) + "\n" for request in note_requests(note)]
+            if not lines:
+                continue
+            size = sum(len(line.encode('utf-8')) for line in lines)
+            if (batch.request_count + len(lines) > settings.SUMMARY_BATCH_MAX_REQUESTS
+                    or f.tell() + size > settings.SUMMARY_BATCH_MAX_BYTES):
+                break
+            f.write("".join(lines).encode('utf-8'))
+            batch.last_note_id = note.pk
+            batch.note_count += 1
+            batch.request_count += len(lines)
+            pending_ids.append(note.pk)
+            if len(pending_ids) >= checkpoint_every:
+                checkpoint()
+                log(f"Wrote {batch.note_count} notes ({batch.request_count} requests)")
+        checkpoint()
+
+    batch.status = BatchStatus.PREPARED
+    batch.save(update_fields=['status', 'updated_at'])
+    return batch
+
+
+def submit_batch(batch):
+    if batch.remote_id:
+        return batch
+    batch.remote_id = get_batch_backend().submit(batch.input_path)
+    batch.status = BatchStatus.SUBMITTED
+    batch.save(update_fields=['remote_id', 'status', 'updated_at'])
+    return batch
+
+
+# Checks on a submitted batch once and downloads its results when it has finished. A batch that failed or
+# expired part way through is still ingested if the service returned results for some of its requests.
+def poll_batch(batch):
+    state, output_file_id = get_batch_backend().status(batch.remote_id)
+    if state == BATCH_COMPLETED or (state == BATCH_FAILED and output_file_id):
+        batch.output_file_id = output_file_id
+        batch.output_path = str(Path(batch.input_path).with_suffix('.output.jsonl'))
+        get_batch_backend().download(output_file_id, batch.output_path)
+        batch.status = BatchStatus.COMPLETED
+    elif state == BATCH_FAILED:
+        release_deferred_jobs(batch)
+        batch.status = BatchStatus.FAILED
+    batch.save(update_fields=['output_file_id', 'output_path', 'status', 'updated_at'])
+    return batch
+
+
+def read_leaves(batch):
+    """
+    Streams the output file and returns ({note_id: [leaf summaries in chunk order]}, {note_ids that failed},
+    {note_id: [token usage of each leaf]}, {note_id: contents digest}). Results come back in no particular order, so leaves are slotted into
+    place by the index in their custom_id.
+    """
+    leaves = {}
+    failed = set()
+    usage = defaultdict(list)
+    digests = {}
+    with open(batch.output_path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            note_id, index, total, digests[note_id] = parse_custom_id(result['custom_id'])
+            response = result.get('response') or {}
+            if result.get('error') or response.get('status_code') != 200:
+                failed.add(note_id)
+                continue
+            body = response['body']
+            leaves.setdefault(note_id, [None] * total)[index] = body['choices'][0]['message']['content']
+            usage[note_id].append(body.get('usage') or {})
+    for note_id, summaries in leaves.items():
+        if any(summary is None for summary in summaries):
+            failed.add(note_id)
+    leaves = {note_id: summaries for note_id, summaries in leaves.items() if note_id not in failed}
+    return leaves, failed, usage, digests
+
+
+def finish_note(note, summaries, usage):
+    with usage_context(user=note.user_id, cache_status='miss'):
+        for tokens in usage:
+            record_completion('summarize_batch', SUMMARY_MODEL, SimpleNamespace(usage=SimpleNamespace(**tokens)))
+        ChunkSummary.objects.set_many({
+            completion_key(request['body']['messages'], SUMMARY_MODEL): summary
+            for request, summary in zip(note_requests(note), summaries)
+        })
+        if len(summaries) == 1:
+            summary = summaries[0]
+        else:
+            summary = reduce_summaries(summaries, model=SUMMARY_MODEL, additional_instructions=SUMMARY_INSTRUCTIONS,
+                                       chunk_cache=ChunkSummary.objects)
+        title = generate_title(summary)
+    return summary, title
+
+
+# Merges and titles the notes of a completed batch live (the leaves, which carry nearly all of the tokens, were
+# summarized by the batch) and saves them chunk_size notes at a time. Notes summarized in the meantime are skipped,
+# so rerunning after an interruption carries on where it stopped.
+def ingest_batch(batch, chunk_size=100, max_workers=None, log=print):
+    leaves, failed, usage, digests = read_leaves(batch)
+    note_ids = sorted(leaves)
+    batch.failed_count = len(failed)
+    max_workers = max(1, max_workers or SUMMARIZER_MAX_WORKERS)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(note_ids), chunk_size):
+            notes = list(UserNotes.objects
+                         .filter(pk__in=note_ids[start:start + chunk_size])
+                         .exclude(status=SummaryStatus.DONE)
+                         .only('pk', 'user_id', 'notecontents'))
+            # notes edited since the batch was prepared are left to the summary worker
+            notes = [note for note in notes if contents_digest(note) == digests[note.pk]]
+            futures = [executor.submit(contextvars.copy_context().run, finish_note, note, leaves[note.pk], usage[note.pk])
+                       for note in notes]
+            done = []
+            for note, future in zip(notes, futures):
+                try:
+                    note.notesummary, note.notetitle = future.result()
+                except Exception as e:
+                    log(f"note {note.pk} failed: {e}")
+                    batch.failed_count += 1
+                    continue
+                note.status = SummaryStatus.DONE
+                done.append(note)
+
+            UserNotes.objects.bulk_update(done, ['notesummary', 'notetitle', 'status'])
+            SummaryJob.objects.filter(note__in=done, status__in=[SummaryStatus.PENDING, SummaryStatus.FAILED]).update(
+                status=SummaryStatus.DONE, last_error="", locked_at=None, locked_by="")
+            for note in done:
+                key = summary_cache_key(note.notecontents, SUMMARY_MODEL, SUMMARY_DETAIL,
+                                        SUMMARY_INSTRUCTIONS, SUMMARY_PROMPT_VERSION, 'map_reduce')
+                SummaryCacheEntry.objects.store(key, note.notesummary, note.notetitle)
+            batch.ingested_count += len(done)
+            batch.save(update_fields=['ingested_count', 'failed_count', 'updated_at'])
+            log(f"Ingested {batch.ingested_count} notes")
+
+    release_deferred_jobs(batch)
+    batch.status = BatchStatus.INGESTED
+    batch.save(update_fields=['failed_count', 'status', 'updated_at'])
+    return batch
@@ -0,0 +1,200 @@
+import ctypes
+import time
+from collections import deque
+from typing import NamedTuple
+import numpy as np
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+from django.conf import settings
+from ocr_api.client import ocr_image, submit_ocr
+
+# Turns uploaded PDFs and images into note text. PDF pages that carry a text layer are read directly, which
+# takes milliseconds; only pages without enough text (scans, slides saved as images) are rendered and OCRed.
+
+PDF_CONTENT_TYPES = ('application/pdf',)
+IMAGE_CONTENT_TYPES = ('image/png', 'image/jpeg', 'image/webp', 'image/bmp', 'image/tiff')
+
+
+class DocumentError(Exception):
+    pass
+
+
+class PageText(NamedTuple):
+    page: int
+    text: str
+    path: str  # 'text' (embedded text layer), 'ocr' or 'cache' (OCRed before, see ocr_api.OCRCacheEntry)
+    ms: int
+
+
+def is_pdf(upload):
+    return upload.content_type in PDF_CONTENT_TYPES or upload.name.lower().endswith('.pdf')
+
+
+def open_pdf(upload):
+    # large uploads are already on disk, small ones are in memory
+    source = upload.temporary_file_path() if hasattr(upload, 'temporary_file_path') else upload.read()
+    try:
+        return pdfium.PdfDocument(source)
+    except pdfium.PdfiumError as e:
+        raise DocumentError(f"Could not read {upload.name} as a PDF ({e})") from e
+
+
+# Renders a page straight to a grayscale numpy array, which is what easyocr works on anyway, so there is no image
+# file to encode, write or decode again. A PDF unit is 1/72 inch.
+def render_page(page, dpi=None):
+    bitmap = page.render(scale=(dpi or settings.OCR_RENDER_DPI) / 72, grayscale=True)
+    try:
+        array = bitmap.to_numpy()
+        if array.ndim == 3 and array.shape[2] == 1:
+            array = array[:, :, 0]
+        # copied, the bitmap's buffer is freed when it is closed
+        return np.array(array)
+    finally:
+        bitmap.close()
+
+
+def extract_pdf_pages(pdf, on_progress=None, dpi=None, start=0, available=None):
+    """
+    Yields one PageText per page from page index `start` on, in page order. Pages are read here one after the other (pdfium is not thread
+    safe), but the ones that need OCR are sent off to the OCR service straight away, so up to OCR_PAGE_CONCURRENCY
+    of them are recognised at the same time by different worker processes. Finished pages are yielded as soon as
+    every page before them is done. on_progress(done, total) is called after each page.
+
+    At most OCR_PAGE_WINDOW pages are held at a time (rendered pages are a few MB each), so memory use does not
+    grow with the length of the document.
+
+    available(index) is asked before each page is read, and the pages stop at the first one it says is not there
+    yet (see PartialPDF).
+    """
+    total = len(pdf)
+    # pages read but not yielded yet: (page number, text or Future of the OCR result, path, ms spent here)
+    window = deque()
+    done = start
+
+    def finish(entry):
+        number, result, path, ms = entry
+        if path == 'ocr':
+            ocr = result.result()
+            result, ms = ocr.text, ms + ocr.total_ms
+            if ocr.cached:
+                path = 'cache'
+
+        return PageText(number, result, path, ms)
+
+    def ready(entry):
+        return entry[2] != 'ocr' or entry[1].done()
+
+    for index in range(start, total):
+        if available is not None and not available(index):
+            break
+        started = time.perf_counter()
+        page = pdf.get_page(index)
+        try:
+            textpage = page.get_textpage()
+            text = textpage.get_text_range().strip()
+            textpage.close()
+            if len(text) >= settings.PDF_TEXT_MIN_CHARS:
+                window.append((index + 1, text, 'text', int((time.perf_counter() - started) * 1000)))
+            else:
+                image = render_page(page, dpi)
+                window.append((index + 1, submit_ocr(image), 'ocr', int((time.perf_counter() - started) * 1000)))
+        finally:
+            page.close()
+        # hand back whatever is finished, and wait for the oldest page once the window is full
+        while window and (ready(window[0]) or len(window) >= settings.OCR_PAGE_WINDOW):
+            done += 1
+            yield finish(window.popleft())
+            if on_progress is not None:
+                on_progress(done, total)
+    while window:
+        done += 1
+        yield finish(window.popleft())
+        if on_progress is not None:
+            on_progress(done, total)
+
+
+class PartialPDF:
+    """
+    A PDF that is still being uploaded, opened through pdfium's progressive loading API: pdfium asks whether the
+    byte ranges it needs have arrived before reading them, so pages can be read as soon as their data is there.
+    The first `received` bytes of `path` have been written, and, if tail_start is given, everything from there
+    to the end of the file.
+
+    pdfium needs the cross-reference table at the end of the file before it finds any page but the first of a
+    linearized PDF, so pages only become readable part by part once the end of the file is there. Its page
+    checks keep state between calls, so open a new PartialPDF rather than reusing one after more data arrives.
+    """
+
+    def __init__(self, path, size, received, tail_start=None):
+        self.file = open(path, 'rb')
+        self.received = received
+        self.tail_start = tail_start
+        self.pdf = None
+        # the callbacks are kept on self, pdfium calls them for as long as the document is open
+        self._get_block = dict(pdfium_c.FPDF_FILEACCESS._fields_)['m_GetBlock'](self.read_block)
+        self._is_data_avail = dict(pdfium_c.FX_FILEAVAIL._fields_)['IsDataAvail'](self.is_data_available)
+        self._add_segment = dict(pdfium_c.FX_DOWNLOADHINTS._fields_)['AddSegment'](lambda hints, offset, size: None)
+        self.access = pdfium_c.FPDF_FILEACCESS(m_FileLen=size, m_GetBlock=self._get_block)
+        self.avail = pdfium_c.FX_FILEAVAIL(version=1, IsDataAvail=self._is_data_avail)
+        self.hints = pdfium_c.FX_DOWNLOADHINTS(version=1, AddSegment=self._add_segment)
+        self.handle = pdfium_c.FPDFAvail_Create(ctypes.byref(self.avail), ctypes.byref(self.access))
+
+    def has(self, offset, size):
+        return offset + size <= self.received or (self.tail_start is not None and offset >= self.tail_start)
+
+    def read_block(self, param, position, buffer, size):
+        if not self.has(position, size):
+            return 0
+        self.file.seek(position)
+        data = self.file.read(size)
+        ctypes.memmove(buffer, data, len(data))
+        return int(len(data) == size)
+
+    def is_data_available(self, avail, offset, size):
+        return self.has(offset, size)
+
+    # The document, or None while not enough of it has arrived to read its page index.
+    def document(self):
+        if self.pdf is None:
+            state = pdfium_c.FPDFAvail_IsDocAvail(self.handle, ctypes.byref(self.hints))
+            if state == pdfium_c.PDF_DATA_ERROR:
+                raise DocumentError("The file is not a valid PDF.")
+            if state != pdfium_c.PDF_DATA_AVAIL:
+                return None
+            raw = pdfium_c.FPDFAvail_GetDocument(self.handle, None)
+            if not raw:
+                raise DocumentError("The file is not a valid PDF.")
+            self.pdf = pdfium.PdfDocument(raw)
+        return self.pdf
+
+    def page_available(self, index):
+        return pdfium_c.FPDFAvail_IsPageAvail(self.handle, index, ctypes.byref(self.hints)) == pdfium_c.PDF_DATA_AVAIL
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.close()
+        pdfium_c.FPDFAvail_Destroy(self.handle)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def extract_pages(upload, on_progress=None):
+    if is_pdf(upload):
+        pdf = open_pdf(upload)
+        try:
+            yield from extract_pdf_pages(pdf, on_progress)
+        finally:
+            pdf.close()
+    elif upload.content_type in IMAGE_CONTENT_TYPES:
+        started = time.perf_counter()
+        ocr = ocr_image(upload.read())
+        yield PageText(1, ocr.text, 'cache' if ocr.cached else 'ocr', int((time.perf_counter() - started) * 1000))
+        if on_progress is not None:
+            on_progress(1, 1)
+    else:
+        raise DocumentError(f"Unsupported file type {upload.content_type}, upload a PDF or an image.")
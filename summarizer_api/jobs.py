@@ -0,0 +1,204 @@
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from llm_api.ledger import usage_context
+from .models import (UserNotes, SummaryJob, SummaryStatus, SummaryCacheEntry, ChunkSummary,
+                     SUMMARY_MODEL, SUMMARY_DETAIL, SUMMARY_INSTRUCTIONS)
+from .text_summarizer import summarize, stream_summarize
+from .title_generator import generate_title
+
+
+def summarize_note(note):
+    summary = summarize(
+        text=note.notecontents,
+        detail=SUMMARY_DETAIL,
+        model=SUMMARY_MODEL,
+        additional_instructions=SUMMARY_INSTRUCTIONS,
+        summarize_recursively=True,
+        map_reduce=settings.SUMMARY_MAP_REDUCE,
+        chunk_cache=ChunkSummary.objects if settings.SUMMARY_MAP_REDUCE else None
+    )
+    title = generate_title(summary)
+    return summary, title
+
+
+# Atomically moves the oldest runnable job to running. The conditional update means two workers can never
+# claim the same job; whoever loses the race just tries the next one.
+def claim_next_job(worker_id):
+    now = timezone.now()
+    candidates = (SummaryJob.objects
+                  .filter(status=SummaryStatus.PENDING, run_after__lte=now)
+                  .order_by('run_after')
+                  .values_list('id', flat=True)[:10])
+    for job_id in candidates:
+        claimed = SummaryJob.objects.filter(id=job_id, status=SummaryStatus.PENDING).update(
+            status=SummaryStatus.RUNNING,
+            locked_at=now,
+            locked_by=worker_id,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return SummaryJob.objects.select_related('note').get(id=job_id)
+    return None
+
+
+# Gives a failed note a fresh job (with a full set of attempts), so asking for its summary again retries it.
+def requeue_failed_note(note):
+    with transaction.atomic():
+        if UserNotes.objects.filter(pk=note.pk, status=SummaryStatus.FAILED).update(status=SummaryStatus.PENDING):
+            SummaryJob.objects.create(note=note)
+            return True
+    return False
+
+
+# Claims the pending job of one particular note, used when a client wants to watch its summary being generated.
+# Like claim_next_job, a job backing off after a failure or deferred to a batch (see batches.defer_jobs) is left alone.
+def claim_note_job(note, worker_id):
+    job = (SummaryJob.objects
+           .filter(note=note, status=SummaryStatus.PENDING, run_after__lte=timezone.now(), locked_by="")
+           .order_by('-id').first())
+    if job is None:
+        return None
+    claimed = SummaryJob.objects.filter(id=job.id, status=SummaryStatus.PENDING, locked_by="").update(
+        status=SummaryStatus.RUNNING,
+        locked_at=timezone.now(),
+        locked_by=worker_id,
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return None
+    return SummaryJob.objects.select_related('note').get(id=job.id)
+
+
+# The job as long as it is still running under the lease of the worker that claimed it. A worker whose lease
+# expired (see recover_stale_jobs) finds nothing here, so it can't overwrite what the job's new owner does.
+def leased(job):
+    return SummaryJob.objects.filter(pk=job.pk, status=SummaryStatus.RUNNING, locked_by=job.locked_by)
+
+
+def renew_lease(job):
+    return leased(job).update(locked_at=timezone.now())
+
+
+# Renews the job's lease every SUMMARY_JOB_HEARTBEAT_SECONDS while the block runs, so a long summary isn't handed to
+# a second worker by recover_stale_jobs. Stops early if the lease has been lost.
+@contextmanager
+def job_heartbeat(job):
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.SUMMARY_JOB_HEARTBEAT_SECONDS):
+                if not renew_lease(job):
+                    return
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
+def complete_job(job, summary, title):
+    with transaction.atomic():
+        if not leased(job).update(status=SummaryStatus.DONE, last_error="", locked_at=None):
+            return False
+        SummaryCacheEntry.objects.store(job.note.summary_cache_key(), summary, title)
+        UserNotes.objects.filter(pk=job.note_id).update(notesummary=summary, notetitle=title, status=SummaryStatus.DONE)
+    return True
+
+
+def fail_job(job, error):
+    with transaction.atomic():
+        if job.attempts >= settings.SUMMARY_JOB_MAX_ATTEMPTS:
+            if leased(job).update(status=SummaryStatus.FAILED, last_error=error, locked_at=None):
+                UserNotes.objects.filter(pk=job.note_id).update(status=SummaryStatus.FAILED)
+        else:
+            # back off 30s, 60s, 120s, ... before the next attempt
+            retry_at = timezone.now() + timedelta(seconds=30 * 2 ** (job.attempts - 1))
+            if leased(job).update(status=SummaryStatus.PENDING, last_error=error, locked_at=None, locked_by="",
+                                  run_after=retry_at):
+                UserNotes.objects.filter(pk=job.note_id).update(status=SummaryStatus.PENDING)
+
+
+# Hands an unfinished job straight back to the queue without counting the attempt.
+def release_job(job):
+    with transaction.atomic():
+        if leased(job).update(status=SummaryStatus.PENDING, locked_at=None, locked_by="", run_after=timezone.now(),
+                              attempts=F('attempts') - 1):
+            UserNotes.objects.filter(pk=job.note_id, status=SummaryStatus.RUNNING).update(status=SummaryStatus.PENDING)
+
+
+def run_job(job):
+    note = job.note
+    UserNotes.objects.filter(pk=note.pk).update(status=SummaryStatus.RUNNING)
+    try:
+        with job_heartbeat(job), usage_context(user=note.user_id, cache_status='miss'):
+            summary, title = summarize_note(note)
+    except Exception:
+        fail_job(job, traceback.format_exc())
+        return False
+    return complete_job(job, summary, title)
+
+
+# Runs a claimed job with stream_summarize(), in the same mode as summarize_note() so the result can be cached
+# under the same key, yielding its events as they arrive and saving the result at the end.
+# If the consumer goes away part way through, the job is released so the background worker can finish it.
+def stream_note_summary(job):
+    note = job.note
+    UserNotes.objects.filter(pk=note.pk).update(status=SummaryStatus.RUNNING)
+    outcome = None
+    try:
+        summary = None
+        with job_heartbeat(job), usage_context(user=note.user_id, cache_status='miss'):
+            for event, data in stream_summarize(
+                text=note.notecontents,
+                detail=SUMMARY_DETAIL,
+                model=SUMMARY_MODEL,
+                additional_instructions=SUMMARY_INSTRUCTIONS,
+                summarize_recursively=True,
+                map_reduce=settings.SUMMARY_MAP_REDUCE,
+                chunk_cache=ChunkSummary.objects if settings.SUMMARY_MAP_REDUCE else None,
+            ):
+                if event == 'summary':
+                    summary = data['html']
+                yield event, data
+            title = generate_title(summary)
+        saved = complete_job(job, summary, title)
+        outcome = SummaryStatus.DONE
+        if not saved:
+            yield 'error', {'message': "This note was handed to another worker, its summary will come from there."}
+            return
+        yield 'done', {'title': title}
+    except Exception:
+        fail_job(job, traceback.format_exc())
+        outcome = SummaryStatus.FAILED
+        yield 'error', {'message': "Summarization failed, it will be retried in the background."}
+    finally:
+        if outcome is None:
+            release_job(job)
+
+
+# Jobs still marked running after the lease has expired belong to a worker that crashed; put them back in the
+# queue, or fail them if they have already used up their attempts (so a job that kills its worker can't loop forever).
+def recover_stale_jobs():
+    cutoff = timezone.now() - timedelta(seconds=settings.SUMMARY_JOB_LEASE_SECONDS)
+    stale = SummaryJob.objects.filter(status=SummaryStatus.RUNNING, locked_at__lt=cutoff)
+
+    exhausted = stale.filter(attempts__gte=settings.SUMMARY_JOB_MAX_ATTEMPTS)
+    failed_note_ids = list(exhausted.values_list('note_id', flat=True))
+    exhausted.update(status=SummaryStatus.FAILED, locked_at=None, last_error="worker lease expired")
+    UserNotes.objects.filter(pk__in=failed_note_ids).update(status=SummaryStatus.FAILED)
+
+    note_ids = list(stale.values_list('note_id', flat=True))
+    recovered = stale.update(status=SummaryStatus.PENDING, locked_at=None, locked_by="", run_after=timezone.now())
+    UserNotes.objects.filter(pk__in=note_ids).update(status=SummaryStatus.PENDING)
+    return recovered
@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from summarizer_api.text_summarizer import (
+    chunk_on_delimiter,
+    combine_chunks_with_no_minimum,
+    get_encoding,
+)
+
+WORDS = (
+    "cell membrane protein energy equation force velocity market supply demand theory "
+    "history revolution empire trade river climate carbon atom molecule reaction enzyme "
+    "function derivative integral matrix vector probability sample variance network"
+).split()
+
+
+def synthetic_document(target_tokens, seed=0):
+    rng = random.Random(seed)
+    encoding = get_encoding()
+    sentences = []
+    tokens = 0
+    while tokens < target_tokens:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize()
+        sentences.append(sentence)
+        tokens += len(encoding.encode_ordinary(sentence + ". "))
+    return ". ".join(sentences)
+
+
+def legacy_chunk_on_delimiter(text, max_tokens, delimiter):
+    combined_chunks, _, _ = combine_chunks_with_no_minimum(
+        text.split(delimiter), max_tokens, chunk_delimiter=delimiter, add_ellipsis_for_overflow=True
+    )
+    return [f"{chunk}{delimiter}" for chunk in combined_chunks]
+
+
+class Command(BaseCommand):
+    help = "Benchmarks chunk_on_delimiter against the original per-sentence chunker on synthetic documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 50_000, 100_000, 250_000, 500_000],
+                            help="Document sizes in tokens.")
+        parser.add_argument('--max-tokens', type=int, default=500, help="Chunk size in tokens.")
+        parser.add_argument('--delimiter', default=".")
+        parser.add_argument('--legacy-limit', type=int, default=100_000,
+                            help="Skip the original chunker for documents larger than this many tokens.")
+
+    def handle(self, *args, **options):
+        get_encoding()  # load the encoding outside of the timed sections
+        self.stdout.write(f"{'tokens':>10} {'chunks':>8} {'new (s)':>10} {'legacy (s)':>12} {'speedup':>9}")
+        for size in options['sizes']:
+            text = synthetic_document(size)
+
+            start = time.perf_counter()
+            chunks = chunk_on_delimiter(text, options['max_tokens'], options['delimiter'])
+            new_time = time.perf_counter() - start
+
+            if size <= options['legacy_limit']:
+                start = time.perf_counter()
+                legacy_chunk_on_delimiter(text, options['max_tokens'], options['delimiter'])
+                legacy_time = time.perf_counter() - start
+                legacy, speedup = f"{legacy_time:.3f}", f"{legacy_time / new_time:.1f}x"
+            else:
+                legacy, speedup = "skipped", "-"
+
+            self.stdout.write(f"{size:>10} {len(chunks):>8} {new_time:>10.3f} {legacy:>12} {speedup:>9}")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer_api.batches import ingest_batch
+from summarizer_api.models import SummaryBatch, BatchStatus
+
+
+class Command(BaseCommand):
+    help = "Saves the results of a completed summary batch to the notes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch', type=int)
+        parser.add_argument('--chunk-size', type=int, default=100, help="Notes saved per bulk update.")
+        parser.add_argument('--workers', type=int, help="Notes merged and titled in parallel.")
+
+    def handle(self, *args, **options):
+        batch = SummaryBatch.objects.filter(pk=options['batch']).first()
+        if batch is None or batch.status not in (BatchStatus.COMPLETED, BatchStatus.INGESTED):
+            raise CommandError(f"Batch {options['batch']} has no results to ingest")
+        batch = ingest_batch(batch, chunk_size=options['chunk_size'], max_workers=options['workers'],
+                             log=self.stdout.write)
+        self.stdout.write(f"Batch {batch.pk}: {batch.ingested_count} notes ingested, {batch.failed_count} failed")
@@ -0,0 +1,42 @@
+import time
+
+import pypdfium2 as pdfium
+from django.core.management.base import BaseCommand
+
+from summarizer_api.documents import extract_pdf_pages
+from summarizer_api.normalize import normalize_pages
+
+
+class Command(BaseCommand):
+    help = "Extracts the text of a PDF the way uploads are processed, reporting progress and per-page timings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--dpi', type=int, help="Resolution pages are rendered at for OCR.")
+        parser.add_argument('--show-text', action='store_true', help="Print the extracted text.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        pdf = pdfium.PdfDocument(options['path'])
+        try:
+            def progress(done, total):
+                self.stderr.write(f"\r{done}/{total} pages", ending='')
+
+            pages = list(extract_pdf_pages(pdf, on_progress=progress, dpi=options['dpi']))
+        finally:
+            pdf.close()
+        elapsed = time.perf_counter() - started
+        self.stderr.write("")
+
+        for page in pages:
+            self.stdout.write(f"page {page.page:>4}  {page.path:<5}  {page.ms:>6} ms  {len(page.text):>6} chars")
+        ocr_pages = sum(1 for page in pages if page.path == 'ocr')
+        cached_pages = sum(1 for page in pages if page.path == 'cache')
+        self.stdout.write(f"{len(pages)} pages ({ocr_pages} OCRed, {cached_pages} from the OCR cache) in {elapsed:.2f}s, "
+                          f"{len(pages) / elapsed if elapsed else 0:.2f} pages/s")
+        contents, report = normalize_pages([page.text for page in pages])
+        self.stdout.write(f"Normalized from {report.tokens_before} to {report.tokens_after} tokens "
+                          f"({report.tokens_saved} saved): {report.boilerplate_lines} repeated header/footer line(s), "
+                          f"{report.duplicate_paragraphs} duplicate paragraph(s)")
+        if options['show_text']:
+            self.stdout.write(contents)
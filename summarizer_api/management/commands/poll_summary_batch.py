@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer_api.batches import poll_batch
+from summarizer_api.models import SummaryBatch, BatchStatus
+
+
+class Command(BaseCommand):
+    help = "Checks on a submitted summary batch and downloads its results once it has finished."
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch', type=int)
+        parser.add_argument('--wait', action='store_true', help="Keep polling until the batch has finished.")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between polls with --wait.")
+
+    def handle(self, *args, **options):
+        batch = SummaryBatch.objects.filter(pk=options['batch']).first()
+        if batch is None or batch.status != BatchStatus.SUBMITTED:
+            raise CommandError(f"Batch {options['batch']} is not waiting on the batch API")
+        while True:
+            batch = poll_batch(batch)
+            if batch.status != BatchStatus.SUBMITTED or not options['wait']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(f"Batch {batch.pk} is {batch.status}")
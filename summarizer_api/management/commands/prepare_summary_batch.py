@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer_api.batches import prepare_batch
+from summarizer_api.models import SummaryBatch, BatchStatus
+
+
+class Command(BaseCommand):
+    help = "Writes a batch API request file for notes that have no summary yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int,
+                            help="Resume preparing this batch. Defaults to the last unfinished one, if any.")
+        parser.add_argument('--limit', type=int, help="Most notes to put in the batch.")
+        parser.add_argument('--checkpoint-every', type=int, default=100,
+                            help="Notes written between checkpoints.")
+
+    def handle(self, *args, **options):
+        if options['batch']:
+            batch = SummaryBatch.objects.filter(pk=options['batch'], status=BatchStatus.PREPARING).first()
+            if batch is None:
+                raise CommandError(f"Batch {options['batch']} is not being prepared")
+        else:
+            batch = SummaryBatch.objects.filter(status=BatchStatus.PREPARING).order_by('-pk').first()
+        if batch is not None:
+            self.stdout.write(f"Resuming batch {batch.pk} after note {batch.last_note_id}")
+
+        batch = prepare_batch(batch, limit=options['limit'], checkpoint_every=options['checkpoint_every'],
+                              log=self.stdout.write)
+        self.stdout.write(f"Batch {batch.pk}: {batch.note_count} notes, {batch.request_count} requests "
+                          f"written to {batch.input_path}")
@@ -0,0 +1,61 @@
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from summarizer_api.jobs import claim_next_job, recover_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Processes queued note summarization jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.SUMMARY_WORKER_CONCURRENCY,
+                            help="Number of jobs processed in parallel.")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is empty instead of polling forever.")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stop = threading.Event()
+
+        recovered = recover_stale_jobs()
+        if recovered:
+            self.stdout.write(f"Requeued {recovered} stale job(s)")
+
+        def work(thread_id):
+            name = f"{worker_id}:{thread_id}"
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    job = claim_next_job(name)
+                    if job is None:
+                        if options['once']:
+                            return
+                        stop.wait(options['poll_interval'])
+                        recover_stale_jobs()
+                        continue
+                    started = time.monotonic()
+                    ok = run_job(job)
+                    self.stdout.write(f"[{name}] note {job.note_id} {'done' if ok else 'failed'} "
+                                      f"in {time.monotonic() - started:.1f}s (attempt {job.attempts})")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(i,), daemon=True) for i in range(max(1, options['workers']))]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            # running jobs are abandoned and picked up again by recover_stale_jobs once their lease expires
+            self.stdout.write("Stopping workers")
+            stop.set()
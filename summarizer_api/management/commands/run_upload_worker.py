@@ -0,0 +1,52 @@
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from ocr_api.client import OCRServiceError
+from summarizer_api.uploads import claim_next_upload, process_upload, recover_stale_uploads
+
+
+class Command(BaseCommand):
+    help = ("Reads the pages of resumable uploads as their parts arrive and creates their notes. pdfium is not "
+            "thread safe, so each worker handles one upload at a time; run more of them for more uploads at once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to sleep when no upload has new data.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once no upload has new data instead of polling forever.")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stop = threading.Event()
+        recover_stale_uploads()
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                session = claim_next_upload(worker_id)
+                if session is None:
+                    if options['once']:
+                        return
+                    stop.wait(options['poll_interval'])
+                    recover_stale_uploads()
+                    continue
+                started = time.monotonic()
+                try:
+                    pages = process_upload(session)
+                except OCRServiceError as e:
+                    # the session stays locked until its lease runs out, by which time the service may be back
+                    self.stderr.write(f"upload {session.pk}: {e}")
+                    stop.wait(options['poll_interval'])
+                    continue
+                session.refresh_from_db()
+                self.stdout.write(f"upload {session.pk}: {pages} page(s) in {time.monotonic() - started:.1f}s, "
+                                  f"{session.pages_done}/{session.page_count or '?'} done, "
+                                  f"{session.received_bytes}/{session.size} bytes received ({session.status})")
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping upload worker")
+        finally:
+            connection.close()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from summarizer_api.batches import submit_batch
+from summarizer_api.models import SummaryBatch, BatchStatus
+
+
+class Command(BaseCommand):
+    help = "Uploads a prepared summary batch to the batch API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch', type=int)
+
+    def handle(self, *args, **options):
+        batch = SummaryBatch.objects.filter(pk=options['batch']).first()
+        if batch is None or batch.status not in (BatchStatus.PREPARED, BatchStatus.SUBMITTED):
+            raise CommandError(f"Batch {options['batch']} is not prepared")
+        if batch.request_count == 0:
+            raise CommandError(f"Batch {batch.pk} has no requests")
+        batch = submit_batch(batch)
+        self.stdout.write(f"Batch {batch.pk} submitted as {batch.remote_id}")
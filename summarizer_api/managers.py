@@ -0,0 +1,92 @@
+import hashlib
+import json
+import re
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
+
+def normalize_note_contents(text):
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+def summary_cache_key(contents, model, detail, instructions, prompt_version, mode='recursive'):
+    payload = json.dumps([normalize_note_contents(contents), model, detail, instructions, prompt_version, mode])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CacheStatsManager(models.Manager):
+    def record(self, name, hit, count=1):
+        if count <= 0:
+            return
+        stats, _ = self.get_or_create(name=name)
+        field = 'hits' if hit else 'misses'
+        self.filter(pk=stats.pk).update(**{field: F(field) + count})
+
+
+class SummaryCacheManager(models.Manager):
+    def lookup(self, key):
+        now = timezone.now()
+        ttl = timedelta(days=settings.SUMMARY_CACHE_TTL_DAYS)
+        entry = self.filter(key=key, created_at__gte=now - ttl).first()
+        stats = apps.get_model('summarizer_api', 'CacheStats').objects
+        if entry is None:
+            stats.record('summary', hit=False)
+            return None
+        self.filter(pk=entry.pk).update(last_used_at=now, hit_count=F('hit_count') + 1)
+        stats.record('summary', hit=True)
+        return entry
+
+    def store(self, key, summary, title):
+        entry, _ = self.update_or_create(key=key, defaults={
+            'summary': summary,
+            'title': title,
+            'created_at': timezone.now(),
+            'last_used_at': timezone.now(),
+        })
+        self.evict()
+        return entry
+
+    def evict(self):
+        # drop expired entries, then the least recently used ones above the size limit
+        ttl = timedelta(days=settings.SUMMARY_CACHE_TTL_DAYS)
+        self.filter(created_at__lt=timezone.now() - ttl).delete()
+        overflow = self.count() - settings.SUMMARY_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            stale = list(self.order_by('last_used_at').values_list('pk', flat=True)[:overflow])
+            self.filter(pk__in=stale).delete()
+
+
+# Chunk summaries and merges keyed by text_summarizer.completion_key(), used as the chunk_cache of summarize().
+class ChunkSummaryManager(models.Manager):
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        now = timezone.now()
+        ttl = timedelta(days=settings.SUMMARY_CACHE_TTL_DAYS)
+        found = dict(self.filter(key__in=keys, created_at__gte=now - ttl).values_list('key', 'summary'))
+        self.filter(key__in=list(found)).update(last_used_at=now, hit_count=F('hit_count') + 1)
+        stats = apps.get_model('summarizer_api', 'CacheStats').objects
+        stats.record('chunk_summary', hit=True, count=len(found))
+        stats.record('chunk_summary', hit=False, count=len(set(keys)) - len(found))
+        return found
+
+    def set_many(self, summaries):
+        if not summaries:
+            return
+        now = timezone.now()
+        self.filter(key__in=list(summaries)).delete()
+        self.bulk_create([self.model(key=key, summary=summary, created_at=now, last_used_at=now)
+                          for key, summary in summaries.items()], ignore_conflicts=True)
+        self.evict()
+
+    def evict(self):
+        ttl = timedelta(days=settings.SUMMARY_CACHE_TTL_DAYS)
+        self.filter(created_at__lt=timezone.now() - ttl).delete()
+        overflow = self.count() - settings.SUMMARY_CHUNK_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            stale = list(self.order_by('last_used_at').values_list('pk', flat=True)[:overflow])
+            self.filter(pk__in=stale).delete()
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summarizer_api', '0005_alter_usernotes_notetitle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Cache Name')),
+                ('hits', models.PositiveBigIntegerField(default=0, verbose_name='Hits')),
+                ('misses', models.PositiveBigIntegerField(default=0, verbose_name='Misses')),
+            ],
+            options={
+                'verbose_name': 'Cache Stats',
+                'verbose_name_plural': 'Cache Stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='SummaryCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Cache Key')),
+                ('summary', models.TextField(verbose_name='Summary')),
+                ('title', models.TextField(default='', verbose_name='Title')),
+                ('created_at', models.DateTimeField(verbose_name='Created At')),
+                ('last_used_at', models.DateTimeField(db_index=True, verbose_name='Last Used At')),
+                ('hit_count', models.PositiveIntegerField(default=0, verbose_name='Hit Count')),
+            ],
+            options={
+                'verbose_name': 'Summary Cache Entry',
+                'verbose_name_plural': 'Summary Cache Entries',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summarizer_api', '0006_summary_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usernotes',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='done', max_length=10, verbose_name='Summary Status'),
+        ),
+        migrations.CreateModel(
+            name='SummaryJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Run After')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Locked At')),
+                ('locked_by', models.CharField(blank=True, default='', max_length=100, verbose_name='Locked By')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Last Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summary_jobs', to='summarizer_api.usernotes')),
+            ],
+            options={
+                'verbose_name': 'Summary Job',
+                'verbose_name_plural': 'Summary Jobs',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='summarizer__status_f38861_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summarizer_api', '0007_summary_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('preparing', 'Preparing'), ('prepared', 'Prepared'), ('submitted', 'Submitted'), ('completed', 'Completed'), ('ingested', 'Ingested'), ('failed', 'Failed')], default='preparing', max_length=10, verbose_name='Status')),
+                ('input_path', models.CharField(max_length=500, verbose_name='Input File')),
+                ('input_bytes', models.PositiveBigIntegerField(default=0, verbose_name='Input Bytes Written')),
+                ('last_note_id', models.PositiveBigIntegerField(default=0, verbose_name='Last Note Written')),
+                ('note_count', models.PositiveIntegerField(default=0, verbose_name='Notes')),
+                ('request_count', models.PositiveIntegerField(default=0, verbose_name='Requests')),
+                ('remote_id', models.CharField(blank=True, default='', max_length=200, verbose_name='Remote Batch ID')),
+                ('output_file_id', models.CharField(blank=True, default='', max_length=500, verbose_name='Remote Output File')),
+                ('output_path', models.CharField(blank=True, default='', max_length=500, verbose_name='Output File')),
+                ('ingested_count', models.PositiveIntegerField(default=0, verbose_name='Notes Ingested')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Notes Failed')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Summary Batch',
+                'verbose_name_plural': 'Summary Batches',
+            },
+        ),
+    ]
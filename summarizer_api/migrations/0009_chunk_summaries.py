@@ -0,0 +1,28 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summarizer_api', '0008_summary_batches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Prompt Hash')),
+                ('summary', models.TextField(verbose_name='Summary')),
+                ('created_at', models.DateTimeField(verbose_name='Created At')),
+                ('last_used_at', models.DateTimeField(db_index=True, verbose_name='Last Used At')),
+                ('hit_count', models.PositiveIntegerField(default=0, verbose_name='Hit Count')),
+            ],
+            options={
+                'verbose_name': 'Chunk Summary',
+                'verbose_name_plural': 'Chunk Summaries',
+            },
+        ),
+    ]
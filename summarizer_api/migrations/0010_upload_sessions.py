@@ -0,0 +1,67 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summarizer_api', '0009_chunk_summaries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255, verbose_name='File Name')),
+                ('content_type', models.CharField(max_length=100, verbose_name='Content Type')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Size')),
+                ('received_bytes', models.PositiveBigIntegerField(default=0, verbose_name='Bytes Received')),
+                ('tail_start', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Last Part Starts At')),
+                ('checked_bytes', models.PositiveBigIntegerField(default=0, verbose_name='Bytes Checked')),
+                ('path', models.CharField(max_length=500, verbose_name='Upload File')),
+                ('status', models.CharField(choices=[('receiving', 'Receiving'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='receiving', max_length=10, verbose_name='Status')),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True, verbose_name='Pages')),
+                ('pages_done', models.PositiveIntegerField(default=0, verbose_name='Pages Done')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Error')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Locked At')),
+                ('locked_by', models.CharField(blank=True, default='', max_length=100, verbose_name='Locked By')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('note', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='uploads', to='summarizer_api.usernotes')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload Session',
+                'verbose_name_plural': 'Upload Sessions',
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.PositiveIntegerField(verbose_name='Page')),
+                ('text', models.TextField(blank=True, default='', verbose_name='Text')),
+                ('path', models.CharField(max_length=10, verbose_name='Path')),
+                ('ms', models.PositiveIntegerField(default=0, verbose_name='Milliseconds')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='summarizer_api.uploadsession')),
+            ],
+            options={
+                'verbose_name': 'Upload Page',
+                'verbose_name_plural': 'Upload Pages',
+                'ordering': ['page'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['status', 'locked_by'], name='summarizer__status_2cf8f9_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='uploadpage',
+            constraint=models.UniqueConstraint(fields=('session', 'page'), name='unique_upload_page'),
+        ),
+    ]
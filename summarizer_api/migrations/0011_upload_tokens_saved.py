@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summarizer_api', '0010_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='tokens_saved',
+            field=models.PositiveIntegerField(default=0, verbose_name='Tokens Saved'),
+        ),
+    ]
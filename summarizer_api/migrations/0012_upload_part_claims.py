@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summarizer_api', '0011_upload_tokens_saved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='writing_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Writing Since'),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='writing_from',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Writing From'),
+        ),
+    ]
@@ -1,42 +1,264 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _ 
-from .text_summarizer import summarize
 from users.models import User
-from .title_generator import generate_title
-from django.db import transaction
+from llm_api.ledger import record_completion, usage_context
+from .managers import CacheStatsManager, ChunkSummaryManager, SummaryCacheManager, summary_cache_key
 
 # Create your models here.
 
+SUMMARY_MODEL = 'gpt-4o-mini'
+SUMMARY_DETAIL = 0.75
+# Bump this whenever the summary prompts change so stale cached summaries are not reused.
+SUMMARY_PROMPT_VERSION = 1
+SUMMARY_INSTRUCTIONS = '''You are a professional tutor and you are reading the provided material to generate comprehensive summary notes for my upcoming test.
+
+                                            Generate a summary notes that is clear, concise, and easy to understand.
+
+                                            Respond in html format only use ordered list, headings, and unordered list. Remove extras like ``` or the tag/word html and do not use markdowns elements. You may also read inline LaTex and block LaTex formulas
+
+                                            The summary notes should contain overview summary (a brief, high-level overview of the main topic covered in the material. Focus on summarizing the core ideas and key concepts in 2-3 sentences), and Detailed Breakdown with Key Points (Break the topic into logical sections or themes. For each section, list the key points or takeaways in a bulleted or numbered format for easy reading). Use h2 as section headers for Overview Summary and Key Points.
+                                            '''
+
+class SummaryStatus(models.TextChoices):
+    PENDING = 'pending', _("Pending")
+    RUNNING = 'running', _("Running")
+    DONE = 'done', _("Done")
+    FAILED = 'failed', _("Failed")
+
 class UserNotes(models.Model):
     notetitle = models.TextField(_("Note Title"), default="")
     notecontents = models.TextField(_("Note Contents"))
     notedatecreated = models.DateTimeField(auto_now_add=True)
     notesummary = models.TextField(_("Note Summary"), blank=True, null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notes')
+    status = models.CharField(_("Summary Status"), max_length=10, choices=SummaryStatus.choices, default=SummaryStatus.DONE)
     
     class Meta: 
         verbose_name = _("User Note")
         verbose_name_plural = _("User Notes")
     
+    def summary_cache_key(self):
+        mode = 'map_reduce' if settings.SUMMARY_MAP_REDUCE else 'recursive'
+        return summary_cache_key(self.notecontents, SUMMARY_MODEL, SUMMARY_DETAIL,
+                                 SUMMARY_INSTRUCTIONS, SUMMARY_PROMPT_VERSION, mode)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        note = super().from_db(db, field_names, values)
+        # remembered so save() can tell when the contents were edited
+        note._saved_contents = note.__dict__.get('notecontents')
+        note._saved_summary = note.__dict__.get('notesummary')
+        return note
+
+    # New notes are summarized by the summary worker (manage.py run_summary_worker) unless the
+    # summary is already cached, so saving never waits on the LLM. Editing the contents of a note
+    # queues it again (unless the summary was edited too); in map-reduce mode only the changed
+    # chunks are summarized again, see ChunkSummary.
     def save(self, *args, **kwargs):
+        creating = self._state.adding
+        saved_contents = getattr(self, '_saved_contents', None)
+        edited = (not creating and saved_contents is not None and self.notecontents != saved_contents
+                  and self.notesummary == self._saved_summary)
+        queued = False
+        if (creating and not self.notesummary) or edited:
+            cached = SummaryCacheEntry.objects.lookup(self.summary_cache_key())
+            if cached is not None:
+                with usage_context(user=self.user_id):
+                    record_completion('summarize', SUMMARY_MODEL, cache_status='hit')
+                self.notesummary = cached.summary
+                self.notetitle = cached.title
+                self.status = SummaryStatus.DONE
+            else:
+                # an edited note keeps showing its old summary until the new one is ready
+                self.status = SummaryStatus.PENDING
+                queued = True
+        # saved together with its job, so a note is never left pending with nothing queued to summarize it
         with transaction.atomic():
-            if not self.notesummary:  
-                self.notesummary = summarize(
-                    text=self.notecontents,
-                    detail=0.75, 
-                    model='gpt-4o-mini',
-                    additional_instructions='''You are a professional tutor and you are reading the provided material to generate comprehensive summary notes for my upcoming test.
+            super(UserNotes, self).save(*args, **kwargs)
+            if queued:
+                # a job still waiting (possibly deferred by a summary batch) is run as soon as possible instead
+                waiting = self.summary_jobs.filter(status=SummaryStatus.PENDING).update(run_after=timezone.now(), locked_by="")
+                if not waiting:
+                    SummaryJob.objects.create(note=self)
+        self._saved_contents = self.notecontents
+        self._saved_summary = self.notesummary
+    
+    def __str__(self):
+        return self.notetitle
 
-                                            Generate a summary notes that is clear, concise, and easy to understand.
 
-                                            Respond in html format only use ordered list, headings, and unordered list. Remove extras like ``` or the tag/word html and do not use markdowns elements. You may also read inline LaTex and block LaTex formulas
 
-                                            The summary notes should contain overview summary (a brief, high-level overview of the main topic covered in the material. Focus on summarizing the core ideas and key concepts in 2-3 sentences), and Detailed Breakdown with Key Points (Break the topic into logical sections or themes. For each section, list the key points or takeaways in a bulleted or numbered format for easy reading). Use h2 as section headers for Overview Summary and Key Points.
-                                            ''',
-                    summarize_recursively=True
-                )
-                self.notetitle = generate_title(self.notesummary)
-            super(UserNotes, self).save(*args, **kwargs)
-    
+# Background summarization work for a note, claimed and run by manage.py run_summary_worker.
+
+class SummaryJob(models.Model):
+    note = models.ForeignKey(UserNotes, on_delete=models.CASCADE, related_name='summary_jobs')
+    status = models.CharField(_("Status"), max_length=10, choices=SummaryStatus.choices, default=SummaryStatus.PENDING)
+    attempts = models.PositiveIntegerField(_("Attempts"), default=0)
+    run_after = models.DateTimeField(_("Run After"), default=timezone.now)
+    locked_at = models.DateTimeField(_("Locked At"), blank=True, null=True)
+    locked_by = models.CharField(_("Locked By"), max_length=100, blank=True, default="")
+    last_error = models.TextField(_("Last Error"), blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Summary Job")
+        verbose_name_plural = _("Summary Jobs")
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"{self.note_id} ({self.status})"
+
+
+# Summaries shared between notes with the same contents, keyed by summary_cache_key().
+
+class SummaryCacheEntry(models.Model):
+    key = models.CharField(_("Cache Key"), max_length=64, unique=True)
+    summary = models.TextField(_("Summary"))
+    title = models.TextField(_("Title"), default="")
+    created_at = models.DateTimeField(_("Created At"))
+    last_used_at = models.DateTimeField(_("Last Used At"), db_index=True)
+    hit_count = models.PositiveIntegerField(_("Hit Count"), default=0)
+
+    objects = SummaryCacheManager()
+
+    class Meta:
+        verbose_name = _("Summary Cache Entry")
+        verbose_name_plural = _("Summary Cache Entries")
+
+    def __str__(self):
+        return self.title
+
+
+# Summaries of single chunks and of merges, keyed by a hash of the exact prompt (text_summarizer.completion_key).
+# Notes are chunked on their contents in map-reduce mode, so when a note is edited every chunk it shares with the
+# previous version is found here and only the changed ones go to the LLM.
+
+class ChunkSummary(models.Model):
+    key = models.CharField(_("Prompt Hash"), max_length=64, unique=True)
+    summary = models.TextField(_("Summary"))
+    created_at = models.DateTimeField(_("Created At"))
+    last_used_at = models.DateTimeField(_("Last Used At"), db_index=True)
+    hit_count = models.PositiveIntegerField(_("Hit Count"), default=0)
+
+    objects = ChunkSummaryManager()
+
+    class Meta:
+        verbose_name = _("Chunk Summary")
+        verbose_name_plural = _("Chunk Summaries")
+
+    def __str__(self):
+        return self.key
+
+
+class CacheStats(models.Model):
+    name = models.CharField(_("Cache Name"), max_length=50, unique=True)
+    hits = models.PositiveBigIntegerField(_("Hits"), default=0)
+    misses = models.PositiveBigIntegerField(_("Misses"), default=0)
+
+    objects = CacheStatsManager()
+
+    class Meta:
+        verbose_name = _("Cache Stats")
+        verbose_name_plural = _("Cache Stats")
+
+    def __str__(self):
+        return f"{self.name}: {self.hits} hits / {self.misses} misses"
+
+
+class BatchStatus(models.TextChoices):
+    PREPARING = 'preparing', _("Preparing")
+    PREPARED = 'prepared', _("Prepared")
+    SUBMITTED = 'submitted', _("Submitted")
+    COMPLETED = 'completed', _("Completed")
+    INGESTED = 'ingested', _("Ingested")
+    FAILED = 'failed', _("Failed")
+
+
+# Progress of an offline summarization batch (see summarizer_api/batches.py). Every step saves its checkpoint
+# here, so any of the batch commands can be stopped and rerun without losing or repeating work.
+
+class SummaryBatch(models.Model):
+    status = models.CharField(_("Status"), max_length=10, choices=BatchStatus.choices, default=BatchStatus.PREPARING)
+    input_path = models.CharField(_("Input File"), max_length=500)
+    input_bytes = models.PositiveBigIntegerField(_("Input Bytes Written"), default=0)
+    last_note_id = models.PositiveBigIntegerField(_("Last Note Written"), default=0)
+    note_count = models.PositiveIntegerField(_("Notes"), default=0)
+    request_count = models.PositiveIntegerField(_("Requests"), default=0)
+    remote_id = models.CharField(_("Remote Batch ID"), max_length=200, blank=True, default="")
+    output_file_id = models.CharField(_("Remote Output File"), max_length=500, blank=True, default="")
+    output_path = models.CharField(_("Output File"), max_length=500, blank=True, default="")
+    ingested_count = models.PositiveIntegerField(_("Notes Ingested"), default=0)
+    failed_count = models.PositiveIntegerField(_("Notes Failed"), default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Summary Batch")
+        verbose_name_plural = _("Summary Batches")
+
     def __str__(self):
-        return self.notetitle
\ No newline at end of file
+        return f"Batch {self.pk} ({self.status})"
+
+
+class UploadStatus(models.TextChoices):
+    RECEIVING = 'receiving', _("Receiving")
+    PROCESSING = 'processing', _("Processing")
+    DONE = 'done', _("Done")
+    FAILED = 'failed', _("Failed")
+
+
+# A resumable upload of a large document (see summarizer_api/uploads.py). The client sends the file in parts that
+# are written to `path` as they arrive: in order from the start, plus optionally the last part ahead of the rest.
+# The upload worker reads pages out of it as soon as they are complete and keeps their text in UploadPage, and
+# creates the note once the last page is done.
+
+class UploadSession(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(_("File Name"), max_length=255)
+    content_type = models.CharField(_("Content Type"), max_length=100)
+    size = models.PositiveBigIntegerField(_("Size"))
+    # bytes received from the start of the file, and where the last part begins if it was sent ahead of the rest
+    received_bytes = models.PositiveBigIntegerField(_("Bytes Received"), default=0)
+    tail_start = models.PositiveBigIntegerField(_("Last Part Starts At"), blank=True, null=True)
+    # received_bytes when the worker last ran out of readable pages; it looks again once more has arrived
+    checked_bytes = models.PositiveBigIntegerField(_("Bytes Checked"), default=0)
+    # where the part being written starts; parts are written one at a time, each claiming the session first
+    writing_from = models.PositiveBigIntegerField(_("Writing From"), blank=True, null=True)
+    writing_at = models.DateTimeField(_("Writing Since"), blank=True, null=True)
+    path = models.CharField(_("Upload File"), max_length=500)
+    status = models.CharField(_("Status"), max_length=10, choices=UploadStatus.choices, default=UploadStatus.RECEIVING)
+    page_count = models.PositiveIntegerField(_("Pages"), blank=True, null=True)
+    pages_done = models.PositiveIntegerField(_("Pages Done"), default=0)
+    # tokens removed from the text as repeated headers, footers, whitespace and duplicates, see normalize.py
+    tokens_saved = models.PositiveIntegerField(_("Tokens Saved"), default=0)
+    note = models.ForeignKey(UserNotes, on_delete=models.SET_NULL, blank=True, null=True, related_name='uploads')
+    error = models.TextField(_("Error"), blank=True, default="")
+    locked_at = models.DateTimeField(_("Locked At"), blank=True, null=True)
+    locked_by = models.CharField(_("Locked By"), max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Upload Session")
+        verbose_name_plural = _("Upload Sessions")
+        indexes = [models.Index(fields=['status', 'locked_by'])]
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+
+class UploadPage(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='pages')
+    page = models.PositiveIntegerField(_("Page"))
+    text = models.TextField(_("Text"), blank=True, default="")
+    path = models.CharField(_("Path"), max_length=10)
+    ms = models.PositiveIntegerField(_("Milliseconds"), default=0)
+
+    class Meta:
+        verbose_name = _("Upload Page")
+        verbose_name_plural = _("Upload Pages")
+        ordering = ['page']
+        constraints = [models.UniqueConstraint(fields=['session', 'page'], name='unique_upload_page')]
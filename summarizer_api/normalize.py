@@ -0,0 +1,99 @@
+import re
+from collections import Counter
+from typing import List, NamedTuple
+from .text_summarizer import tokenize
+
+# Cleans up the text extracted from a document before it becomes a note and is summarized. Handouts repeat running
+# headers, footers, page numbers and watermarks on every page; those are found by how many pages they appear on and
+# where, and removed. Whitespace is collapsed and paragraphs that appear more than once are kept only the first
+# time.
+
+PAGE_NUMBER = re.compile(r'[-\u2013\u2014 ]*(?:(?:page|pg\.?|p\.) ?)?\d+(?: ?(?:of|/) ?\d+)?[-\u2013\u2014 ]*', re.IGNORECASE)
+SPACES = re.compile(r'[ \t\f\v\u00a0]+')
+BLANK_LINES = re.compile(r'\n\s*\n+')
+
+
+class NormalizeReport(NamedTuple):
+    tokens_before: int
+    tokens_after: int
+    boilerplate_lines: int
+    duplicate_paragraphs: int
+
+    @property
+    def tokens_saved(self):
+        return self.tokens_before - self.tokens_after
+
+
+def collapse_whitespace(text):
+    lines = (SPACES.sub(" ", line).strip() for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n'))
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+# Page numbers ("12", "- 12 -", "Page 3", "p. 3 of 12", "3/12") differ on every page, so they all share one key.
+# Every other line must match exactly: numbered captions and headings ("Figure 2", "Question 3") are content.
+def edge_key(line):
+    if PAGE_NUMBER.fullmatch(line):
+        return "#page"
+    return line.lower()
+
+
+def repeated_lines(pages, zone=3, min_share=0.5, anywhere_share=0.8, anywhere_words=8):
+    """
+    Finds boilerplate lines and returns two sets of keys: edge_key()s of lines among the first or last `zone`
+    lines of at least `min_share` of the pages (headers, footers, page numbers), and lowercased short lines
+    found anywhere on at least `anywhere_share` of them (watermarks, stamps).
+    """
+    edges = Counter()
+    anywhere = Counter()
+    for lines in pages:
+        edges.update(set(edge_key(line) for line in lines[:zone] + lines[-zone:]))
+        anywhere.update(set(line.lower() for line in lines if len(line.split()) <= anywhere_words))
+    enough = max(2, min_share * len(pages))
+    enough_anywhere = max(2, anywhere_share * len(pages))
+    return ({key for key, count in edges.items() if count >= enough},
+            {key for key, count in anywhere.items() if count >= enough_anywhere})
+
+
+def normalize_pages(pages: List[str], min_pages=3, min_paragraph_chars=30, zone=3):
+    """
+    Returns the text of a document's pages, cleaned up and joined by blank lines, and a NormalizeReport.
+    Repeated lines are only looked for in documents with at least `min_pages` pages; paragraphs shorter than
+    `min_paragraph_chars` (list labels, "Example:") are never treated as duplicates.
+    """
+    before = "\n\n".join(text for text in pages if text)
+    page_lines = [collapse_whitespace(text).split('\n') for text in pages]
+    edges, anywhere = repeated_lines([[line for line in lines if line] for lines in page_lines], zone) \
+        if len(pages) >= min_pages else (set(), set())
+
+    boilerplate_lines = 0
+    cleaned = []
+    for lines in page_lines:
+        kept = []
+        count = sum(1 for line in lines if line)
+        i = -1
+        for line in lines:
+            if not line:
+                kept.append(line)
+                continue
+            i += 1
+            at_edge = i < zone or i >= count - zone
+            if (at_edge and edge_key(line) in edges) or line.lower() in anywhere:
+                boilerplate_lines += 1
+            else:
+                kept.append(line)
+        text = collapse_whitespace("\n".join(kept))
+        if text:
+            cleaned.append(text)
+
+    seen = set()
+    duplicate_paragraphs = 0
+    paragraphs = []
+    for paragraph in "\n\n".join(cleaned).split("\n\n"):
+        if len(paragraph) >= min_paragraph_chars:
+            if paragraph in seen:
+                duplicate_paragraphs += 1
+                continue
+            seen.add(paragraph)
+        paragraphs.append(paragraph)
+    after = "\n\n".join(paragraphs)
+    return after, NormalizeReport(len(tokenize(before)), len(tokenize(after)), boilerplate_lines, duplicate_paragraphs)
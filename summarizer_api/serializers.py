@@ -1,7 +1,17 @@
 from rest_framework import serializers
-from .models import UserNotes
+from .models import UserNotes, UploadSession
 
 class UserNotesSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserNotes
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ['status']
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'content_type', 'size', 'received_bytes', 'tail_start', 'status', 'page_count',
+                  'pages_done', 'tokens_saved', 'note', 'error', 'created_at', 'updated_at']
+        read_only_fields = ['received_bytes', 'tail_start', 'status', 'page_count', 'pages_done', 'tokens_saved',
+                            'note', 'error']
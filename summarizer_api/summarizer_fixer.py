@@ -1,30 +1,35 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
-import json
+from llm_api.client import chat_completion, stream_chat_completion
 
-load_dotenv()
-
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-
-def fix_summary(paragraph: str):
+def fix_summary_messages(paragraph: str):
     prompt = (
         f"You are going to fix the summarized text "
         f"Fix it so that it is precise to the original summary but non repeatitive. "
         "There should only be one overview summary and one detailed breakdown of everything"
         "Respond in html format only use ordered list, headings, and unordered list. Remove extras like ``` or the tag/word html and do not use markdowns elements. You may also read inline LaTex and block LaTex formulas"
     )
+    return [
+        {"role": "system", "content": prompt },
+        {"role": "user", "content": paragraph},
+    ]
 
-    response = client.chat.completions.create(
+def fix_summary(paragraph: str):
+    response = chat_completion(
         model='gpt-4o-mini',
-        messages=[
-            {"role": "system", "content": prompt },
-            {"role": "user", "content": paragraph},
-        ],
+        messages=fix_summary_messages(paragraph),
         temperature=0.7,
+        feature='fix_summary',
     )
     
     title = response.choices[0].message.content
     
 
-    return title
\ No newline at end of file
+    return title
+
+# Same as fix_summary but yields the fixed summary piece by piece as it is generated.
+def stream_fix_summary(paragraph: str):
+    return stream_chat_completion(
+        model='gpt-4o-mini',
+        messages=fix_summary_messages(paragraph),
+        temperature=0.7,
+        feature='fix_summary',
+    )
\ No newline at end of file
@@ -1,3 +1,554 @@
-from django.test import TestCase
+import contextlib
+import io
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+import cv2
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .documents import DocumentError
+from .jobs import (claim_next_job, claim_note_job, complete_job, fail_job, recover_stale_jobs, release_job, renew_lease,
+                   run_job)
+from .models import CacheStats, ChunkSummary, SummaryCacheEntry, SummaryJob, SummaryStatus, UploadPage, UploadSession, UploadStatus, UserNotes
+from .normalize import normalize_pages
+from .text_summarizer import (MERGE_GROUP_SPREAD, chunk_on_content, chunk_on_delimiter, combine_chunks_with_no_minimum,
+                              completion_key, merge_groups, stream_summarize, summarize, summary_messages,
+                              summary_system_message, tokenize, tokenize_on_delimiter)
+from .uploads import claim_next_upload, create_session, parse_content_range, process_upload, write_part
 
-# Create your tests here.
+
+def page(number, body, header="BIO 101 Cell Biology", footer=None):
+    footer = f"Page {number} of 3" if footer is None else footer
+    return f"{header}\n{body}\n{footer}"
+
+
+class NormalizeTests(SimpleTestCase):
+    def test_headers_footers_and_page_numbers_are_removed(self):
+        pages = [page(i, f"Body text of page {i} about the cell membrane and its proteins.") for i in (1, 2, 3)]
+        text, report = normalize_pages(pages)
+        self.assertNotIn("BIO 101", text)
+        self.assertNotIn("Page", text)
+        self.assertEqual(report.boilerplate_lines, 6)
+        for i in (1, 2, 3):
+            self.assertIn(f"Body text of page {i}", text)
+
+    def test_numbered_captions_are_kept(self):
+        pages = [f"Figure {i}\nA diagram of the structures discussed on page {i} of the handout.\nFigure {i}: legend"
+                 for i in (1, 2, 3)]
+        text, report = normalize_pages(pages)
+        self.assertEqual(report.boilerplate_lines, 0)
+        for i in (1, 2, 3):
+            self.assertIn(f"Figure {i}\n", text)
+            self.assertIn(f"Figure {i}: legend", text)
+
+    def test_numbered_headings_are_kept(self):
+        pages = [page(i, f"Question {i}\nExplain what happens in step {i} of cellular respiration.\nExample {i}",
+                      footer=f"- {i} -") for i in (1, 2, 3)]
+        text, report = normalize_pages(pages)
+        for i in (1, 2, 3):
+            self.assertIn(f"Question {i}", text)
+            self.assertIn(f"Example {i}", text)
+            self.assertNotIn(f"- {i} -", text)
+        self.assertEqual(report.boilerplate_lines, 6)
+
+    def test_watermark_is_removed_anywhere(self):
+        pages = [f"Heading {i}\nFirst line of page {i}.\nSecond line of page {i}.\nDRAFT\nThird line of page {i}.\n"
+                 f"Fourth line of page {i}.\nEnd {i}" for i in (1, 2, 3, 4, 5)]
+        text, report = normalize_pages(pages)
+        self.assertNotIn("DRAFT", text)
+        self.assertEqual(report.boilerplate_lines, 5)
+
+
+def paragraphs(count, seed=1, longest=60):
+    words = "the cell membrane protein water energy transport of and a in diffusion osmosis gradient".split()
+    generator = random.Random(seed)
+    return [" ".join(generator.choice(words) for _ in range(generator.randint(5, longest))) + "." for _ in range(count)]
+
+
+class ChunkerTests(SimpleTestCase):
+    text = "\n\n".join(paragraphs(60))
+
+    def chunk(self, chunker, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return chunker(*args)
+
+    def test_empty_delimiter_is_refused(self):
+        with self.assertRaises(ValueError):
+            tokenize_on_delimiter("some text", "")
+
+    def test_chunks_fit_max_tokens(self):
+        for max_tokens in (50, 120, 300):
+            with self.subTest(max_tokens=max_tokens):
+                chunks = self.chunk(chunk_on_delimiter, self.text, max_tokens, "\n\n")
+                self.assertLessEqual(max(len(tokenize(chunk)) for chunk in chunks), max_tokens)
+                chunks = self.chunk(chunk_on_content, self.text, max_tokens // 2, max_tokens, "\n\n")
+                self.assertLessEqual(max(len(tokenize(chunk)) for chunk in chunks), max_tokens)
+
+    def test_chunks_keep_the_whole_text(self):
+        longest = max(len(tokenize(paragraph)) for paragraph in self.text.split("\n\n")) + 2
+        for chunks in (self.chunk(chunk_on_delimiter, self.text, longest, "\n\n"),
+                       self.chunk(chunk_on_content, self.text, longest, longest, "\n\n")):
+            self.assertEqual("".join(chunks), self.text + "\n\n")
+
+    def test_oversize_segments_are_dropped_as_before(self):
+        text = "\n\n".join(["Short one.", " ".join(paragraphs(10)), "Short two.", "Short three."])
+        chunks = self.chunk(chunk_on_delimiter, text, 40, "\n\n")
+        baseline, _, dropped = self.chunk(combine_chunks_with_no_minimum, text.split("\n\n"), 40, "\n\n", None, True)
+        self.assertEqual(chunks, [chunk + "\n\n" for chunk in baseline])
+        self.assertEqual((dropped, "".join(chunks)), (1, "Short one.\n\n...\n\nShort two.\n\nShort three.\n\n"))
+        chunks = self.chunk(chunk_on_content, text, 40, 40, "\n\n")
+        self.assertEqual("".join(chunks), "Short one.\n\n...\n\nShort two.\n\nShort three.\n\n")
+
+    def test_content_defined_chunks_survive_an_edit(self):
+        parts = paragraphs(80, seed=2, longest=30)
+        before = chunk_on_content("\n\n".join(parts), 150, 300, "\n\n")
+        parts[40] = "An edited paragraph about the cell."
+        after = chunk_on_content("\n\n".join(parts), 150, 300, "\n\n")
+        self.assertLessEqual(len(set(after) - set(before)), 2)
+        self.assertGreater(len(before), 5)
+
+
+class RecursiveSummaryTests(SimpleTestCase):
+    chunks = [f"Part {i} of the lecture on the water cycle." for i in range(12)]
+
+    def test_every_chunk_gets_all_earlier_summaries(self):
+        prompts = []
+
+        def get_chat_completion(messages, model, feature='summarize'):
+            prompts.append(messages[-1]['content'])
+            return f"Summary {len(prompts) - 1}."
+
+        with mock.patch('summarizer_api.text_summarizer.split_for_detail', return_value=self.chunks), \
+                mock.patch('summarizer_api.text_summarizer.get_chat_completion', side_effect=get_chat_completion), \
+                mock.patch('summarizer_api.text_summarizer.fix_summary', side_effect=lambda summary: summary):
+            summary = summarize("...", summarize_recursively=True, max_workers=8)
+        self.assertEqual(len(prompts), len(self.chunks))
+        for i, prompt in enumerate(prompts):
+            self.assertTrue(prompt.endswith(self.chunks[i]))
+            self.assertEqual([j for j in range(len(prompts)) if f"Summary {j}." in prompt], list(range(i)))
+        self.assertEqual(summary, "\n\n".join(f"Summary {i}." for i in range(len(self.chunks))))
+
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get_many(self, keys):
+        return {key: self.entries[key] for key in keys if key in self.entries}
+
+    def set_many(self, completions):
+        self.entries.update(completions)
+
+
+class StreamSummaryTests(SimpleTestCase):
+    chunks = RecursiveSummaryTests.chunks[:4]
+
+    def stream(self, **kwargs):
+        prompts = []
+
+        def stream_chat_completion(messages, model):
+            prompts.append(messages[-1]['content'])
+            chunk = self.chunks.index(messages[-1]['content'].rsplit("\n\n", 1)[-1])
+            return iter([f"Summary ", f"{chunk}."])
+
+        with mock.patch('summarizer_api.text_summarizer.split_for_detail', return_value=self.chunks) as split, \
+                mock.patch('summarizer_api.text_summarizer.stream_chat_completion', side_effect=stream_chat_completion), \
+                mock.patch('summarizer_api.text_summarizer.stream_fix_summary', return_value=iter(["Fixed."])) as fix, \
+                mock.patch('summarizer_api.text_summarizer.reduce_summaries', return_value="Merged.") as reduce:
+            events = list(stream_summarize("...", **kwargs))
+        self.assertEqual(split.call_args.kwargs['content_defined'], kwargs.get('chunk_cache') is not None)
+        return events, prompts, fix, reduce
+
+    def test_recursive_stream_gives_every_chunk_the_earlier_summaries(self):
+        events, prompts, fix, reduce = self.stream(summarize_recursively=True)
+        for i, prompt in enumerate(prompts):
+            self.assertEqual([j for j in range(len(prompts)) if f"Summary {j}." in prompt], list(range(i)))
+        self.assertEqual([data['index'] for event, data in events if event == 'chunk_done'], [0, 1, 2, 3])
+        fix.assert_called_once_with("\n\n".join(f"Summary {i}." for i in range(4)))
+        reduce.assert_not_called()
+        self.assertEqual(events[-1], ('summary', {'html': "Fixed."}))
+
+    def test_map_reduce_stream_merges_the_chunk_summaries(self):
+        events, prompts, fix, reduce = self.stream(summarize_recursively=True, map_reduce=True)
+        self.assertEqual(sorted(prompts), sorted(self.chunks))
+        self.assertEqual(reduce.call_args.args[0], [f"Summary {i}." for i in range(4)])
+        fix.assert_not_called()
+        self.assertEqual(events[-1], ('summary', {'html': "Merged."}))
+
+    def test_cached_chunk_summaries_are_reused(self):
+        cache = DictCache()
+        key = completion_key(summary_messages(summary_system_message(), self.chunks[1]), 'gpt-4-turbo')
+        cache.set_many({key: "Summary 1, from the cache."})
+        events, prompts, fix, reduce = self.stream(map_reduce=True, chunk_cache=cache)
+        self.assertEqual(sorted(prompts), sorted(self.chunks[:1] + self.chunks[2:]))
+        self.assertIn(('chunk', {'index': 1, 'delta': "Summary 1, from the cache."}), events)
+        self.assertEqual(reduce.call_args.args[0], ["Summary 0.", "Summary 1, from the cache.", "Summary 2.", "Summary 3."])
+        self.assertIs(reduce.call_args.kwargs['chunk_cache'], cache)
+        self.assertEqual(len(cache.entries), 4)
+
+
+class MergeGroupTests(SimpleTestCase):
+    summaries = [f"Summary of part {i} of the lecture." for i in range(40)]
+
+    def test_groups_keep_order_and_size(self):
+        groups = merge_groups(self.summaries, 4)
+        self.assertEqual([summary for group in groups for summary in group], self.summaries)
+        self.assertTrue(all(2 <= len(group) <= MERGE_GROUP_SPREAD * 4 for group in groups[:-1]))
+
+    def test_an_added_summary_only_changes_the_groups_around_it(self):
+        before = merge_groups(self.summaries, 4)
+        for position in range(0, 41, 5):
+            with self.subTest(position=position):
+                after = merge_groups(self.summaries[:position] + ["An added part."] + self.summaries[position:], 4)
+                self.assertLessEqual(len([group for group in after if group not in before]), 3)
+
+
+# A small PDF with one line of text per page, enough to be read from the text layer.
+def make_pdf(texts):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(texts)} >>"
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir)
+        settings = override_settings(UPLOAD_DIR=self.upload_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(
+            firstname="Test", lastname="User", email="uploads@example.com", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, data, filename="notes.pdf", content_type="application/pdf"):
+        response = self.client.post('/summarizer_api/v1/usernotes/uploads/',
+                                    {'filename': filename, 'content_type': content_type, 'size': len(data)},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        return UploadSession.objects.get(pk=response.data['id'])
+
+    def put(self, session, data, start, end):
+        return self.client.put(f'/summarizer_api/v1/usernotes/uploads/{session.pk}/', data[start:end],
+                               content_type='application/octet-stream',
+                               HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(data)}')
+
+    def test_parse_content_range(self):
+        self.assertEqual(parse_content_range('bytes 0-99/1000'), (0, 100, 1000))
+        self.assertEqual(parse_content_range(' bytes 900-999/1000 '), (900, 1000, 1000))
+        for header in ('', 'bytes', 'bytes 0-99', 'items 0-99/1000', 'bytes 99-0/1000', 'bytes a-b/c', 'bytes -1-5/9'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_content_range(header))
+
+    def test_parts_out_of_order_are_refused_with_the_resume_offset(self):
+        data = bytes(range(256)) * 4
+        session = self.start(data)
+        self.assertEqual(self.put(session, data, 0, 100).status_code, 200)
+        for start, end in ((200, 300), (0, 100), (50, 150)):
+            with self.subTest(start=start):
+                response = self.put(session, data, start, end)
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(response.data['received_bytes'], 100)
+
+    def test_a_conflicting_write_at_the_same_offset_loses(self):
+        data = b"x" * 1000
+        session = self.start(data)
+        first, second = UploadSession.objects.get(pk=session.pk), UploadSession.objects.get(pk=session.pk)
+        self.assertTrue(write_part(first, io.BytesIO(data[:100]), 0, 100))
+        self.assertFalse(write_part(second, io.BytesIO(data[:100]), 0, 100))
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).received_bytes, 100)
+
+    def test_a_part_being_written_keeps_other_writers_out_of_the_file(self):
+        data = b"x" * 1000
+        session = self.start(data)
+        UploadSession.objects.filter(pk=session.pk).update(writing_from=0, writing_at=timezone.now())
+        self.assertFalse(write_part(session, io.BytesIO(b"y" * 100), 0, 100))
+        self.assertFalse(write_part(session, io.BytesIO(b"y" * 100), 900, 1000))
+        with open(session.path, 'rb') as file:
+            self.assertEqual(file.read(), b"")
+        # a claim left by a request that died is taken over once its lease has run out
+        UploadSession.objects.filter(pk=session.pk).update(writing_at=timezone.now() - timedelta(hours=1))
+        self.assertTrue(write_part(session, io.BytesIO(data[:100]), 0, 100))
+        session.refresh_from_db()
+        self.assertEqual((session.received_bytes, session.writing_from, session.writing_at), (100, None, None))
+
+    def test_a_short_part_gives_up_its_claim(self):
+        data = b"x" * 1000
+        session = self.start(data)
+        with self.assertRaises(DocumentError):
+            write_part(session, io.BytesIO(data[:50]), 0, 100)
+        session.refresh_from_db()
+        self.assertEqual((session.received_bytes, session.writing_from), (0, None))
+        self.assertTrue(write_part(session, io.BytesIO(data[:100]), 0, 100))
+
+    def test_last_part_may_come_first(self):
+        data = bytes(range(256)) * 4
+        session = self.start(data)
+        self.assertEqual(self.put(session, data, 900, 1024).status_code, 200)
+        self.assertEqual(self.put(session, data, 900, 1024).status_code, 409)
+        self.assertEqual(self.put(session, data, 0, 500).status_code, 200)
+        # this part runs into the tail that is already there, which completes the file
+        response = self.put(session, data, 500, 950)
+        self.assertEqual(response.status_code, 202)
+        session.refresh_from_db()
+        self.assertEqual((session.received_bytes, session.tail_start, session.status), (1024, 900, UploadStatus.PROCESSING))
+        with open(session.path, 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_worker_waits_for_more_of_the_pdf(self):
+        data = make_pdf([f"Page {i} of the handout explains the structure of the cell membrane." for i in (1, 2, 3)])
+        session = self.start(data)
+        self.put(session, data, 0, len(data) // 2)
+        self.assertEqual(process_upload(claim_next_upload('test')), 0)
+        session.refresh_from_db()
+        self.assertEqual((session.checked_bytes, session.locked_by), (len(data) // 2, ""))
+        self.assertIsNone(claim_next_upload('test'))
+
+    def test_worker_resumes_after_the_pages_it_stored(self):
+        data = make_pdf([f"Page {i} of the handout explains the structure of the cell membrane." for i in range(1, 6)])
+        session = self.start(data)
+        self.put(session, data, 0, len(data))
+        for page, text in ((1, "Stored text of the first page."), (2, "Stored text of the second page."),
+                           (3, "left behind by a worker that died")):
+            UploadPage.objects.create(session=session, page=page, text=text, path='text', ms=1)
+        UploadSession.objects.filter(pk=session.pk).update(pages_done=2)
+
+        self.assertEqual(process_upload(claim_next_upload('test')), 3)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.pages_done, session.page_count), (UploadStatus.DONE, 5, 5))
+        contents = session.note.notecontents
+        self.assertIn("Stored text of the second page.", contents)
+        self.assertIn("Page 5 of the handout", contents)
+        self.assertNotIn("Page 2 of the handout", contents)
+        self.assertNotIn("left behind", contents)
+
+    def test_image_sessions_are_limited_in_size(self):
+        with override_settings(UPLOAD_IMAGE_MAX_BYTES=1000):
+            with self.assertRaises(DocumentError):
+                create_session(self.user, "scan.png", "image/png", 1001)
+            create_session(self.user, "scan.pdf", "application/pdf", 1001)
+
+    def test_image_session_is_read_once_complete(self):
+        data = cv2.imencode('.png', np.full((40, 120), 255, np.uint8))[1].tobytes()
+        session = self.start(data, "scan.png", "image/png")
+        result = SimpleNamespace(text="The text recognised on the scanned page.", cached=False)
+        with mock.patch('summarizer_api.uploads.ocr_image', return_value=result) as ocr:
+            self.put(session, data, 0, 10)
+            self.assertEqual(process_upload(claim_next_upload('test')), 0)
+            self.put(session, data, 10, len(data))
+            self.assertEqual(process_upload(claim_next_upload('test')), 1)
+        self.assertEqual(ocr.call_count, 1)
+        session.refresh_from_db()
+        self.assertEqual(session.note.notecontents, result.text)
+
+
+class SummaryStreamClaimTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            firstname="Test", lastname="User", email="claims@example.com", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.note = UserNotes(user=self.user, notecontents="Notes on the water cycle.")
+        self.note.save()
+        self.job = self.note.summary_jobs.get()
+
+    def stream(self):
+        return self.client.get(f'/summarizer_api/v1/usernotes/{self.note.pk}/stream/')
+
+    def test_job_backing_off_is_not_claimed(self):
+        SummaryJob.objects.filter(pk=self.job.pk).update(run_after=timezone.now() + timedelta(seconds=60))
+        self.assertIsNone(claim_note_job(self.note, "stream"))
+        response = self.stream()
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(50 <= int(response['Retry-After']) <= 60)
+
+    def test_job_deferred_to_a_batch_is_not_claimed(self):
+        SummaryJob.objects.filter(pk=self.job.pk).update(locked_by="batch:1", run_after=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(claim_note_job(self.note, "stream"))
+        self.assertEqual(self.stream().status_code, 409)
+        self.assertEqual(SummaryJob.objects.get(pk=self.job.pk).status, SummaryStatus.PENDING)
+
+    def test_runnable_job_is_claimed(self):
+        job = claim_note_job(self.note, "stream")
+        self.assertEqual((job.pk, job.status, job.locked_by, job.attempts), (self.job.pk, SummaryStatus.RUNNING, "stream", 1))
+
+
+class SummaryJobTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            firstname="Test", lastname="User", email="jobs@example.com", password="password")
+
+    def add_note(self, contents="Notes on the water cycle."):
+        note = UserNotes(user=self.user, notecontents=contents)
+        note.save()
+        return note
+
+    def test_new_note_is_queued(self):
+        note = self.add_note()
+        self.assertEqual(note.status, SummaryStatus.PENDING)
+        self.assertEqual(list(note.summary_jobs.values_list('status', flat=True)), [SummaryStatus.PENDING])
+
+    def test_new_note_with_a_cached_summary_is_done(self):
+        note = self.add_note()
+        SummaryCacheEntry.objects.store(note.summary_cache_key(), "<p>Water evaporates.</p>", "Water cycle")
+        copy = self.add_note()
+        self.assertEqual((copy.status, copy.notesummary, copy.notetitle),
+                         (SummaryStatus.DONE, "<p>Water evaporates.</p>", "Water cycle"))
+        self.assertFalse(copy.summary_jobs.exists())
+
+    def test_a_job_is_claimed_once(self):
+        note = self.add_note()
+        job = claim_next_job("worker-1")
+        self.assertEqual((job.note_id, job.status, job.locked_by, job.attempts), (note.pk, SummaryStatus.RUNNING, "worker-1", 1))
+        self.assertIsNone(claim_next_job("worker-2"))
+
+    def test_run_job_saves_the_summary(self):
+        note = self.add_note()
+        job = claim_next_job("worker")
+        with mock.patch('summarizer_api.jobs.summarize_note', return_value=("<p>Summary</p>", "Title")):
+            self.assertTrue(run_job(job))
+        note.refresh_from_db()
+        self.assertEqual((note.status, note.notesummary, note.notetitle), (SummaryStatus.DONE, "<p>Summary</p>", "Title"))
+        self.assertEqual(SummaryJob.objects.get(pk=job.pk).status, SummaryStatus.DONE)
+        self.assertIsNotNone(SummaryCacheEntry.objects.lookup(note.summary_cache_key()))
+
+    def test_failed_job_backs_off_then_fails(self):
+        note = self.add_note()
+        with override_settings(SUMMARY_JOB_MAX_ATTEMPTS=2), \
+                mock.patch('summarizer_api.jobs.summarize_note', side_effect=RuntimeError("rate limited")):
+            self.assertFalse(run_job(claim_next_job("worker")))
+            job = SummaryJob.objects.get(note=note)
+            self.assertEqual((job.status, job.locked_by, job.attempts), (SummaryStatus.PENDING, "", 1))
+            self.assertIn("rate limited", job.last_error)
+            self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 30, delta=5)
+            self.assertIsNone(claim_next_job("worker"))
+
+            SummaryJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.assertFalse(run_job(claim_next_job("worker")))
+        note.refresh_from_db()
+        self.assertEqual((SummaryJob.objects.get(pk=job.pk).status, note.status), (SummaryStatus.FAILED, SummaryStatus.FAILED))
+
+    def test_released_job_keeps_its_attempts(self):
+        note = self.add_note()
+        job = claim_next_job("worker")
+        release_job(job)
+        job.refresh_from_db()
+        note.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts, note.status), (SummaryStatus.PENDING, "", 0, SummaryStatus.PENDING))
+
+    def test_stale_jobs_are_requeued_or_failed(self):
+        for i in range(3):
+            self.add_note(f"Note {i}.")
+        stale, exhausted, fresh = (claim_next_job(f"worker-{i}") for i in range(3))
+        expired = timezone.now() - timedelta(seconds=settings.SUMMARY_JOB_LEASE_SECONDS + 1)
+        SummaryJob.objects.filter(pk__in=[stale.pk, exhausted.pk]).update(locked_at=expired)
+        SummaryJob.objects.filter(pk=exhausted.pk).update(attempts=settings.SUMMARY_JOB_MAX_ATTEMPTS)
+
+        self.assertEqual(recover_stale_jobs(), 1)
+        statuses = dict(SummaryJob.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[job.pk] for job in (stale, exhausted, fresh)],
+                         [SummaryStatus.PENDING, SummaryStatus.FAILED, SummaryStatus.RUNNING])
+        self.assertEqual(UserNotes.objects.get(pk=exhausted.note_id).status, SummaryStatus.FAILED)
+
+    def test_a_worker_that_lost_its_lease_cannot_save(self):
+        note = self.add_note()
+        job = claim_next_job("worker-1")
+        self.assertTrue(renew_lease(job))
+        SummaryJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(days=1))
+        recover_stale_jobs()
+        second = claim_next_job("worker-2")
+
+        self.assertFalse(renew_lease(job))
+        self.assertFalse(complete_job(job, "<p>Late</p>", "Late"))
+        fail_job(job, "late failure")
+        release_job(job)
+        second.refresh_from_db()
+        note.refresh_from_db()
+        self.assertEqual((second.status, second.locked_by, note.notesummary), (SummaryStatus.RUNNING, "worker-2", None))
+
+
+class SummaryCacheTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            firstname="Test", lastname="User", email="cache@example.com", password="password")
+
+    def age(self, manager, key, **fields):
+        manager.filter(key=key).update(**{name: timezone.now() - delta for name, delta in fields.items()})
+
+    def stats(self, name):
+        stats = CacheStats.objects.filter(name=name).first()
+        return (stats.hits, stats.misses) if stats else (0, 0)
+
+    @override_settings(SUMMARY_CACHE_MAX_ENTRIES=3)
+    def test_least_recently_used_summaries_are_evicted(self):
+        for i, key in enumerate("abc"):
+            SummaryCacheEntry.objects.store(key, f"Summary {key}", "Title")
+            self.age(SummaryCacheEntry.objects, key, last_used_at=timedelta(minutes=10 - i))
+        self.assertIsNotNone(SummaryCacheEntry.objects.lookup("a"))
+        SummaryCacheEntry.objects.store("d", "Summary d", "Title")
+        self.assertEqual(sorted(SummaryCacheEntry.objects.values_list('key', flat=True)), ["a", "c", "d"])
+
+    def test_expired_summaries_miss_and_are_evicted(self):
+        SummaryCacheEntry.objects.store("old", "Old summary", "Title")
+        self.age(SummaryCacheEntry.objects, "old", created_at=timedelta(days=settings.SUMMARY_CACHE_TTL_DAYS, seconds=1))
+        self.assertIsNone(SummaryCacheEntry.objects.lookup("old"))
+        SummaryCacheEntry.objects.store("new", "New summary", "Title")
+        self.assertEqual(list(SummaryCacheEntry.objects.values_list('key', flat=True)), ["new"])
+
+    def test_hits_and_misses_are_counted(self):
+        SummaryCacheEntry.objects.store("a", "Summary", "Title")
+        SummaryCacheEntry.objects.lookup("a")
+        SummaryCacheEntry.objects.lookup("a")
+        SummaryCacheEntry.objects.lookup("b")
+        self.assertEqual(self.stats('summary'), (2, 1))
+        self.assertEqual(SummaryCacheEntry.objects.get(key="a").hit_count, 2)
+
+    def test_new_prompt_version_misses(self):
+        note = UserNotes(user=self.user, notecontents="Notes on the water cycle.")
+        note.save()
+        key = note.summary_cache_key()
+        SummaryCacheEntry.objects.store(key, "Summary", "Title")
+        with mock.patch('summarizer_api.models.SUMMARY_PROMPT_VERSION', 2):
+            copy = UserNotes(user=self.user, notecontents="Notes on the water cycle.")
+            copy.save()
+            self.assertNotEqual(copy.summary_cache_key(), key)
+        self.assertEqual((copy.status, copy.notesummary), (SummaryStatus.PENDING, None))
+
+    @override_settings(SUMMARY_CHUNK_CACHE_MAX_ENTRIES=3)
+    def test_chunk_summaries_are_evicted_and_counted(self):
+        ChunkSummary.objects.set_many({key: f"Summary {key}" for key in "abc"})
+        for i, key in enumerate("abc"):
+            self.age(ChunkSummary.objects, key, last_used_at=timedelta(minutes=10 - i))
+        self.assertEqual(ChunkSummary.objects.get_many(["a", "x"]), {"a": "Summary a"})
+        ChunkSummary.objects.set_many({"d": "Summary d"})
+        self.assertEqual(sorted(ChunkSummary.objects.values_list('key', flat=True)), ["a", "c", "d"])
+        self.assertEqual(self.stats('chunk_summary'), (1, 1))
+
+    def test_expired_chunk_summaries_miss(self):
+        ChunkSummary.objects.set_many({"old": "Old summary"})
+        self.age(ChunkSummary.objects, "old", created_at=timedelta(days=settings.SUMMARY_CACHE_TTL_DAYS, seconds=1))
+        self.assertEqual(ChunkSummary.objects.get_many(["old"]), {})
@@ -1,42 +1,196 @@
+import contextvars
+import hashlib
+import json
 import os
-from typing import List, Tuple, Optional
-from openai import OpenAI
+import queue
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple, Optional
 import tiktoken
 from tqdm import tqdm
-from dotenv import load_dotenv
-from .summarizer_fixer import fix_summary
+from llm_api import client
+from ocr_api.layout import PARAGRAPH_DELIMITER
+from .summarizer_fixer import fix_summary, stream_fix_summary
 
-load_dotenv()
+# Number of chunk summaries that may be in flight at once. Failed calls are retried by the shared LLM client.
+SUMMARIZER_MAX_WORKERS = int(os.environ.get('SUMMARIZER_MAX_WORKERS', 8))
+# Number of streamed deltas that may be buffered between the chunk threads and a slow stream consumer.
+SUMMARIZER_STREAM_BUFFER = int(os.environ.get('SUMMARIZER_STREAM_BUFFER', 256))
+# Map-reduce mode: how many summaries are merged per call, and the hard limit on prompt tokens for any single call.
+SUMMARIZER_FAN_IN = int(os.environ.get('SUMMARIZER_FAN_IN', 4))
+SUMMARIZER_CONTEXT_BUDGET = int(os.environ.get('SUMMARIZER_CONTEXT_BUDGET', 8000))
 
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-
-def get_chat_completion(messages, model='gpt-3.5-turbo-1106'):
-    response = client.chat.completions.create(
+def get_chat_completion(messages, model='gpt-3.5-turbo-1106', feature='summarize'):
+    response = client.chat_completion(
         model=model,
         messages=messages,
         temperature=0,
+        feature=feature,
     )
     return response.choices[0].message.content
 
+def stream_chat_completion(messages, model='gpt-3.5-turbo-1106'):
+    return client.stream_chat_completion(
+        model=model,
+        messages=messages,
+        temperature=0,
+        feature='summarize',
+    )
+
+# Loading the encoding is expensive, so it is built once per model and reused.
+@lru_cache(maxsize=None)
+def get_encoding(model: str = 'gpt-3.5-turbo-1106'):
+    return tiktoken.encoding_for_model(model)
+
 def tokenize(text: str) -> List[str]:
-    encoding = tiktoken.encoding_for_model('gpt-3.5-turbo-1106')
-    return encoding.encode(text)
+    return get_encoding().encode(text)
+
+
+# A document split on a delimiter, with the character span and token count of every segment.
+class TokenizedText(NamedTuple):
+    text: str
+    delimiter: str
+    spans: List[Tuple[int, int]]
+    token_counts: List[int]
+    total_tokens: int
+
+
+# This function splits the document on the delimiter and encodes every segment exactly once (in one parallel batch),
+# so chunk sizes can be worked out afterwards with plain arithmetic instead of re-tokenizing joined strings.
+# Each segment's count includes its trailing delimiter, which keeps the sum equal to the token count of any run of segments.
+def tokenize_on_delimiter(text: str, delimiter: str) -> TokenizedText:
+    if not delimiter:
+        # str.split("") raises too; finding "" would never move past the start
+        raise ValueError("empty delimiter")
+    spans = []
+    start = 0
+    while True:
+        end = text.find(delimiter, start)
+        if end == -1:
+            spans.append((start, len(text)))
+            break
+        spans.append((start, end))
+        start = end + len(delimiter)
+
+    segments = [text[start:end + len(delimiter)] for start, end in spans]
+    token_counts = [len(tokens) for tokens in get_encoding().encode_ordinary_batch(segments)]
+    return TokenizedText(text, delimiter, spans, token_counts, sum(token_counts))
+
+
+# Tokens taken by the "..." that stands in for a dropped segment, with the delimiter after it.
+def ellipsis_tokens(delimiter: str) -> int:
+    return len(get_encoding().encode_ordinary("..." + delimiter))
 
 
 # This function chunks a text into smaller pieces based on a maximum token count and a delimiter.
 def chunk_on_delimiter(input_string: str,
-                       max_tokens: int, delimiter: str) -> List[str]:
-    chunks = input_string.split(delimiter)
-    combined_chunks, _, dropped_chunk_count = combine_chunks_with_no_minimum(
-        chunks, max_tokens, chunk_delimiter=delimiter, add_ellipsis_for_overflow=True
-    )
+                       max_tokens: int, delimiter: str,
+                       tokenized: Optional[TokenizedText] = None) -> List[str]:
+    if tokenized is None:
+        tokenized = tokenize_on_delimiter(input_string, delimiter)
+    combined_chunks, dropped_chunk_count = combine_segments(tokenized, max_tokens, add_ellipsis_for_overflow=True)
     if dropped_chunk_count > 0:
         print(f"warning: {dropped_chunk_count} chunks were dropped due to overflow")
     combined_chunks = [f"{chunk}{delimiter}" for chunk in combined_chunks]
     return combined_chunks
 
 
+# This function chunks a text like chunk_on_delimiter, but picks chunk boundaries from the contents of the segments
+# rather than from how much text came before them. Once a chunk holds min_tokens, a segment ends it when a hash of its
+# text falls under a threshold proportional to its token count, which gives chunks of about target_tokens on average;
+# a chunk is also cut early when the next segment would not fit in max_tokens. Editing a paragraph therefore only
+# moves the boundaries next to it and every other chunk comes out exactly as before, so its summary can be reused.
+def chunk_on_content(input_string: str,
+                     target_tokens: int, max_tokens: int, delimiter: str,
+                     tokenized: Optional[TokenizedText] = None) -> List[str]:
+    if tokenized is None:
+        tokenized = tokenize_on_delimiter(input_string, delimiter)
+    text = tokenized.text
+    min_tokens = target_tokens // 2
+    cut_rate = 1 / max(1, target_tokens - min_tokens)
+    overflow_tokens = ellipsis_tokens(delimiter)
+    dropped_chunk_count = 0
+    output = []
+    pieces = []
+    candidate_tokens = 0
+
+    for (start, end), token_count in zip(tokenized.spans, tokenized.token_counts):
+        if token_count > max_tokens:
+            print(f"warning: chunk overflow")
+            if candidate_tokens + overflow_tokens <= max_tokens:
+                pieces.append("...")
+                candidate_tokens += overflow_tokens
+                dropped_chunk_count += 1
+            continue
+        if candidate_tokens + token_count > max_tokens and pieces:
+            output.append(delimiter.join(pieces))
+            pieces = []
+            candidate_tokens = 0
+        segment = text[start:end]
+        pieces.append(segment)
+        candidate_tokens += token_count
+        if candidate_tokens >= min_tokens and zlib.crc32(segment.encode('utf-8')) / 2 ** 32 < token_count * cut_rate:
+            output.append(delimiter.join(pieces))
+            pieces = []
+            candidate_tokens = 0
+    if pieces:
+        output.append(delimiter.join(pieces))
+    if dropped_chunk_count > 0:
+        print(f"warning: {dropped_chunk_count} chunks were dropped due to overflow")
+    return [f"{chunk}{delimiter}" for chunk in output]
+
+
+# This function greedily packs consecutive segments into chunks of at most max_tokens using the precomputed
+# segment token counts. Runs of consecutive segments are sliced straight out of the original text.
+# It returns the combined text blocks and the count of segments dropped due to overflow.
+def combine_segments(
+        tokenized: TokenizedText,
+        max_tokens: int,
+        add_ellipsis_for_overflow=False,
+) -> Tuple[List[str], int]:
+    text, delimiter = tokenized.text, tokenized.delimiter
+    overflow_tokens = ellipsis_tokens(delimiter)
+    dropped_chunk_count = 0
+    output = []
+    pieces = []  # text of the current chunk, a dropped segment splits it into separate pieces
+    run_start = run_end = None  # span of the contiguous run of segments at the end of the current chunk
+    candidate_tokens = 0
+
+    def close_run():
+        nonlocal run_start, run_end
+        if run_start is not None:
+            pieces.append(text[run_start:run_end])
+            run_start = run_end = None
+
+    for (start, end), token_count in zip(tokenized.spans, tokenized.token_counts):
+        if token_count > max_tokens:
+            print(f"warning: chunk overflow")
+            if add_ellipsis_for_overflow and candidate_tokens + overflow_tokens <= max_tokens:
+                close_run()
+                pieces.append("...")
+                candidate_tokens += overflow_tokens
+                dropped_chunk_count += 1
+            continue
+        # If adding this segment exceeds max_tokens, emit the current candidate and start a new one
+        if candidate_tokens + token_count > max_tokens and (pieces or run_start is not None):
+            close_run()
+            output.append(delimiter.join(pieces))
+            pieces = []
+            candidate_tokens = 0
+        if run_start is None:
+            run_start = start
+        run_end = end
+        candidate_tokens += token_count
+    close_run()
+    if pieces:
+        output.append(delimiter.join(pieces))
+    return output, dropped_chunk_count
+
+
 # This function combines text chunks into larger blocks without exceeding a specified token count. It returns the combined text blocks, their original indices, and the count of chunks dropped due to overflow.
+# It re-tokenizes the growing candidate for every chunk; chunk_on_delimiter uses combine_segments instead and this is kept as the baseline for the benchmark_chunker command.
 def combine_chunks_with_no_minimum(
         chunks: List[str],
         max_tokens: int,
@@ -80,14 +234,121 @@ def combine_chunks_with_no_minimum(
         output_indices.append(candidate_indices)
     return output, output_indices, dropped_chunk_count
 
+SENTENCE_DELIMITER = "."
+
+
+# Paragraph breaks make better chunk boundaries than sentence ends (OCRed pages are assembled into paragraphs, see
+# ocr_api/layout.py), but segments longer than a chunk are dropped, so they are only used when every paragraph
+# fits in max_tokens. Returns the text tokenized on the chosen delimiter.
+def pick_delimiter(text: str, max_tokens: int) -> TokenizedText:
+    if PARAGRAPH_DELIMITER in text:
+        tokenized = tokenize_on_delimiter(text, PARAGRAPH_DELIMITER)
+        if max(tokenized.token_counts) <= max_tokens:
+            return tokenized
+    return tokenize_on_delimiter(text, SENTENCE_DELIMITER)
+
+
+# This function picks the chunk size for the requested level of detail and splits the text accordingly.
+# Without a chunk_delimiter one is picked with pick_delimiter(). With content_defined the chunks come from chunk_on_content() so that they survive edits; the chunk size is rounded
+# down to a multiple of 100 tokens so a small change in the document's length doesn't change it.
+def split_for_detail(text: str, detail: float, minimum_chunk_size: int, chunk_delimiter: Optional[str] = None,
+                     verbose=False, max_chunk_size: Optional[int] = None, content_defined=False) -> List[str]:
+    # check detail is set correctly
+    assert 0 <= detail <= 1
+
+    # the document is encoded once and reused for both chunking passes below
+    if chunk_delimiter is None:
+        tokenized = pick_delimiter(text, minimum_chunk_size)
+        chunk_delimiter = tokenized.delimiter
+    else:
+        tokenized = tokenize_on_delimiter(text, chunk_delimiter)
+
+    # interpolate the number of chunks based to get specified level of detail
+    max_chunks = len(chunk_on_delimiter(text, minimum_chunk_size, chunk_delimiter, tokenized))
+    min_chunks = 1
+    num_chunks = int(min_chunks + detail * (max_chunks - min_chunks))
+
+    # adjust chunk_size based on interpolated number of chunks
+    document_length = tokenized.total_tokens
+    chunk_size = max(minimum_chunk_size, document_length // num_chunks)
+    if max_chunk_size is not None:
+        chunk_size = min(chunk_size, max_chunk_size)
+    if content_defined:
+        chunk_size = max(min(minimum_chunk_size, chunk_size), chunk_size - chunk_size % 100)
+        limit = 2 * chunk_size if max_chunk_size is None else min(2 * chunk_size, max_chunk_size)
+        text_chunks = chunk_on_content(text, chunk_size, limit, chunk_delimiter, tokenized)
+    else:
+        text_chunks = chunk_on_delimiter(text, chunk_size, chunk_delimiter, tokenized)
+    if verbose:
+        print(f"Splitting the text into {len(text_chunks)} chunks to be summarized.")
+        print(f"Chunk lengths are {[len(tokenize(x)) for x in text_chunks]}")
+    return text_chunks
+
+
+# Key under which the completion of these exact messages is kept in a chunk_cache.
+def completion_key(messages, model: str) -> str:
+    return hashlib.sha256(json.dumps([model, messages]).encode('utf-8')).hexdigest()
+
+
+# This function gets the completion of every list of messages on the executor, in order. With a chunk_cache (anything
+# with get_many(keys) -> {key: completion} and set_many({key: completion})), completions seen before are taken from
+# it and only the rest are sent; those are stored in it afterwards.
+def cached_completions(executor, all_messages, model, feature='summarize', chunk_cache=None, on_done=None):
+    keys = [completion_key(messages, model) for messages in all_messages] if chunk_cache is not None else []
+    cached = chunk_cache.get_many(keys) if chunk_cache is not None else {}
+    futures = []
+    for i, messages in enumerate(all_messages):
+        if keys and keys[i] in cached:
+            futures.append(None)
+            if on_done is not None:
+                on_done(None)
+            continue
+        future = executor.submit(contextvars.copy_context().run, get_chat_completion, messages, model, feature)
+        if on_done is not None:
+            future.add_done_callback(on_done)
+        futures.append(future)
+    results = [future.result() if future is not None else cached[keys[i]] for i, future in enumerate(futures)]
+    if chunk_cache is not None:
+        chunk_cache.set_many({keys[i]: results[i] for i, future in enumerate(futures) if future is not None})
+    return results
+
+
+def summary_system_message(additional_instructions: Optional[str] = None) -> str:
+    system_message_content = "Rewrite this text in summarized form."
+    if additional_instructions is not None:
+        system_message_content += f"\n\n{additional_instructions}"
+    return system_message_content
+
+
+def summary_messages(system_message_content: str, chunk: str, previous_summaries=()) -> list:
+    if previous_summaries:
+        # Creating a structured prompt for recursive summarization
+        accumulated_summaries_string = '\n\n'.join(previous_summaries)
+        user_message_content = f"Previous summaries:\n\n{accumulated_summaries_string}\n\nText to summarize next:\n\n{chunk}"
+    else:
+        # Directly passing the chunk for summarization without recursive context
+        user_message_content = chunk
+
+    return [
+        {"role": "system", "content": system_message_content},
+        {"role": "user", "content": user_message_content}
+    ]
+
+
 def summarize(text: str,
               detail: float = 0,
               model: str = 'gpt-4-turbo',
               additional_instructions: Optional[str] = None,
               minimum_chunk_size: Optional[int] = 500,
-              chunk_delimiter: str = ".",
+              chunk_delimiter: Optional[str] = None,
               summarize_recursively=False,
-              verbose=False):
+              verbose=False,
+              max_workers: Optional[int] = None,
+              map_reduce=False,
+              fan_in: Optional[int] = None,
+              context_budget: Optional[int] = None,
+              chunk_cache=None,
+              partial_context=False):
     """
     Summarizes a given text by splitting it into chunks, each of which is summarized individually. 
     The level of detail in the summary can be adjusted, and the process can optionally be made recursive.
@@ -99,9 +360,21 @@ def summarize(text: str,
     - model (str, optional): The model to use for generating summaries. Defaults to 'gpt-3.5-turbo'.
     - additional_instructions (Optional[str], optional): Additional instructions to provide to the model for customizing summaries.
     - minimum_chunk_size (Optional[int], optional): The minimum size for text chunks. Defaults to 500.
-    - chunk_delimiter (str, optional): The delimiter used to split the text into chunks. Defaults to ".".
+    - chunk_delimiter (str, optional): The delimiter used to split the text into chunks. Defaults to paragraph breaks
+      when every paragraph fits in a chunk and "." otherwise, see pick_delimiter().
     - summarize_recursively (bool, optional): If True, summaries are generated recursively, using previous summaries for context.
     - verbose (bool, optional): If True, prints detailed information about the chunking process.
+    - max_workers (Optional[int], optional): How many chunk summaries may run concurrently. Defaults to SUMMARIZER_MAX_WORKERS.
+    - map_reduce (bool, optional): If True, chunks are summarized independently and the summaries are merged level by level
+      with reduce_summaries() instead of being joined and passed through fix_summary. Overrides `summarize_recursively`.
+    - fan_in (Optional[int], optional): How many summaries each merge call combines in map-reduce mode. Defaults to SUMMARIZER_FAN_IN.
+    - context_budget (Optional[int], optional): The most prompt tokens any single call may use in map-reduce mode.
+      Defaults to SUMMARIZER_CONTEXT_BUDGET.
+    - chunk_cache (optional): Store of earlier chunk summaries and merges, see cached_completions(). Without recursion
+      the text is then split with content defined chunks, so after an edit only the changed chunks (and the merges
+      above them) are sent to the model. Ignored when summarizing recursively.
+    - partial_context (bool, optional): If True, recursive summaries run `max_workers` at a time and each chunk only gets
+      the earlier summaries that have finished (see below). Defaults to False, which summarizes recursively one chunk at a time.
 
     Returns:
     - str: The final compiled summary of the text.
@@ -109,48 +382,70 @@ def summarize(text: str,
     The function first determines the number of chunks by interpolating between a minimum and a maximum chunk count based on the `detail` parameter. 
     It then splits the text into chunks and summarizes each chunk. If `summarize_recursively` is True, each summary is based on the previous summaries, 
     adding more context to the summarization process. The function returns a compiled summary of all chunks.
-    """
 
-    # check detail is set correctly
-    assert 0 <= detail <= 1
+    Chunks are summarized on a thread pool of `max_workers` threads and the summaries are kept in chunk order.
+    Without recursion every chunk is independent, so they are all submitted at once. With recursion every chunk is
+    given the summaries of all the chunks before it, so they run one at a time; with `partial_context` up to
+    `max_workers` chunks overlap and each one is only given the earlier summaries that have already finished, which
+    is faster but makes the summary depend on timing.
+    """
 
-    # interpolate the number of chunks based to get specified level of detail
-    max_chunks = len(chunk_on_delimiter(text, minimum_chunk_size, chunk_delimiter))
-    min_chunks = 1
-    num_chunks = int(min_chunks + detail * (max_chunks - min_chunks))
+    system_message_content = summary_system_message(additional_instructions)
+    max_chunk_size = None
+    if map_reduce:
+        summarize_recursively = False
+        context_budget = context_budget or SUMMARIZER_CONTEXT_BUDGET
+        max_chunk_size = context_budget - len(tokenize(system_message_content))
+    if summarize_recursively:
+        chunk_cache = None
+    text_chunks = split_for_detail(text, detail, minimum_chunk_size, chunk_delimiter, verbose, max_chunk_size,
+                                   content_defined=chunk_cache is not None)
 
-    # adjust chunk_size based on interpolated number of chunks
-    document_length = len(tokenize(text))
-    chunk_size = max(minimum_chunk_size, document_length // num_chunks)
-    text_chunks = chunk_on_delimiter(text, chunk_size, chunk_delimiter)
-    if verbose:
-        print(f"Splitting the text into {len(text_chunks)} chunks to be summarized.")
-        print(f"Chunk lengths are {[len(tokenize(x)) for x in text_chunks]}")
+    def build_messages(chunk, previous_summaries):
+        return summary_messages(system_message_content, chunk, previous_summaries if summarize_recursively else ())
 
-    # set system message
-    system_message_content = "Rewrite this text in summarized form."
-    if additional_instructions is not None:
-        system_message_content += f"\n\n{additional_instructions}"
+    if max_workers is None:
+        max_workers = SUMMARIZER_MAX_WORKERS
+    max_workers = max(1, max_workers)
+    if summarize_recursively and not partial_context:
+        max_workers = 1
 
-    accumulated_summaries = []
-    for chunk in tqdm(text_chunks):
-        if summarize_recursively and accumulated_summaries:
-            # Creating a structured prompt for recursive summarization
-            accumulated_summaries_string = '\n\n'.join(accumulated_summaries)
-            user_message_content = f"Previous summaries:\n\n{accumulated_summaries_string}\n\nText to summarize next:\n\n{chunk}"
+    accumulated_summaries = [None] * len(text_chunks)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, tqdm(total=len(text_chunks)) as progress:
+        if not summarize_recursively:
+            # Every chunk is independent, fan them all out at once
+            accumulated_summaries = cached_completions(
+                executor, [build_messages(chunk, []) for chunk in text_chunks], model,
+                chunk_cache=chunk_cache, on_done=lambda _: progress.update(1))
         else:
-            # Directly passing the chunk for summarization without recursive context
-            user_message_content = chunk
+            in_flight = {}
 
-        # Constructing messages based on whether recursive summarization is applied
-        messages = [
-            {"role": "system", "content": system_message_content},
-            {"role": "user", "content": user_message_content}
-        ]
+            def collect(block):
+                done = [j for j, future in in_flight.items() if future.done()]
+                if block and not done:
+                    wait(in_flight.values(), return_when=FIRST_COMPLETED)
+                    done = [j for j, future in in_flight.items() if future.done()]
+                for j in done:
+                    accumulated_summaries[j] = in_flight.pop(j).result()
+                    progress.update(1)
 
-        # Assuming this function gets the completion and works as expected
-        response = get_chat_completion(messages, model=model)
-        accumulated_summaries.append(response)
+            finished_prefix = 0
+            for i, chunk in enumerate(text_chunks):
+                # Keep at most max_workers chunks in flight and pick up anything that has already finished
+                collect(block=False)
+                while len(in_flight) >= max_workers:
+                    collect(block=True)
+                while finished_prefix < i and accumulated_summaries[finished_prefix] is not None:
+                    finished_prefix += 1
+                messages = build_messages(chunk, accumulated_summaries[:finished_prefix])
+                in_flight[i] = executor.submit(contextvars.copy_context().run, get_chat_completion, messages, model)
+            while in_flight:
+                collect(block=True)
+
+    if map_reduce:
+        return reduce_summaries(accumulated_summaries, model=model, additional_instructions=additional_instructions,
+                                fan_in=fan_in, context_budget=context_budget, max_workers=max_workers,
+                                chunk_cache=chunk_cache)
 
     # Compile final summary from partial summaries
     final_summary = '\n\n'.join(accumulated_summaries)
@@ -159,3 +454,243 @@ def summarize(text: str,
 
     return fixed_final
 
+
+def merge_system_message(additional_instructions: Optional[str] = None) -> str:
+    system_message_content = (
+        "Merge these summaries of consecutive parts of one document into a single summary. "
+        "Keep every key point in its original order and remove anything repeated. "
+        "There should only be one overview summary and one detailed breakdown of everything."
+    )
+    if additional_instructions is not None:
+        system_message_content += f"\n\n{additional_instructions}"
+    return system_message_content
+
+
+# merge_groups() never puts more than this many times fan_in summaries in one group.
+MERGE_GROUP_SPREAD = 2
+
+
+def merge_groups(summaries: List[str], fan_in: int) -> List[List[str]]:
+    """
+    Splits summaries into consecutive groups of about `fan_in`. A group ends after a summary whose hash is a multiple
+    of `fan_in` (once it holds at least two summaries), or at MERGE_GROUP_SPREAD * fan_in summaries. Since the
+    boundaries follow the content, a changed summary only moves the boundaries up to the next one that hashes to a
+    boundary, instead of shifting every group after it the way fixed positions would.
+    """
+    groups, group = [], []
+    for summary in summaries:
+        group.append(summary)
+        digest = int.from_bytes(hashlib.sha256(summary.encode('utf-8')).digest()[:8], 'big')
+        if len(group) >= MERGE_GROUP_SPREAD * fan_in or (len(group) > 1 and digest % fan_in == 0):
+            groups.append(group)
+            group = []
+    if group:
+        groups.append(group)
+    return groups
+
+
+# This function trims a group of summaries so their combined length fits in budget tokens. Short summaries are kept
+# whole and the remaining budget is shared evenly between the longer ones, which are cut off at the end.
+def fit_to_budget(summaries: List[str], budget: int) -> List[str]:
+    encoding = get_encoding()
+    encoded = [encoding.encode_ordinary(summary) for summary in summaries]
+    if sum(len(tokens) for tokens in encoded) <= budget:
+        return summaries
+
+    fitted = list(summaries)
+    remaining = budget
+    by_length = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+    for position, i in enumerate(by_length):
+        share = remaining // (len(encoded) - position)
+        if len(encoded[i]) > share:
+            fitted[i] = encoding.decode(encoded[i][:share])
+        remaining -= min(len(encoded[i]), share)
+    return fitted
+
+
+def reduce_summaries(summaries: List[str],
+                     model: str = 'gpt-4-turbo',
+                     additional_instructions: Optional[str] = None,
+                     fan_in: Optional[int] = None,
+                     context_budget: Optional[int] = None,
+                     max_workers: Optional[int] = None,
+                     chunk_cache=None) -> str:
+    """
+    Merges summaries in a tree: each level combines consecutive groups of about `fan_in` summaries (see
+    merge_groups()) with one call per group, all groups of a level running concurrently, until a single summary is
+    left. The merge prompt asks for a single overview and breakdown, so the result does not need a separate
+    fix_summary pass.
+
+    No call is sent more than `context_budget` prompt tokens; when a group is too large, its summaries are trimmed
+    with fit_to_budget(). Prompt size per call therefore stays constant no matter how long the document is.
+
+    Merges found in `chunk_cache` are reused. Because group boundaries depend on the summaries and not on their
+    positions, editing, adding or removing a chunk usually only changes the groups next to it on every level, and
+    the rest of the tree comes from the cache.
+    """
+    fan_in = max(2, fan_in or SUMMARIZER_FAN_IN)
+    context_budget = context_budget or SUMMARIZER_CONTEXT_BUDGET
+    max_workers = max(1, max_workers or SUMMARIZER_MAX_WORKERS)
+
+    system_message_content = merge_system_message(additional_instructions)
+    # leave room for the "\n\n" separators between summaries
+    available = context_budget - len(tokenize(system_message_content)) - 2 * MERGE_GROUP_SPREAD * fan_in
+    if available <= 0:
+        raise ValueError(f"context_budget of {context_budget} tokens does not fit the merge instructions")
+
+    def merge_messages(group):
+        return [
+            {"role": "system", "content": system_message_content},
+            {"role": "user", "content": '\n\n'.join(fit_to_budget(group, available))}
+        ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(summaries) > 1:
+            groups = merge_groups(summaries, fan_in)
+            merged = iter(cached_completions(executor, [merge_messages(group) for group in groups if len(group) > 1],
+                                             model, feature='merge_summaries', chunk_cache=chunk_cache))
+            summaries = [next(merged) if len(group) > 1 else group[0] for group in groups]
+    return summaries[0]
+
+
+class StreamCancelled(Exception):
+    pass
+
+
+def stream_summarize(text: str,
+                     detail: float = 0,
+                     model: str = 'gpt-4-turbo',
+                     additional_instructions: Optional[str] = None,
+                     minimum_chunk_size: Optional[int] = 500,
+                     chunk_delimiter: Optional[str] = None,
+                     max_workers: Optional[int] = None,
+                     summarize_recursively=False,
+                     map_reduce=False,
+                     fan_in: Optional[int] = None,
+                     context_budget: Optional[int] = None,
+                     chunk_cache=None):
+    """
+    Streaming counterpart of summarize(), taking the same modes, that yields (event, data) tuples as the summary is
+    generated:
+
+    - ('chunk', {'index': i, 'delta': str}) for every piece of a chunk summary. Without recursion chunks are
+      summarized concurrently, so deltas from different chunks interleave and are told apart by their index; with
+      recursion they are summarized one after the other, each given the summaries of all the chunks before it.
+    - ('chunk_done', {'index': i}) once a chunk summary is complete.
+    - ('fix', {'delta': str}) for every piece of the fixed combined summary. In map-reduce mode the chunk summaries
+      are merged with reduce_summaries() instead, which is not streamed.
+    - ('summary', {'html': str}) with the final summary.
+
+    With a `chunk_cache` (ignored when summarizing recursively) the text is split into content defined chunks as in
+    summarize(); chunk summaries found in it come as a single 'chunk' event and only the others are sent to the
+    model, and every chunk summary that completes is stored in it, as are the merges in map-reduce mode.
+
+    Deltas are passed through a bounded queue, so a slow consumer holds up the chunk threads instead of buffering
+    the whole response. Closing the generator early cancels the outstanding chunk calls.
+    """
+    system_message_content = summary_system_message(additional_instructions)
+    max_chunk_size = None
+    if map_reduce:
+        summarize_recursively = False
+        context_budget = context_budget or SUMMARIZER_CONTEXT_BUDGET
+        max_chunk_size = context_budget - len(tokenize(system_message_content))
+    if summarize_recursively:
+        chunk_cache = None
+    text_chunks = split_for_detail(text, detail, minimum_chunk_size, chunk_delimiter, max_chunk_size=max_chunk_size,
+                                   content_defined=chunk_cache is not None)
+
+    if max_workers is None:
+        max_workers = SUMMARIZER_MAX_WORKERS
+    if summarize_recursively:
+        summaries = yield from stream_chunks_recursively(text_chunks, system_message_content, model)
+    else:
+        summaries = yield from stream_chunks(text_chunks, system_message_content, model, max_workers, chunk_cache)
+
+    if map_reduce:
+        summary = reduce_summaries(summaries, model=model, additional_instructions=additional_instructions,
+                                   fan_in=fan_in, context_budget=context_budget, max_workers=max_workers,
+                                   chunk_cache=chunk_cache)
+        yield 'summary', {'html': summary}
+        return
+
+    parts = []
+    for delta in stream_fix_summary('\n\n'.join(summaries)):
+        parts.append(delta)
+        yield 'fix', {'delta': delta}
+    yield 'summary', {'html': ''.join(parts)}
+
+
+# Streams the summary of every chunk in turn, each one given the summaries of the chunks before it. Returns the
+# summaries.
+def stream_chunks_recursively(text_chunks, system_message_content, model):
+    summaries = []
+    for index, chunk in enumerate(text_chunks):
+        parts = []
+        for delta in stream_chat_completion(summary_messages(system_message_content, chunk, summaries), model=model):
+            parts.append(delta)
+            yield 'chunk', {'index': index, 'delta': delta}
+        summaries.append(''.join(parts))
+        yield 'chunk_done', {'index': index}
+    return summaries
+
+
+# Streams the summaries of independent chunks, `max_workers` at a time, taking the ones it can from chunk_cache (see
+# cached_completions()) and storing the others there as they complete. Returns the summaries in chunk order.
+def stream_chunks(text_chunks, system_message_content, model, max_workers, chunk_cache=None):
+    events = queue.Queue(maxsize=SUMMARIZER_STREAM_BUFFER)
+    cancelled = threading.Event()
+    summaries = [None] * len(text_chunks)
+    keys = [completion_key(summary_messages(system_message_content, chunk), model) for chunk in text_chunks]
+    cached = chunk_cache.get_many(keys) if chunk_cache is not None else {}
+
+    def put(item):
+        while not cancelled.is_set():
+            try:
+                events.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise StreamCancelled()
+
+    def run(index, chunk):
+        try:
+            parts = []
+            for delta in stream_chat_completion(summary_messages(system_message_content, chunk), model=model):
+                parts.append(delta)
+                put(('chunk', {'index': index, 'delta': delta}))
+            summaries[index] = ''.join(parts)
+            put(('chunk_done', {'index': index}))
+        except StreamCancelled:
+            pass
+        except Exception as e:
+            try:
+                put(('chunk_failed', e))
+            except StreamCancelled:
+                pass
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        for index, chunk in enumerate(text_chunks):
+            if keys[index] not in cached:
+                executor.submit(contextvars.copy_context().run, run, index, chunk)
+        for index, key in enumerate(keys):
+            if key in cached:
+                summaries[index] = cached[key]
+                yield 'chunk', {'index': index, 'delta': cached[key]}
+                yield 'chunk_done', {'index': index}
+        remaining = len(text_chunks) - sum(key in cached for key in keys)
+        while remaining:
+            event, data = events.get()
+            if event == 'chunk_failed':
+                raise data
+            if event == 'chunk_done':
+                remaining -= 1
+            yield event, data
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        # chunks that completed are kept even if others failed, so the next attempt doesn't pay for them again
+        if chunk_cache is not None:
+            chunk_cache.set_many({keys[i]: summary for i, summary in enumerate(summaries)
+                                  if summary is not None and keys[i] not in cached})
+    return summaries
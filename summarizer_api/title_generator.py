@@ -1,11 +1,5 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
 import json
-
-load_dotenv()
-
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+from llm_api.client import chat_completion
 
 def generate_title(paragraph: str):
     prompt = (
@@ -13,7 +7,7 @@ def generate_title(paragraph: str):
         f"Make sure the title is short and descriptive. "
     )
 
-    response = client.chat.completions.create(
+    response = chat_completion(
         model='gpt-4o-mini',
         messages=[
             {"role": "system", "content": prompt },
@@ -21,6 +15,7 @@ def generate_title(paragraph: str):
         ],
         max_tokens=20,  
         temperature=0.7,
+        feature='title',
     )
     
     title = response.choices[0].message.content
@@ -0,0 +1,245 @@
+import os
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from ocr_api.client import OCRServiceError, ocr_image
+from ocr_api.preprocess import load_image
+from .documents import IMAGE_CONTENT_TYPES, PDF_CONTENT_TYPES, DocumentError, PartialPDF, extract_pdf_pages
+from .models import UploadPage, UploadSession, UploadStatus, UserNotes
+from .normalize import normalize_pages
+
+# Resumable uploads of large documents. The client creates a session with the file's size, then PUTs the file in
+# parts, each with a Content-Range header, which are streamed straight to a file under UPLOAD_DIR; a part that
+# doesn't start where the last one ended is refused with the offset to resume from. Nothing here holds more than
+# one read block of the upload in memory, except for images, which are decoded whole and so are limited to
+# UPLOAD_IMAGE_MAX_BYTES.
+#
+# The one part that may come out of order is the last one. PDFs keep their cross-reference table at the end, and
+# pdfium can't find pages without it, so clients should send a PDF's last part first; its pages can then be read
+# while the rest arrives.
+#
+# The upload worker (manage.py run_upload_worker) picks up every session that has received more data since it
+# last looked, reads the pages that are complete by now and stores their text in UploadPage, so a document is
+# mostly processed by the time its last part arrives. The note is created from the pages once all are done.
+
+READ_BLOCK = 64 * 1024
+
+
+def new_upload_path():
+    directory = Path(settings.UPLOAD_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    return str(directory / f"{uuid.uuid4().hex}.part")
+
+
+def create_session(user, filename, content_type, size):
+    if content_type not in PDF_CONTENT_TYPES + IMAGE_CONTENT_TYPES and not filename.lower().endswith('.pdf'):
+        raise DocumentError(f"Unsupported file type {content_type}, upload a PDF or an image.")
+    if size <= 0 or size > settings.UPLOAD_MAX_BYTES:
+        raise DocumentError(f"Uploads must be between 1 byte and {settings.UPLOAD_MAX_BYTES // (1024 * 1024)} MB.")
+    # an image is read into memory whole to be decoded, unlike a PDF
+    is_pdf = content_type in PDF_CONTENT_TYPES or filename.lower().endswith('.pdf')
+    if not is_pdf and size > settings.UPLOAD_IMAGE_MAX_BYTES:
+        raise DocumentError(f"Images can be at most {settings.UPLOAD_IMAGE_MAX_BYTES // (1024 * 1024)} MB.")
+    path = new_upload_path()
+    open(path, 'wb').close()
+    return UploadSession.objects.create(user=user, filename=filename, content_type=content_type, size=size, path=path)
+
+
+def parse_content_range(header):
+    """
+    Parses 'bytes start-end/total' and returns (start, end + 1, total), or None if the header is malformed.
+    """
+    try:
+        unit, _, rest = header.strip().partition(' ')
+        span, _, total = rest.partition('/')
+        start, _, end = span.partition('-')
+        if unit != 'bytes':
+            return None
+        start, end, total = int(start), int(end) + 1, int(total)
+    except ValueError:
+        return None
+    if start < 0 or end <= start:
+        return None
+    return start, end, total
+
+
+# Whether a part can be written: the next one from the start, or the last part if it has not been sent yet.
+def accepts_part(session, start, end):
+    if start == session.received_bytes:
+        return True
+    return end == session.size and start > session.received_bytes and session.tail_start is None
+
+
+# Streams one part of the upload from `stream` into the session's file. Returns True if it was written, or False
+# if another request wrote a part for the same place first.
+#
+# The part is claimed before any of it is written, so two requests for the same range can't both write to the file:
+# the claim is a conditional update that only one of them wins, and nothing else is written to the session until
+# the winner records its part or gives up. A claim left by a request that died is taken over after
+# UPLOAD_LEASE_SECONDS.
+def write_part(session, stream, start, end):
+    now = timezone.now()
+    free = Q(writing_from__isnull=True) | Q(writing_at__lt=now - timedelta(seconds=settings.UPLOAD_LEASE_SECONDS))
+    is_tail = start != session.received_bytes
+    if is_tail:
+        # the last part, sent ahead of the rest
+        range_is_free = Q(tail_start__isnull=True, received_bytes__lt=start, size=end)
+    else:
+        range_is_free = Q(received_bytes=start)
+    claim = UploadSession.objects.filter(free, range_is_free, pk=session.pk)
+    if not claim.update(writing_from=start, writing_at=now):
+        return False
+    claimed = UploadSession.objects.filter(pk=session.pk, writing_from=start, writing_at=now)
+
+    written = 0
+    try:
+        with open(session.path, 'r+b') as file:
+            file.seek(start)
+            while written < end - start:
+                block = stream.read(min(READ_BLOCK, end - start - written))
+                if not block:
+                    break
+                file.write(block)
+                written += len(block)
+    finally:
+        if written != end - start:
+            claimed.update(writing_from=None, writing_at=None)
+    if written != end - start:
+        raise DocumentError(f"The part ended after {written} of {end - start} bytes.")
+
+    if is_tail:
+        # the worker looks at the session again now that it has the end of the file
+        return bool(claimed.update(tail_start=start, checked_bytes=0, writing_from=None, writing_at=None,
+                                   updated_at=timezone.now()))
+    received = end
+    tail_start = UploadSession.objects.filter(pk=session.pk).values_list('tail_start', flat=True).first()
+    if tail_start is not None and received >= tail_start:
+        received = session.size
+    return bool(claimed.update(
+        received_bytes=received,
+        status=UploadStatus.PROCESSING if received == session.size else UploadStatus.RECEIVING,
+        writing_from=None, writing_at=None,
+        updated_at=timezone.now(),
+    ))
+
+
+def delete_session(session):
+    if os.path.exists(session.path):
+        os.remove(session.path)
+    session.delete()
+
+
+# Claims a session with data the worker has not looked at yet, the same way summary jobs are claimed.
+def claim_next_upload(worker_id):
+    now = timezone.now()
+    candidates = (UploadSession.objects
+                  .filter(status__in=[UploadStatus.RECEIVING, UploadStatus.PROCESSING], locked_by="",
+                          received_bytes__gt=F('checked_bytes'))
+                  .order_by('updated_at')
+                  .values_list('id', flat=True)[:10])
+    for session_id in candidates:
+        claimed = UploadSession.objects.filter(id=session_id, locked_by="").update(locked_by=worker_id, locked_at=now)
+        if claimed:
+            return UploadSession.objects.get(id=session_id)
+    return None
+
+
+def release_upload(session, **fields):
+    UploadSession.objects.filter(pk=session.pk).update(locked_by="", locked_at=None, **fields)
+
+
+def is_pdf_session(session):
+    return session.content_type in PDF_CONTENT_TYPES or session.filename.lower().endswith('.pdf')
+
+
+def store_page(session, page, page_count):
+    UploadPage.objects.create(session=session, page=page.page, text=page.text, path=page.path, ms=page.ms)
+    UploadSession.objects.filter(pk=session.pk).update(pages_done=page.page, page_count=page_count,
+                                                       locked_at=timezone.now())
+
+
+def finish_upload(session):
+    contents, report = normalize_pages(list(session.pages.values_list('text', flat=True)))
+    if not contents:
+        raise DocumentError("No text was found in the file.")
+    note = UserNotes(user_id=session.user_id, notecontents=contents)
+    note.save()
+    release_upload(session, status=UploadStatus.DONE, note=note, tokens_saved=report.tokens_saved)
+    if os.path.exists(session.path):
+        os.remove(session.path)
+    return note
+
+
+def process_upload(session):
+    """
+    Reads whatever pages of a claimed session can be read with the data received so far, picking up after the
+    last page stored, and creates the note when the last page is done. Returns the number of pages read.
+    """
+    received = session.received_bytes
+    start = session.pages_done
+    # pages read by a worker that died before it could record them
+    session.pages.filter(page__gt=start).delete()
+    try:
+        if not is_pdf_session(session):
+            if received < session.size:
+                release_upload(session, checked_bytes=received)
+                return 0
+            started = time.perf_counter()
+            with open(session.path, 'rb') as file:
+                try:
+                    image = load_image(file.read())
+                except ValueError:
+                    raise DocumentError(f"Could not read {session.filename} as an image.")
+            ocr = ocr_image(image)
+            UploadPage.objects.create(session=session, page=1, text=ocr.text, path='cache' if ocr.cached else 'ocr',
+                                      ms=int((time.perf_counter() - started) * 1000))
+            UploadSession.objects.filter(pk=session.pk).update(pages_done=1, page_count=1)
+            finish_upload(session)
+            return 1
+
+        with PartialPDF(session.path, session.size, received, session.tail_start) as partial:
+            pdf = partial.document()
+            if pdf is None:
+                if received == session.size:
+                    raise DocumentError(f"Could not read {session.filename} as a PDF.")
+                release_upload(session, checked_bytes=received)
+                return 0
+            read = 0
+            for page in extract_pdf_pages(pdf, start=start, available=partial.page_available):
+                store_page(session, page, len(pdf))
+                read += 1
+            if start + read == len(pdf):
+                finish_upload(session)
+            else:
+                release_upload(session, checked_bytes=received)
+            return read
+    except DocumentError as e:
+        release_upload(session, status=UploadStatus.FAILED, error=str(e))
+    except OCRServiceError:
+        # left locked, so it is retried once its lease has run out
+        raise
+    except Exception:
+        release_upload(session, status=UploadStatus.FAILED, error=traceback.format_exc())
+        raise
+    return 0
+
+
+# Unlocks sessions whose worker stopped renewing its lease, and deletes uploads that were abandoned part way.
+def recover_stale_uploads():
+    now = timezone.now()
+    recovered = (UploadSession.objects
+                 .exclude(locked_by="")
+                 .filter(locked_at__lt=now - timedelta(seconds=settings.UPLOAD_LEASE_SECONDS))
+                 .update(locked_by="", locked_at=None, checked_bytes=0))
+    abandoned = UploadSession.objects.filter(
+        Q(status=UploadStatus.RECEIVING) | Q(status=UploadStatus.FAILED),
+        updated_at__lt=now - timedelta(hours=settings.UPLOAD_EXPIRE_HOURS),
+    )
+    for session in abandoned:
+        delete_session(session)
+    return recovered
@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import UserNotesListCreateView, UserNotesRetrieveUpdateDestroyView
+from .views import UploadImage, UploadSessionCreateView, UploadSessionView, UserNotesListCreateView, UserNotesRetrieveUpdateDestroyView, UserNotesSummaryStreamView
 
 urlpatterns = [
     
@@ -7,4 +7,8 @@ urlpatterns = [
     #UserNotes
     path('usernotes/', UserNotesListCreateView.as_view(), name='usernotes-list'),
     path('usernotes/<int:pk>/', UserNotesRetrieveUpdateDestroyView.as_view(), name='usernotes_detail-retrieve-update-destroy'),
+    path('usernotes/upload/', UploadImage.as_view(), name='usernotes-upload'),
+    path('usernotes/uploads/', UploadSessionCreateView.as_view(), name='usernotes-upload-sessions'),
+    path('usernotes/uploads/<int:pk>/', UploadSessionView.as_view(), name='usernotes-upload-session'),
+    path('usernotes/<int:pk>/stream/', UserNotesSummaryStreamView.as_view(), name='usernotes-summary-stream'),
 ]
@@ -1,15 +1,119 @@
-from django.shortcuts import render
+import json
+import time
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.shortcuts import get_object_or_404, render
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
-from .models import UserNotes
-from .serializers import UserNotesSerializer
-from rest_framework import generics
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.views import APIView
+from ocr_api.client import OCRServiceError
+from .models import UserNotes, SummaryStatus, UploadSession, UploadStatus
+from .serializers import UserNotesSerializer, UploadSessionSerializer
+from .documents import DocumentError, extract_pages
+from .normalize import normalize_pages
+from .uploads import accepts_part, create_session, delete_session, parse_content_range, write_part
+from .jobs import claim_note_job, requeue_failed_note, stream_note_summary
+from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 
 # Create your views here.
 
-def UploadImage(request):
-    pass
+# Creates a note from an uploaded PDF or image (multipart field "file"). PDF pages are read from their text layer
+# when they have one and rendered and OCRed otherwise; the response lists the time and path taken by every page.
+class UploadImage(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"status": "error", "message": "No file was uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+
+        started = time.perf_counter()
+        try:
+            pages = list(extract_pages(upload))
+        except DocumentError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except OCRServiceError:
+            return Response({"status": "error", "message": "Text recognition is unavailable, please try again later."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        contents, report = normalize_pages([page.text for page in pages])
+        if not contents:
+            return Response({"status": "error", "message": "No text was found in the file."}, status=status.HTTP_400_BAD_REQUEST)
+
+        note = UserNotes(user=request.user, notecontents=contents)
+        note.save()
+        data = UserNotesSerializer(note).data
+        data['pages'] = [page._asdict() for page in pages]
+        data['normalization'] = dict(report._asdict(), tokens_saved=report.tokens_saved)
+        data['total_ms'] = int((time.perf_counter() - started) * 1000)
+        return Response(data, status=status.HTTP_202_ACCEPTED if note.status == SummaryStatus.PENDING else status.HTTP_201_CREATED)
+
+# Resumable uploads for large documents, see uploads.py. POST {filename, content_type, size} starts one; the file
+# is then PUT to usernotes/uploads/<id>/ in parts of up to part_size bytes, each with a "Content-Range: bytes
+# start-end/size" header, in order (a PDF's last part may be sent first). GET shows how much has arrived and how
+# many pages are done, and the note once it exists.
+class UploadSessionCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = create_session(request.user, **serializer.validated_data)
+        except DocumentError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = UploadSessionSerializer(session).data
+        data['part_size'] = settings.UPLOAD_PART_BYTES
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    permission_classes = [IsAuthenticated]
+    # parts are streamed from request.stream to disk, never parsed into memory
+    parser_classes = []
+
+    def get(self, request, pk):
+        session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        data = UploadSessionSerializer(session).data
+        data['pages'] = list(session.pages.values('page', 'path', 'ms'))
+        return Response(data)
+
+    def put(self, request, pk):
+        session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        if session.status != UploadStatus.RECEIVING:
+            message = session.error if session.status == UploadStatus.FAILED else "This upload has already been received."
+            return Response({"status": "error", "message": message}, status=status.HTTP_409_CONFLICT)
+        span = parse_content_range(request.headers.get('Content-Range', ''))
+        if span is None or span[2] != session.size or span[1] > session.size:
+            return Response({"status": "error", "message": f"Send a Content-Range of bytes start-end/{session.size}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        start, end, _ = span
+        if int(request.META.get('CONTENT_LENGTH') or 0) != end - start:
+            return Response({"status": "error", "message": "The body does not match the Content-Range."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not accepts_part(session, start, end):
+            return Response({"status": "error", "message": f"Resume the upload at byte {session.received_bytes}.",
+                             "received_bytes": session.received_bytes}, status=status.HTTP_409_CONFLICT)
+        try:
+            written = write_part(session, request.stream, start, end)
+        except DocumentError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        session.refresh_from_db()
+        if not written:
+            return Response({"status": "error", "message": f"Resume the upload at byte {session.received_bytes}.",
+                             "received_bytes": session.received_bytes}, status=status.HTTP_409_CONFLICT)
+        return Response(UploadSessionSerializer(session).data,
+                        status=status.HTTP_202_ACCEPTED if session.received_bytes == session.size else status.HTTP_200_OK)
+
+    def delete(self, request, pk):
+        session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        delete_session(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 #User Notes
 
@@ -22,6 +126,13 @@ class UserNotesListCreateView(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    # Summaries are written by the summary worker, so a new note is only accepted here unless it was a cache hit
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if response.data.get('status') == SummaryStatus.PENDING:
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
     
 class UserNotesRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserNotesSerializer
@@ -29,3 +140,58 @@ class UserNotesRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         return UserNotes.objects.filter(user=self.request.user)
+
+    # Editing the contents queues the note to be summarized again
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        if response.data.get('status') == SummaryStatus.PENDING:
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Lets clients ask for text/event-stream; anything rendered through it (errors) is sent as a single error event
+class EventStreamRenderer(BaseRenderer):
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event('error', data)
+
+# Streams a note's summary as Server-Sent Events while it is generated: 'chunk' and 'chunk_done' events for every
+# chunk summary, 'fix' events for the final pass (unless SUMMARY_MAP_REDUCE merges them instead), then 'summary'
+# with the finished html and 'done' with the title.
+# Notes that are already summarized get the stored summary straight away; notes whose summary failed are tried again.
+class UserNotesSummaryStreamView(APIView):
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request, pk):
+        note = generics.get_object_or_404(UserNotes, pk=pk, user=request.user)
+
+        if note.status == SummaryStatus.DONE:
+            events = iter([('summary', {'html': note.notesummary}), ('done', {'title': note.notetitle})])
+        else:
+            if note.status == SummaryStatus.FAILED:
+                requeue_failed_note(note)
+            job = claim_note_job(note, f"stream:{request.user.pk}")
+            if job is None:
+                if note.summary_jobs.filter(status=SummaryStatus.RUNNING).exists():
+                    return Response({"status": "error", "message": "This note is already being summarized."}, status=status.HTTP_409_CONFLICT)
+                waiting = note.summary_jobs.filter(status=SummaryStatus.PENDING).order_by('run_after').first()
+                if waiting is not None and waiting.locked_by:
+                    return Response({"status": "error", "message": "This note is being summarized in a batch."}, status=status.HTTP_409_CONFLICT)
+                if waiting is not None:
+                    # the job is backing off after a failed attempt
+                    retry_after = max(1, int((waiting.run_after - timezone.now()).total_seconds()))
+                    return Response({"status": "error", "message": "Summarizing this note failed, it will be retried shortly."},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': str(retry_after)})
+                return Response({"status": "error", "message": "This note has no summary job to run, try again."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            events = stream_note_summary(job)
+
+        response = StreamingHttpResponse((sse_event(event, data) for event, data in events), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response